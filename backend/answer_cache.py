@@ -0,0 +1,170 @@
+"""Semantic cache of run_llm answers.
+
+A question is answered from the cache when an earlier question with the same
+chat history has a query embedding with cosine similarity above `threshold`
+(e.g. "what is a chain" vs "what is a LangChain chain"), which saves the
+rephrase call and the chat completion.
+
+Entries expire after `ttl` seconds, the least recently used ones are evicted
+past `max_entries`, and the whole cache is dropped once the index has been
+re-ingested (the ingestion scripts call mark_index_updated(); the marker
+file's mtime is checked at most every INDEX_VERSION_CHECK_SECONDS).
+
+Answers are copied in and out, so a caller changing a result doesn't change
+the cache.
+"""
+import copy
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(24 * 60 * 60)))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+# touched by the ingestion scripts whenever the vector index changes
+INDEX_VERSION_PATH = Path(os.getenv("INDEX_VERSION_PATH", str(Path(__file__).resolve().parent.parent / ".cache" / "index_version")))
+INDEX_VERSION_CHECK_SECONDS = float(os.getenv("INDEX_VERSION_CHECK_SECONDS", "5"))
+
+
+def mark_index_updated() -> None:
+    """Tell running answer caches that their answers may be stale."""
+    INDEX_VERSION_PATH.parent.mkdir(parents=True, exist_ok=True)
+    INDEX_VERSION_PATH.write_text(str(time.time()), encoding="utf-8")
+
+
+def index_version() -> int:
+    """Modification time of the marker file (0 if the index was never re-ingested)."""
+    try:
+        return INDEX_VERSION_PATH.stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+class IndexVersionWatch:
+    """Tells whether the index was re-ingested since the last time it said so.
+
+    The marker file is stat'ed at most every `check_seconds`."""
+
+    def __init__(self, check_seconds: float = INDEX_VERSION_CHECK_SECONDS):
+        self.check_seconds = check_seconds
+        self.version = index_version()
+        self.checked = time.monotonic()
+
+    def changed(self) -> bool:
+        checked = time.monotonic()
+        if checked - self.checked < self.check_seconds:
+            return False
+        self.checked = checked
+        version = index_version()
+        if version == self.version:
+            return False
+        self.version = version
+        return True
+
+
+def history_key(chat_history: Sequence[Any]) -> str:
+    """Normalized chat history: histories that only differ in case/whitespace are equivalent."""
+    return json.dumps([[" ".join(str(part).lower().split()) for part in message]
+                       if isinstance(message, (list, tuple)) else " ".join(str(message).lower().split())
+                       for message in chat_history])
+
+
+class AnswerCache:
+    def __init__(self,
+                 threshold: float = ANSWER_CACHE_THRESHOLD,
+                 ttl: float = ANSWER_CACHE_TTL,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 version_check_seconds: float = INDEX_VERSION_CHECK_SECONDS):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.index_version = IndexVersionWatch(version_check_seconds)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._clear()
+
+    def _clear(self) -> None:
+        self.vectors: Optional[np.ndarray] = None  # (n, dim) unit vectors
+        self.created = np.empty(0)
+        self.last_used = np.empty(0)
+        self.history_keys: List[str] = []
+        self.answers: List[Dict[str, Any]] = []
+
+    def _drop(self, mask: np.ndarray) -> None:
+        """Remove the entries where `mask` is True."""
+        if not mask.any():
+            return
+        keep = ~mask
+        self.vectors = self.vectors[keep]
+        self.created = self.created[keep]
+        self.last_used = self.last_used[keep]
+        self.history_keys = [k for k, kept in zip(self.history_keys, keep) if kept]
+        self.answers = [a for a, kept in zip(self.answers, keep) if kept]
+
+    def _expire(self, now: float) -> None:
+        if self.index_version.changed():
+            self._clear()
+        elif self.answers:
+            self._drop(now - self.created > self.ttl)
+
+    def lookup(self,
+               query_vector: Sequence[float],
+               chat_history: Sequence[Any]) -> Optional[Dict[str, Any]]:
+        """The cached answer of the most similar earlier question, if it is similar enough."""
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        key = history_key(chat_history)
+        now = time.time()
+
+        with self.lock:
+            self._expire(now)
+            if self.answers:
+                similarities = self.vectors @ query
+                same_history = np.fromiter((k == key for k in self.history_keys),
+                                           dtype=bool, count=len(self.history_keys))
+                similarities[~same_history] = -1.0
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self.last_used[best] = now
+                    self.hits += 1
+                    return copy.deepcopy(self.answers[best])
+            self.misses += 1
+            return None
+
+    def store(self,
+              query_vector: Sequence[float],
+              chat_history: Sequence[Any],
+              answer: Dict[str, Any]) -> None:
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        now = time.time()
+
+        with self.lock:
+            self._expire(now)
+            if len(self.answers) >= self.max_entries:
+                # evict the least recently used entries to make room
+                n_evict = len(self.answers) - self.max_entries + 1
+                mask = np.zeros(len(self.answers), dtype=bool)
+                mask[np.argsort(self.last_used)[:n_evict]] = True
+                self._drop(mask)
+
+            self.vectors = query[None, :] if self.vectors is None or not len(self.answers) \
+                else np.vstack([self.vectors, query])
+            self.created = np.append(self.created, now)
+            self.last_used = np.append(self.last_used, now)
+            self.history_keys.append(history_key(chat_history))
+            self.answers.append(copy.deepcopy(answer))
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.answers)}
@@ -0,0 +1,95 @@
+"""HTTP API of the documentation assistant.
+
+POST /query         {"query": ..., "chat_history": [...]} -> answer + sources
+POST /query/stream  same request, newline-delimited JSON: {"sources": [...]},
+                    then one {"answer": "<token>"} line per token
+GET  /stats         cache, query batching, coalescing, chunk store, speculative retrieval and HTTP
+                    connection pool counters
+
+Identical in-flight requests share one chain call (backend/coalescing.py), and
+at most API_MAX_CONCURRENCY chain calls run at the same time; the others wait.
+"""
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from backend.coalescing import Coalescer, request_key
+from backend.core import (answer_cache_stats, arun_llm, astream_llm, chunk_store_stats, embedding_cache_stats,
+                          query_batch_stats, speculative_retrieval_stats, warm_up)
+from http_clients import pool_stats
+
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "32"))
+
+coalescer = Coalescer()
+upstream_slots = asyncio.Semaphore(API_MAX_CONCURRENCY)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # build the shared retrieval chain before the first request arrives
+    await asyncio.to_thread(warm_up)
+    yield
+
+
+app = FastAPI(title="LangChain - Documentation Assistant", lifespan=lifespan)
+
+
+class QueryRequest(BaseModel):
+    query: str
+    chat_history: List[Any] = []
+
+
+def sources(documents) -> List[str]:
+    return [doc.metadata.get("source") for doc in documents]
+
+
+@app.post("/query")
+async def query(request: QueryRequest) -> Dict[str, Any]:
+    async def call():
+        async with upstream_slots:
+            return await arun_llm(query=request.query, chat_history=request.chat_history)
+
+    result = await coalescer.run(request_key(request.query, request.chat_history), call)
+    return {
+        "query": result["query"],
+        "result": result["result"],
+        "sources": sources(result["source_documents"]),
+    }
+
+
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest) -> StreamingResponse:
+    async def call():
+        async with upstream_slots:
+            async for chunk in astream_llm(query=request.query, chat_history=request.chat_history):
+                yield chunk
+
+    async def lines() -> AsyncIterator[str]:
+        async for chunk in coalescer.stream(request_key(request.query, request.chat_history), call):
+            if "source_documents" in chunk:
+                yield json.dumps({"sources": sources(chunk["source_documents"])}) + "\n"
+            if "answer" in chunk:
+                yield json.dumps({"answer": chunk["answer"]}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/stats")
+async def stats() -> Dict[str, Any]:
+    # how many query embeddings / answers were served from the local caches
+    return {"embedding_cache": embedding_cache_stats(),
+            "query_batching": query_batch_stats(),
+            "answer_cache": answer_cache_stats(),
+            "coalescing": coalescer.stats(),
+            "chunk_store": chunk_store_stats(),
+            "speculative_retrieval": speculative_retrieval_stats(),
+            "http_pool": pool_stats()}
+
+
+# run with: uvicorn backend.api:app
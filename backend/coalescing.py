@@ -0,0 +1,100 @@
+"""Share one upstream call between identical requests that are in flight together.
+
+When many users send the same question at the same time (a link shared in a
+channel, a retrying client, ...), only the first request runs the chain; the
+others wait for its result. Streams are shared too: a late subscriber first
+gets the chunks already produced, then follows the live stream.
+
+Nothing is kept once the call is done; repeated questions after that are the
+job of the answer cache.
+"""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Set, TypeVar
+
+from backend.answer_cache import history_key
+
+T = TypeVar("T")
+
+
+def request_key(query: str, chat_history: Sequence[Any]) -> str:
+    return json.dumps([" ".join(query.split()), history_key(chat_history)])
+
+
+class _Broadcast:
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+
+    def notify(self) -> None:
+        # wake up the current waiters; later ones wait on a fresh event
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class Coalescer:
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        # the loop only keeps weak references to tasks: hold the pumps until they finish
+        self._pumps: Set[asyncio.Task] = set()
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Await fn(), or the fn() already running under the same key."""
+        future = self._calls.get(key)
+        if future is None:
+            self.upstream_calls += 1
+            future = self._calls[key] = asyncio.ensure_future(fn())
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.coalesced += 1
+        # a disconnecting client must not cancel the call the others are waiting for
+        return await asyncio.shield(future)
+
+    async def stream(self, key: str, fn: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """Iterate fn(), or follow the fn() stream already running under the same key."""
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            self.upstream_calls += 1
+            broadcast = self._streams[key] = _Broadcast()
+            pump = asyncio.ensure_future(self._pump(key, broadcast, fn()))
+            self._pumps.add(pump)
+            pump.add_done_callback(self._pumps.discard)
+        else:
+            self.coalesced += 1
+
+        sent = 0
+        while True:
+            while sent < len(broadcast.chunks):
+                yield broadcast.chunks[sent]
+                sent += 1
+            if broadcast.done:
+                if broadcast.error is not None:
+                    raise broadcast.error
+                return
+            await broadcast.changed.wait()
+
+    async def _pump(self, key: str, broadcast: _Broadcast, stream: AsyncIterator[Any]) -> None:
+        try:
+            async for chunk in stream:
+                broadcast.chunks.append(chunk)
+                broadcast.notify()
+        except Exception as e:
+            broadcast.error = e
+        except asyncio.CancelledError as e:
+            # a cut-off stream must not look complete to the subscribers
+            broadcast.error = e
+            raise
+        finally:
+            broadcast.done = True
+            self._streams.pop(key, None)
+            broadcast.notify()
+
+    def stats(self) -> Dict[str, int]:
+        return {"upstream_calls": self.upstream_calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls) + len(self._streams)}
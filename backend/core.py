@@ -1,40 +1,153 @@
+"""Retrieval chain of the chat app (main.py) and the API (backend/api.py).
+
+LangChain's chains, the OpenAI and Pinecone clients and the retrievers are
+imported when the chain is first built (see build_qa_chain), not when this
+module is: `import backend.core` stays cheap, so the app can render before
+the chain is ready. benchmarks/bench_import_time.py keeps an eye on it.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from functools import lru_cache
+from pathlib import Path
+
 from dotenv import load_dotenv
-from typing import List, Dict, Any
+from typing import TYPE_CHECKING, List, Dict, Any, AsyncIterator, Iterator, Optional, Sequence, Set, Tuple
+
+import tiktoken
 
 load_dotenv()
 
-from langchain.chains.retrieval import create_retrieval_chain
-from langchain import hub
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_pinecone import PineconeVectorStore
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain.chains.history_aware_retriever import create_history_aware_retriever
+from backend.answer_cache import AnswerCache
+
+if TYPE_CHECKING:
+    from backend.embedding_batcher import BatchingEmbeddings
+    from backend.speculative_retriever import SpeculativeRetriever
+    from chunk_store import ChunkStore
+    from langchain_core.documents import Document
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.retrievers import BaseRetriever
+    from langchain_core.runnables import Runnable
+
+    from embedding_cache import CachedEmbeddings
 
 INDEX_NAME = "documentation-assistant-project"
+CHAT_MODEL = "gpt-4.1"
 
+# only the most recent turns that fit in this many tokens are sent to the rephrase step
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
 
-def run_llm(
-    query: str,
-    chat_history: List[Dict[str, Any]] = [],
-):
-    # create embeddings
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+# fuse vector hits with BM25 keyword hits (when the ingestion built a keyword index)
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+DENSE_FETCH_K = 10  # vector hits fetched before fusion
 
-    # create a (vectorstore as a) retriever
-    docsearch = PineconeVectorStore(
-        index_name=INDEX_NAME,
-        embedding=embeddings,
-    )
+# candidates fetched for the reranker, which keeps the best ones that fit in
+# CONTEXT_TOKEN_BUDGET tokens (see backend/reranker.py)
+RERANK_FETCH_K = int(os.getenv("RERANK_FETCH_K", "20"))
+
+# sequential: rephrase a follow-up, then retrieve it; speculative: retrieve the question
+# as typed while it is rephrased (see backend/speculative_retriever.py)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "sequential")
+MULTI_QUERY = int(os.getenv("MULTI_QUERY", "0"))  # extra phrasings retrieved per follow-up (speculative mode)
+
+# anchored to the project, not the working directory Streamlit / uvicorn were started from
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# hub prompts are cached here, so a cold start doesn't need the network
+HUB_CACHE_DIR = Path(os.getenv("HUB_CACHE_DIR", str(PROJECT_ROOT / ".cache" / "hub")))
+
+# so is tiktoken's vocabulary (by default it goes to the system temp dir, which gets wiped)
+os.environ.setdefault("TIKTOKEN_CACHE_DIR", str(PROJECT_ROOT / ".cache" / "tiktoken"))
+
+# the retrieval chain is built once per process and shared by every caller
+# (Streamlit reruns, API workers, ...), guarded by a lock for thread safety
+_qa_chain: Runnable | None = None
+_qa_chain_lock = threading.Lock()
+_embeddings: CachedEmbeddings | None = None
+_query_embeddings: BatchingEmbeddings | None = None
+_chunk_store: ChunkStore | None = None  # texts of the retrieved chunks (CHUNK_STORE, see chunk_store.py)
+_speculative: SpeculativeRetriever | None = None
+
+# answers of earlier, near-identical questions (same chat history)
+answer_cache = AnswerCache()
+
+
+def pull_prompt(owner_repo: str):
+    """Pull a prompt from LangChain hub, reusing the local disk copy if there is one."""
+    from langchain_core.load import dumps, loads
+
+    cache_file = HUB_CACHE_DIR / f"{owner_repo.replace('/', '__')}.json"
+    if cache_file.exists():
+        return loads(cache_file.read_text(encoding="utf-8"))
+
+    from langchain import hub
+
+    prompt = hub.pull(owner_repo)
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    cache_file.write_text(dumps(prompt), encoding="utf-8")
+    return prompt
+
+
+def build_qa_chain(
+    chat: BaseChatModel | None = None,
+    retriever: BaseRetriever | None = None,
+    retrieval_mode: str = RETRIEVAL_MODE,
+    multi_query: int = MULTI_QUERY,
+) -> Runnable:
+    """Assemble the history-aware retrieval chain from scratch.
+
+    `chat` and `retriever` default to gpt-4.1 and the configured vectorstore
+    (benchmarks pass stubs instead)."""
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain.chains.history_aware_retriever import create_history_aware_retriever
+    from langchain.chains.retrieval import create_retrieval_chain
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+    from backend.embedding_batcher import BatchingEmbeddings
+    from embedding_cache import CachedEmbeddings
+    from http_clients import openai_clients
+
+    global _embeddings, _query_embeddings, _chunk_store, _speculative
+    # create embeddings (repeated queries are answered from the local embedding cache,
+    # the others are sent in batches with those of concurrent callers)
+    _query_embeddings = BatchingEmbeddings(OpenAIEmbeddings(model="text-embedding-3-small", **openai_clients()))
+    embeddings = _embeddings = CachedEmbeddings(_query_embeddings)
+
+    # create a (vectorstore as a) retriever (backend picked by VECTORSTORE_BACKEND)
+    if retriever is None:
+        from backend.hybrid_retriever import HybridRetriever
+        from backend.reranker import RerankingRetriever
+        from bm25_index import BM25Index
+        from vectorstores import get_vectorstore
+
+        docsearch = get_vectorstore(INDEX_NAME, embeddings)
+        _chunk_store = getattr(docsearch, "store", None)
+        retriever = docsearch.as_retriever(search_kwargs={"k": RERANK_FETCH_K})
+
+        keyword_index = BM25Index(INDEX_NAME)
+        if HYBRID_SEARCH and len(keyword_index):
+            retriever = HybridRetriever(
+                vector_retriever=docsearch.as_retriever(search_kwargs={"k": max(DENSE_FETCH_K, RERANK_FETCH_K)}),
+                keyword_index=keyword_index,
+                k=RERANK_FETCH_K,
+                fetch_k=max(20, RERANK_FETCH_K),
+            )
+
+        # over-fetched candidates -> rerank, drop near-duplicates, pack into the token budget
+        retriever = RerankingRetriever(base_retriever=retriever, encoding=_encoding())
 
     # create a chat object
-    chat = ChatOpenAI(
-        model="gpt-4.1",
-        verbose=True,
-        temperature=0.0,
-    )
+    if chat is None:
+        chat = ChatOpenAI(
+            model=CHAT_MODEL,
+            verbose=True,
+            temperature=0.0,
+            **openai_clients(),  # keep-alive connections shared with the embeddings
+        )
 
     # prompt
-    retrieval_qa_chat_prompt = hub.pull("langchain-ai/retrieval-qa-chat")
+    retrieval_qa_chat_prompt = pull_prompt("langchain-ai/retrieval-qa-chat")
 
     # create a chain: send `prompt` to `chat` with a placeholder `context` (aka the relevant documents)
     stuff_documents_chain = create_stuff_documents_chain(
@@ -42,14 +155,26 @@ def run_llm(
         retrieval_qa_chat_prompt,
     )
 
-    # rephrase question
-    rephrase_prompt = hub.pull("langchain-ai/chat-langchain-rephrase")
+    # rephrase question (only when there is a chat history: with an empty history
+    # create_history_aware_retriever sends the input straight to the retriever,
+    # so a first-turn query costs a single LLM call)
+    rephrase_prompt = pull_prompt("langchain-ai/chat-langchain-rephrase")
 
-    history_aware_retriever = create_history_aware_retriever(
-        llm=chat,
-        retriever=docsearch.as_retriever(),
-        prompt=rephrase_prompt,
-    )
+    if retrieval_mode == "sequential":
+        _speculative = None
+        history_aware_retriever = create_history_aware_retriever(
+            llm=chat,
+            retriever=retriever,
+            prompt=rephrase_prompt,
+        )
+    elif retrieval_mode == "speculative":
+        from backend.speculative_retriever import SpeculativeRetriever
+
+        # retrieve the question as typed while the rephrase runs, merge with the rephrased results
+        _speculative = SpeculativeRetriever(chat, retriever, rephrase_prompt, multi_query=multi_query)
+        history_aware_retriever = _speculative.as_runnable()
+    else:
+        raise ValueError(f"Unknown RETRIEVAL_MODE {retrieval_mode!r}, expected sequential or speculative")
 
     # create a retrieval chain
     qa = create_retrieval_chain(
@@ -58,6 +183,168 @@ def run_llm(
         combine_docs_chain=stuff_documents_chain,
     )
 
+    return qa
+
+
+def get_qa_chain() -> Runnable:
+    """Return the process-wide retrieval chain, building it on first use."""
+    global _qa_chain
+    if _qa_chain is None:
+        with _qa_chain_lock:
+            # double-checked: another thread may have built it while we waited
+            if _qa_chain is None:
+                _qa_chain = build_qa_chain()
+    return _qa_chain
+
+
+def warm_up() -> None:
+    """Build the chain ahead of the first query (call this at startup).
+
+    The first start on a fresh machine downloads the hub prompts and
+    tiktoken's vocabulary; later starts read both from the project's .cache."""
+    get_qa_chain()
+    _encoding()
+
+
+@lru_cache(maxsize=1)
+def _encoding() -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(CHAT_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def _message_text(message: Any) -> str:
+    if isinstance(message, (list, tuple)):  # ("human", "...") as sent by main.py
+        return str(message[-1])
+    if isinstance(message, dict):
+        return str(message.get("content", ""))
+    return str(getattr(message, "content", message))
+
+
+def _message_role(message: Any) -> str:
+    if isinstance(message, (list, tuple)):
+        return str(message[0])
+    if isinstance(message, dict):
+        return str(message.get("role", message.get("type", "")))
+    return str(getattr(message, "type", ""))
+
+
+def _turns(chat_history: List[Any]) -> List[List[Any]]:
+    """Group the history into turns, each starting at a user message (with the replies to it)."""
+    turns: List[List[Any]] = []
+    for message in chat_history:
+        if not turns or _message_role(message) in ("human", "user"):
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def trim_chat_history(
+    chat_history: List[Any],
+    max_tokens: int = CHAT_HISTORY_TOKEN_BUDGET,
+) -> List[Any]:
+    """Keep the most recent turns that fit in `max_tokens` (at least the last one).
+
+    Whole turns are dropped, so a question never loses its answer (or the
+    other way round). Older turns are dropped, not summarized: a summary
+    would cost another LLM call per query."""
+    if not chat_history:
+        return []
+    encoding = _encoding()
+    trimmed: List[List[Any]] = []
+    used = 0
+    for turn in reversed(_turns(chat_history)):
+        # encode_ordinary: the history is user input, and may contain text like <|endoftext|>
+        used += sum(len(encoding.encode_ordinary(_message_text(message))) for message in turn)
+        if used > max_tokens and trimmed:
+            break
+        trimmed.append(turn)
+    return [message for turn in reversed(trimmed) for message in turn]
+
+
+def embedding_cache_stats() -> Dict[str, float]:
+    """Hits / misses of the query embedding cache since the chain was built."""
+    return _embeddings.stats() if _embeddings is not None else {}
+
+
+def query_batch_stats() -> Dict[str, float]:
+    """Query embeddings and the batched requests they were sent in."""
+    return _query_embeddings.stats() if _query_embeddings is not None else {}
+
+
+def chunk_store_stats() -> Dict[str, Any]:
+    """Chunks in the local chunk store and how well they compress."""
+    return _chunk_store.stats() if _chunk_store is not None else {}
+
+
+def speculative_retrieval_stats() -> Dict[str, int]:
+    """Follow-ups retrieved speculatively, and how the speculative search was used."""
+    return _speculative.stats() if _speculative is not None else {}
+
+
+def source_urls(documents: Sequence[Document]) -> Set[str]:
+    """Source URLs of retrieved chunks, read from the chunk store's index when there is one."""
+    sources = _chunk_store.sources([doc.id for doc in documents if doc.id]) if _chunk_store is not None else {}
+    return {sources.get(doc.id) or doc.metadata["source"] for doc in documents}
+
+
+def answer_cache_stats() -> Dict[str, float]:
+    """Hits / misses of the semantic answer cache."""
+    return answer_cache.stats()
+
+
+def _lookup(query: str, query_vector: List[float], chat_history: List[Any]) -> Optional[Dict[str, Any]]:
+    cached = answer_cache.lookup(query_vector, chat_history)
+    return {**cached, "query": query} if cached is not None else None
+
+
+def _prepare(query: str, chat_history: List[Any]) -> Tuple[List[Any], List[float], Optional[Dict[str, Any]]]:
+    """Trimmed history, query embedding, and the cached answer to a near-duplicate question if there is one."""
+    # long sessions: rephrase from the recent turns only
+    chat_history = trim_chat_history(chat_history)
+    query_vector = _embeddings.embed_query(query)
+    return chat_history, query_vector, _lookup(query, query_vector, chat_history)
+
+
+async def _aprepare(query: str,
+                    chat_history: List[Any]) -> Tuple[List[Any], List[float], Optional[Dict[str, Any]]]:
+    """Async variant of _prepare."""
+    chat_history = trim_chat_history(chat_history)
+    query_vector = await _embeddings.aembed_query(query)
+    return chat_history, query_vector, _lookup(query, query_vector, chat_history)
+
+
+def _remember(query: str,
+              query_vector: List[float],
+              chat_history: List[Any],
+              answer: str,
+              source_documents: List[Document]) -> Dict[str, Any]:
+    """Store an answer in the answer cache, in run_llm's result format."""
+    result = {
+        "query": query,
+        "result": answer,
+        "source_documents": source_documents,
+    }
+    answer_cache.store(query_vector, chat_history, result)
+    return result
+
+
+def _cached_chunks(cached: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """A cached answer as the chunks of stream_llm."""
+    return [{"source_documents": cached["source_documents"]}, {"answer": cached["result"]}]
+
+
+def run_llm(
+    query: str,
+    chat_history: List[Dict[str, Any]] = [],
+):
+    qa = get_qa_chain()
+    # a near-duplicate question was answered already: skip rephrase + completion
+    chat_history, query_vector, cached = _prepare(query, chat_history)
+    if cached is not None:
+        return cached
+
     # invoke chain
     result = qa.invoke(
         input={
@@ -65,24 +352,97 @@ def run_llm(
             "chat_history": chat_history,
         }
     )
+    return _remember(query, query_vector, chat_history, result["answer"], result["context"])
 
-    # change dict's key name
-    new_result = {
-        "query": result["input"],
-        "result": result["answer"],
-        "source_documents": result["context"],
-    }
 
-    return new_result
+def stream_llm(
+    query: str,
+    chat_history: List[Dict[str, Any]] = [],
+) -> Iterator[Dict[str, Any]]:
+    """Streaming variant of run_llm.
+
+    Yields {"source_documents": [...]} as soon as retrieval is done, then
+    {"answer": "<token>"} for every token of the answer as it arrives."""
+    qa = get_qa_chain()
+    chat_history, query_vector, cached = _prepare(query, chat_history)
+    if cached is not None:
+        yield from _cached_chunks(cached)
+        return
+
+    source_documents = []
+    answer = []
+    for chunk in qa.stream(
+        input={
+            "input": query,
+            "chat_history": chat_history,
+        }
+    ):
+        if "context" in chunk:
+            source_documents = chunk["context"]
+            yield {"source_documents": source_documents}
+        if chunk.get("answer"):
+            answer.append(chunk["answer"])
+            yield {"answer": chunk["answer"]}
+
+    _remember(query, query_vector, chat_history, "".join(answer), source_documents)
+
+
+async def arun_llm(
+    query: str,
+    chat_history: List[Dict[str, Any]] = [],
+) -> Dict[str, Any]:
+    """Async variant of run_llm (used by backend/api.py)."""
+    qa = get_qa_chain()
+    chat_history, query_vector, cached = await _aprepare(query, chat_history)
+    if cached is not None:
+        return cached
+
+    result = await qa.ainvoke(
+        input={
+            "input": query,
+            "chat_history": chat_history,
+        }
+    )
+    return _remember(query, query_vector, chat_history, result["answer"], result["context"])
+
+
+async def astream_llm(
+    query: str,
+    chat_history: List[Dict[str, Any]] = [],
+) -> AsyncIterator[Dict[str, Any]]:
+    """Async variant of stream_llm: same chunks, from the chain's async stream."""
+    qa = get_qa_chain()
+    chat_history, query_vector, cached = await _aprepare(query, chat_history)
+    if cached is not None:
+        for chunk in _cached_chunks(cached):
+            yield chunk
+        return
+
+    source_documents = []
+    answer = []
+    async for chunk in qa.astream(
+        input={
+            "input": query,
+            "chat_history": chat_history,
+        }
+    ):
+        if "context" in chunk:
+            source_documents = chunk["context"]
+            yield {"source_documents": source_documents}
+        if chunk.get("answer"):
+            answer.append(chunk["answer"])
+            yield {"answer": chunk["answer"]}
+
+    _remember(query, query_vector, chat_history, "".join(answer), source_documents)
 
 
 if __name__ == "__main__":
     res = run_llm(query="What is a LangChain chain?")
-    print(f"Answer: {res['answer']}")
+    print(f"Answer: {res['result']}")
     print("\nGrounding Documents:")
     for doc in res.get(
-        "context",
-        [],  # return `None` if "context" is missing
+        "source_documents",
+        [],  # return `None` if "source_documents" is missing
     ):
         # Each Document’s metadata typically contains both the vector‑store id and its original source
         doc_id = doc.id  # vector id
@@ -0,0 +1,151 @@
+"""Micro-batching of query embeddings.
+
+Every run_llm call embeds its query, and each of those was one embeddings
+request: with many users asking at once, the requests-per-minute limit is
+hit long before the token limit. BatchingEmbeddings holds concurrent
+embed_query / aembed_query calls for up to QUERY_BATCH_MAX_WAIT_MS (or until
+QUERY_BATCH_SIZE queries are waiting), sends them as one embed_documents
+request and hands every caller its own vector.
+
+Async callers are batched per event loop, sync callers (Streamlit sessions,
+API thread pool) among themselves: the first caller of a batch waits for
+the others and makes the request. QUERY_BATCH_SIZE=1 turns batching off.
+"""
+import asyncio
+import os
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+from langchain_core.embeddings import Embeddings
+
+QUERY_BATCH_SIZE = int(os.getenv("QUERY_BATCH_SIZE", "64"))
+QUERY_BATCH_MAX_WAIT_MS = float(os.getenv("QUERY_BATCH_MAX_WAIT_MS", "5"))
+
+
+class _Batch:
+    def __init__(self, future: Optional[asyncio.Future] = None):
+        self.texts: List[str] = []
+        self.future = future  # async batches: resolves to the vectors
+        self.full = threading.Event()  # sync batches: the leader can stop waiting
+        self.done = threading.Event()
+        self.vectors: List[List[float]] = []
+        self.error: Optional[BaseException] = None
+
+    def add(self, text: str) -> int:
+        self.texts.append(text)
+        return len(self.texts) - 1
+
+    def unique_texts(self) -> List[str]:
+        return list(dict.fromkeys(self.texts))
+
+
+class BatchingEmbeddings(Embeddings):
+    """Embeddings whose embed_query / aembed_query calls are sent in batches."""
+
+    def __init__(self,
+                 embeddings: Embeddings,
+                 max_batch: int = QUERY_BATCH_SIZE,
+                 max_wait_ms: float = QUERY_BATCH_MAX_WAIT_MS):
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.lock = threading.Lock()
+        self._sync_batch: Optional[_Batch] = None
+        self._async_batches: Dict[asyncio.AbstractEventLoop, _Batch] = {}
+        # the loop only keeps weak references to tasks: hold the sends until they finish
+        self._sends: Set[asyncio.Task] = set()
+        self.queries = 0
+        self.requests = 0
+
+    @property
+    def model(self) -> Optional[str]:
+        # CachedEmbeddings keys its cache by the wrapped model's name
+        return getattr(self.embeddings, "model", None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def _vectors(self, batch: _Batch, embedded: List[List[float]]) -> List[List[float]]:
+        by_text = dict(zip(batch.unique_texts(), embedded))
+        return [by_text[text] for text in batch.texts]
+
+    # --- sync callers ---------------------------------------------------------------
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.max_batch <= 1:
+            return self.embeddings.embed_query(text)
+        with self.lock:
+            self.queries += 1
+            batch = self._sync_batch
+            leader = batch is None
+            if leader:
+                batch = self._sync_batch = _Batch()
+            index = batch.add(text)
+            if len(batch.texts) >= self.max_batch:
+                self._sync_batch = None
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.max_wait)
+            with self.lock:
+                if self._sync_batch is batch:
+                    self._sync_batch = None
+                self.requests += 1
+            try:
+                batch.vectors = self._vectors(batch, self.embeddings.embed_documents(batch.unique_texts()))
+            except Exception as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.vectors[index]
+
+    # --- async callers --------------------------------------------------------------
+
+    async def aembed_query(self, text: str) -> List[float]:
+        if self.max_batch <= 1:
+            return await self.embeddings.aembed_query(text)
+        loop = asyncio.get_running_loop()
+        self.queries += 1
+        batch = self._async_batches.get(loop)
+        if batch is None:
+            batch = self._async_batches[loop] = _Batch(loop.create_future())
+            loop.call_later(self.max_wait, self._flush, loop, batch)
+        index = batch.add(text)
+        if len(batch.texts) >= self.max_batch:
+            self._flush(loop, batch)
+        # a cancelled caller must not cancel the request the others are waiting for
+        vectors = await asyncio.shield(batch.future)
+        return vectors[index]
+
+    def _flush(self, loop: asyncio.AbstractEventLoop, batch: _Batch) -> None:
+        if self._async_batches.get(loop) is not batch:
+            return  # already sent (it filled up before the timer fired)
+        del self._async_batches[loop]
+        self.requests += 1
+        send = loop.create_task(self._send(batch))
+        self._sends.add(send)
+        send.add_done_callback(self._sends.discard)
+
+    async def _send(self, batch: _Batch) -> None:
+        try:
+            embedded = await self.embeddings.aembed_documents(batch.unique_texts())
+            batch.future.set_result(self._vectors(batch, embedded))
+        except asyncio.CancelledError:
+            batch.future.cancel()
+            raise
+        except Exception as e:
+            batch.future.set_exception(e)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queries embedded and requests sent so far."""
+        return {"queries": self.queries,
+                "requests": self.requests,
+                "mean_batch_size": self.queries / self.requests if self.requests else 0.0}
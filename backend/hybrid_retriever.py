@@ -0,0 +1,45 @@
+"""Hybrid retrieval: dense vector hits fused with BM25 keyword hits.
+
+The two rankings are combined with reciprocal-rank fusion: a document scores
+sum(1 / (RRF_K + rank)) over the rankings it appears in, so exact API
+identifiers found by BM25 make it into the context even when the embedding
+search ranks them low (or not at all).
+"""
+from typing import Any, Dict, List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from bm25_index import BM25Index
+
+RRF_K = 60  # dampens the weight of the top ranks (value from the original RRF paper)
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int = RRF_K) -> List[Document]:
+    """Merge ranked lists of documents, best first (documents are matched by id)."""
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc.id or doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1 / (k + rank)
+            documents.setdefault(key, doc)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class HybridRetriever(BaseRetriever):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vector_retriever: BaseRetriever
+    keyword_index: BM25Index
+    k: int = 4  # documents returned after fusion
+    fetch_k: int = 20  # documents fetched from the keyword index before fusion
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, **kwargs: Any
+    ) -> List[Document]:
+        dense = self.vector_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        sparse = self.keyword_index.similarity_search(query, k=self.fetch_k)
+        return reciprocal_rank_fusion([dense, sparse])[: self.k]
@@ -0,0 +1,140 @@
+"""Rerank over-fetched candidates and pack the best ones into a token budget.
+
+The retriever fetches more chunks than the answer prompt needs; this stage
+scores them against the query, drops near-duplicates and keeps the best ones
+that fit in `max_tokens` (counted with the chat model's tiktoken encoding),
+so the prompt stays small no matter how large the chunks are.
+
+RERANKER=lexical        BM25 over the candidates, fused with the retrieval
+                        order (default, no extra dependency)
+RERANKER=cross-encoder  sentence-transformers cross-encoder (RERANKER_MODEL),
+                        more accurate, needs `sentence-transformers` installed
+RERANKER=none           keep the retrieval order (still dedups + packs)
+"""
+import math
+import os
+from collections import Counter
+from typing import Any, List, Sequence
+
+import tiktoken
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from backend.hybrid_retriever import reciprocal_rank_fusion
+from bm25_index import B, K1, tokenize
+
+RERANKER = os.getenv("RERANKER", "lexical")
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))  # Jaccard similarity of word 3-grams
+SHINGLE_SIZE = 3
+
+
+def lexical_scores(query: str, documents: Sequence[Document]) -> List[float]:
+    """BM25 score of every document, with the statistics of the candidate set."""
+    doc_tokens = [tokenize(doc.page_content) for doc in documents]
+    avg_length = sum(map(len, doc_tokens)) / len(doc_tokens) or 1.0
+    tfs = [Counter(tokens) for tokens in doc_tokens]
+    scores = [0.0] * len(documents)
+    for term in set(tokenize(query)):
+        df = sum(term in tf for tf in tfs)
+        if not df:
+            continue
+        idf = math.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+        for i, (tf, tokens) in enumerate(zip(tfs, doc_tokens)):
+            if term in tf:
+                norm = K1 * (1 - B + B * len(tokens) / avg_length)
+                scores[i] += idf * tf[term] * (K1 + 1) / (tf[term] + norm)
+    return scores
+
+
+_cross_encoders = {}
+
+
+def cross_encoder_scores(query: str, documents: Sequence[Document], model: str = RERANKER_MODEL) -> List[float]:
+    if model not in _cross_encoders:
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError as e:
+            raise ImportError("RERANKER=cross-encoder needs `pip install sentence-transformers`") from e
+        _cross_encoders[model] = CrossEncoder(model, device="cpu")
+    return [float(s) for s in _cross_encoders[model].predict([(query, doc.page_content) for doc in documents])]
+
+
+def rerank(query: str, documents: List[Document], method: str = RERANKER) -> List[Document]:
+    """Candidates, best first."""
+    if method == "none" or len(documents) < 2:
+        return documents
+    if method == "lexical":
+        scores = lexical_scores(query, documents)
+        by_score = [doc for _, doc in sorted(zip(scores, documents), key=lambda x: -x[0])]
+        # keep the retriever's opinion: fuse both orders instead of trusting term overlap alone
+        return reciprocal_rank_fusion([documents, by_score])
+    if method == "cross-encoder":
+        scores = cross_encoder_scores(query, documents)
+        return [doc for _, doc in sorted(zip(scores, documents), key=lambda x: -x[0])]
+    raise ValueError(f"Unknown RERANKER {method!r}, expected lexical, cross-encoder or none")
+
+
+def _shingles(text: str) -> set:
+    words = text.lower().split()
+    return {" ".join(words[i: i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))}
+
+
+def drop_near_duplicates(documents: List[Document], threshold: float = DEDUP_THRESHOLD) -> List[Document]:
+    """Keep the first (best ranked) of every group of near-identical chunks."""
+    kept, kept_shingles = [], []
+    for doc in documents:
+        shingles = _shingles(doc.page_content)
+        if any(len(shingles & other) / (len(shingles | other) or 1) >= threshold for other in kept_shingles):
+            continue
+        kept.append(doc)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def pack(documents: List[Document], encoding: tiktoken.Encoding, max_tokens: int = CONTEXT_TOKEN_BUDGET) -> List[Document]:
+    """Greedily keep the best documents that fit in `max_tokens`.
+
+    A document that doesn't fit is skipped (a smaller one further down may);
+    if not even the best one fits, it is truncated to the budget."""
+    packed = []
+    used = 0
+    for doc in documents:
+        tokens = encoding.encode_ordinary(doc.page_content)  # the docs quote tokens like <|endoftext|>
+        if used + len(tokens) <= max_tokens:
+            packed.append(doc)
+            used += len(tokens)
+        elif not packed:
+            packed.append(Document(id=doc.id,
+                                   page_content=encoding.decode(tokens[:max_tokens]),
+                                   metadata=doc.metadata))
+            used = max_tokens
+        if used >= max_tokens:
+            break
+    return packed
+
+
+class RerankingRetriever(BaseRetriever):
+    """Fetch candidates from `base_retriever`, rerank, dedup and pack them."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    base_retriever: BaseRetriever
+    encoding: Any  # tiktoken.Encoding, or anything with encode_ordinary() / decode()
+    method: str = RERANKER
+    max_tokens: int = CONTEXT_TOKEN_BUDGET
+    dedup_threshold: float = DEDUP_THRESHOLD
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, **kwargs: Any
+    ) -> List[Document]:
+        candidates = self.base_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        return self.rank(query, candidates)
+
+    def rank(self, query: str, candidates: List[Document]) -> List[Document]:
+        """Rerank, dedup and pack candidates fetched elsewhere (see backend/speculative_retriever.py)."""
+        ranked = drop_near_duplicates(rerank(query, candidates, self.method), self.dedup_threshold)
+        return pack(ranked, self.encoding, self.max_tokens)
@@ -0,0 +1,218 @@
+"""Speculative retrieval: search for the question as typed while it is being rephrased.
+
+With a chat history, create_history_aware_retriever first asks the chat model
+for a standalone question and only then retrieves it, so a follow-up waits
+for an LLM call and a retrieval back to back. RETRIEVAL_MODE=speculative
+starts retrieving the question as typed at the same time as the rephrase:
+
+  unchanged   the standalone question is the one typed (same words, ignoring
+              case and punctuation): the speculative results are what the
+              sequential chain would have retrieved and are used as they are,
+              so the retrieval no longer adds to the latency (if that search
+              failed, the standalone question is retrieved after all)
+  rephrased   the standalone question is retrieved, and the speculative
+              results are merged in (reciprocal-rank fusion, deduplicated by
+              id) if they are ready by then; if not, the speculative search is
+              cancelled rather than waited for (the sync path can't stop a
+              running thread: its result is dropped)
+
+MULTI_QUERY=n (speculative mode only) also asks the chat model, concurrently
+with the rephrase, for n other phrasings of the question, retrieves them
+concurrently and fuses their results in: more recall, for an extra LLM call
+that the turn waits for.
+
+Candidates are merged before the reranker (backend/reranker.py), which ranks,
+dedups and packs them for the standalone question, so the context stays in
+CONTEXT_TOKEN_BUDGET. A first turn has no rephrase step and is retrieved
+directly, as before. Every follow-up costs one more query embedding and
+vector search (the unchanged ones save the second).
+benchmarks/bench_speculative_retrieval.py measures the latency.
+"""
+import asyncio
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import BasePromptTemplate, ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+
+from backend.hybrid_retriever import reciprocal_rank_fusion
+from backend.reranker import RerankingRetriever
+
+MULTI_QUERY_PROMPT = ChatPromptTemplate.from_messages([
+    MessagesPlaceholder("chat_history"),
+    ("human", "Write {n} different search queries for the documentation that would answer this follow up "
+              "question, one per line, with nothing else: {input}"),
+])
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    """Threads for the speculative searches of the sync path (shared by every caller)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="speculative-retrieval")
+    return _executor
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def same_question(a: str, b: str) -> bool:
+    """Same words in the same order (the rephrase often only fixes case or punctuation)."""
+    return _words(a) == _words(b)
+
+
+def parse_queries(text: str, n: int, question: str) -> List[str]:
+    """Up to `n` distinct queries from the model's answer, one per line, minus list markers."""
+    queries: List[str] = []
+    for line in text.splitlines():
+        line = re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", line).strip().strip('"')
+        if line and not any(same_question(line, other) for other in [question, *queries]):
+            queries.append(line)
+    return queries[:n]
+
+
+class SpeculativeRetriever:
+    """Drop-in for create_history_aware_retriever: {"input", "chat_history"} -> documents."""
+
+    def __init__(self,
+                 llm: BaseLanguageModel,
+                 retriever: BaseRetriever,
+                 prompt: BasePromptTemplate,
+                 multi_query: int = 0):
+        if "input" not in prompt.input_variables:
+            raise ValueError(f"Expected `input` to be a prompt variable, but got {prompt.input_variables}")
+        self.retriever = retriever
+        # merge candidates, then rerank them once (or, without a reranker, keep the best of the fusion)
+        if isinstance(retriever, RerankingRetriever):
+            self.candidates, self.rank = retriever.base_retriever, retriever.rank
+        else:
+            self.candidates, self.rank = retriever, None
+        self.rephrase = prompt | llm | StrOutputParser()
+        self.multi_query = multi_query
+        self.paraphrase = (MULTI_QUERY_PROMPT.partial(n=str(multi_query)) | llm | StrOutputParser()
+                           if multi_query > 0 else None)
+        self._lock = threading.Lock()
+        self._counts = {"follow_ups": 0, "unchanged": 0, "merged": 0, "cancelled": 0, "fan_out_queries": 0}
+
+    def as_runnable(self) -> Runnable:
+        return RunnableLambda(self._invoke, afunc=self._ainvoke, name="speculative_retriever")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def _count(self, outcome: str, fan_out_queries: int) -> None:
+        with self._lock:
+            self._counts["follow_ups"] += 1
+            self._counts[outcome] += 1
+            self._counts["fan_out_queries"] += fan_out_queries
+
+    def _merge(self, question: str, rankings: List[List[Document]]) -> List[Document]:
+        merged = reciprocal_rank_fusion(rankings) if len(rankings) > 1 else rankings[0]
+        if self.rank is not None:
+            return self.rank(question, merged)
+        return merged[: max(map(len, rankings))]
+
+    # --- sync (run_llm, stream_llm) ---------------------------------------------------
+
+    def _invoke(self, inputs: Dict[str, Any], config: RunnableConfig) -> List[Document]:
+        query = inputs["input"]
+        if not inputs.get("chat_history"):
+            return self.retriever.invoke(query, config)
+
+        pool = _pool()
+        speculative = pool.submit(self.candidates.invoke, query, config)
+        paraphrases = fan_out = None
+        if self.paraphrase is not None:
+            paraphrases = pool.submit(self.paraphrase.invoke, inputs, config)
+            fan_out = Future()  # the searches of the phrasings, started as soon as they are written
+
+            def start_fan_out(done: Future) -> None:
+                try:
+                    queries = parse_queries(done.result(), self.multi_query, query)
+                except BaseException:  # more recall if it works, not worth failing the turn for
+                    queries = []
+                fan_out.set_result([pool.submit(self.candidates.invoke, q, config) for q in queries])
+
+            paraphrases.add_done_callback(start_fan_out)
+
+        try:
+            standalone = self.rephrase.invoke(inputs, config)
+            if same_question(standalone, query):
+                try:
+                    rankings = [speculative.result()]
+                except Exception:  # the speculative search failed: run it again, as the sequential chain would
+                    rankings = [self.candidates.invoke(standalone, config)]
+                outcome = "unchanged"
+            else:
+                rankings = [self.candidates.invoke(standalone, config)]
+                if speculative.done() and speculative.exception() is None:
+                    rankings.append(speculative.result())
+                    outcome = "merged"
+                else:
+                    outcome = "cancelled"
+            searches = fan_out.result() if fan_out is not None else []
+            for future in searches:
+                try:
+                    rankings.append(future.result())
+                except Exception:
+                    pass
+        finally:
+            speculative.cancel()
+            if paraphrases is not None:
+                paraphrases.cancel()
+        self._count(outcome, len(searches))
+        return self._merge(standalone, rankings)
+
+    # --- async (arun_llm, astream_llm) -------------------------------------------------
+
+    async def _fan_out(self, inputs: Dict[str, Any], config: RunnableConfig) -> List[List[Document]]:
+        try:
+            queries = parse_queries(await self.paraphrase.ainvoke(inputs, config), self.multi_query, inputs["input"])
+        except Exception:
+            return []
+        results = await asyncio.gather(*(self.candidates.ainvoke(q, config) for q in queries),
+                                       return_exceptions=True)
+        return [result for result in results if not isinstance(result, BaseException)]
+
+    async def _ainvoke(self, inputs: Dict[str, Any], config: RunnableConfig) -> List[Document]:
+        query = inputs["input"]
+        if not inputs.get("chat_history"):
+            return await self.retriever.ainvoke(query, config)
+
+        speculative = asyncio.create_task(self.candidates.ainvoke(query, config))
+        fan_out = asyncio.create_task(self._fan_out(inputs, config)) if self.paraphrase else None
+        try:
+            standalone = await self.rephrase.ainvoke(inputs, config)
+            if same_question(standalone, query):
+                try:
+                    rankings = [await speculative]
+                except Exception:  # the speculative search failed: run it again, as the sequential chain would
+                    rankings = [await self.candidates.ainvoke(standalone, config)]
+                outcome = "unchanged"
+            else:
+                rankings = [await self.candidates.ainvoke(standalone, config)]
+                if speculative.done() and not speculative.cancelled() and speculative.exception() is None:
+                    rankings.append(speculative.result())
+                    outcome = "merged"
+                else:
+                    outcome = "cancelled"
+            extra = await fan_out if fan_out is not None else []
+        finally:
+            speculative.cancel()
+            if fan_out is not None:
+                fan_out.cancel()
+        self._count(outcome, len(extra))
+        return self._merge(standalone, rankings + extra)
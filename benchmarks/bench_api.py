@@ -0,0 +1,139 @@
+"""Load test of the HTTP API with stubbed LLM and vector store backends.
+
+Replays `n_requests` POST /query calls, `concurrency` at a time, drawn from a
+small set of distinct questions (popular questions get asked together), against:
+
+  before  the previous API: sync endpoint, run_llm in FastAPI's thread pool,
+          every request runs the chain
+  after   backend/api.py: async chain calls, identical in-flight requests
+          coalesced, at most API_MAX_CONCURRENCY chain calls at a time
+
+The chat model answers after `llm_latency` seconds and the retriever after
+50 ms, without spending any CPU, so only the serving path is measured. The
+answer cache is disabled. Also reports time to first line of /query/stream.
+
+usage: python -m benchmarks.bench_api [n_requests] [concurrency] [n_distinct] [llm_latency]
+"""
+import asyncio
+import sys
+import tempfile
+import time
+from typing import Any, List
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.retrievers import BaseRetriever
+
+from backend import api, core
+from benchmarks.bench_time_to_first_token import ANSWER, StubChatModel, setup
+
+RETRIEVER_LATENCY = 0.05
+
+
+class CountingChatModel(StubChatModel):
+    """Answers after `sleep` seconds in total, blocking (sync) or not (async)."""
+
+    calls: int = 0
+
+    def _call(self, *args, **kwargs) -> str:
+        self.calls += 1
+        time.sleep(self.sleep)
+        return ANSWER
+
+    async def _agenerate(self, *args, **kwargs) -> ChatResult:
+        self.calls += 1
+        await asyncio.sleep(self.sleep)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=ANSWER))])
+
+
+class SlowRetriever(BaseRetriever):
+    documents: List[Document]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                **kwargs: Any) -> List[Document]:
+        time.sleep(RETRIEVER_LATENCY)
+        return self.documents
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun,
+                                       **kwargs: Any) -> List[Document]:
+        await asyncio.sleep(RETRIEVER_LATENCY)
+        return self.documents
+
+
+def before_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/query")
+    def query(request: api.QueryRequest):
+        result = core.run_llm(query=request.query, chat_history=request.chat_history)
+        return {"query": result["query"], "result": result["result"],
+                "sources": api.sources(result["source_documents"])}
+
+    return app
+
+
+async def load(app: FastAPI, queries: List[str], concurrency: int) -> tuple[float, List[float]]:
+    slots = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://api",
+                                 timeout=None) as client:
+        async def one(query: str):
+            async with slots:
+                start = time.perf_counter()
+                response = await client.post("/query", json={"query": query, "chat_history": []})
+                response.raise_for_status()
+                timings.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(q) for q in queries))
+        return time.perf_counter() - start, timings
+
+
+async def first_stream_line(query: str) -> float:
+    # httpx's ASGI transport buffers the whole body: read the endpoint's response directly
+    start = time.perf_counter()
+    response = await api.query_stream(api.QueryRequest(query=query))
+    async for _ in response.body_iterator:
+        return time.perf_counter() - start
+
+
+def main(n_requests: int = 400, concurrency: int = 64, n_distinct: int = 40, llm_latency: float = 1.0):
+    rng = np.random.default_rng(0)
+    # Zipf-like popularity: a few questions make up most of the traffic
+    popularity = 1 / np.arange(1, n_distinct + 1)
+    queries = [f"what is a chain? ({i})" for i in rng.choice(n_distinct, n_requests, p=popularity / popularity.sum())]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup(tmp, token_delay=0)
+        documents = [Document(page_content=f"page {i} about chains", metadata={"source": f"https://docs/{i}"})
+                     for i in range(4)]
+        chat = CountingChatModel(responses=[ANSWER], sleep=llm_latency)
+        embeddings = core._embeddings  # the fake embeddings of setup(), build_qa_chain replaces them
+        core._qa_chain = core.build_qa_chain(chat=chat, retriever=SlowRetriever(documents=documents))
+        core._embeddings = embeddings
+
+        print(f"{n_requests} requests, {concurrency} concurrent clients, {n_distinct} distinct questions, "
+              f"LLM {llm_latency * 1000:.0f} ms, retriever {RETRIEVER_LATENCY * 1000:.0f} ms")
+        for name, app in (("before", before_app()), ("after", api.app)):
+            chat.calls = 0
+            elapsed, timings = asyncio.run(load(app, queries, concurrency))
+            print(f"{name:<7} {n_requests / elapsed:7.1f} req/s  p50 {np.percentile(timings, 50) * 1000:7.0f} ms  "
+                  f"p95 {np.percentile(timings, 95) * 1000:7.0f} ms  {chat.calls} LLM calls")
+
+        chat.sleep = 0.002  # per streamed token
+        ttfl = asyncio.run(first_stream_line("what is a retriever?"))
+        print(f"/query/stream first line after {ttfl * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if len(args) > 0 else 400,
+         int(args[1]) if len(args) > 1 else 64,
+         int(args[2]) if len(args) > 2 else 40,
+         float(args[3]) if len(args) > 3 else 1.0)
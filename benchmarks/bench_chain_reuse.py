@@ -0,0 +1,56 @@
+"""Compare the per-query setup overhead of run_llm before and after chain reuse.
+
+"before": every query rebuilds embeddings, vectorstore, chat model, prompts and chain
+          (what run_llm used to do, with hub.pull hitting the network each time)
+"after":  every query fetches the process-wide chain from get_qa_chain()
+
+Only the setup is timed, not the LLM call itself, so no tokens are spent.
+
+usage: python -m benchmarks.bench_chain_reuse [n_queries]
+"""
+import shutil
+import sys
+import time
+from statistics import mean, median
+
+from backend import core
+
+
+def time_calls(fn, n: int) -> list[float]:
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label: str, timings: list[float]):
+    print(f"{label:<32} mean={mean(timings):9.3f} ms  median={median(timings):9.3f} ms")
+
+
+def main(n: int = 10):
+    # before: no prompt cache, chain rebuilt on every query
+    shutil.rmtree(core.HUB_CACHE_DIR, ignore_errors=True)
+
+    def build_uncached():
+        shutil.rmtree(core.HUB_CACHE_DIR, ignore_errors=True)
+        core.build_qa_chain()
+
+    before = time_calls(build_uncached, n)
+
+    # cold start with the prompts already cached on disk
+    cold = time_calls(core.build_qa_chain, n)
+
+    # after: shared chain
+    core.warm_up()
+    after = time_calls(core.get_qa_chain, n)
+
+    print(f"per-query setup overhead over {n} queries")
+    report("before (rebuild + hub.pull)", before)
+    report("cold start (disk prompt cache)", cold)
+    report("after (shared chain)", after)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
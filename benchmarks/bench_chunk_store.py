@@ -0,0 +1,91 @@
+"""Local chunk store (chunk_store.py): compression, hydration latency and bytes on the wire.
+
+Stores the chunks of the bundled langchain-docs corpus (parsed like
+ingestion.py does, with ingestion2.py's chunk ids) in a ChunkStore, with and
+without the trained zstd dictionary, then
+
+  * hydrates `n_queries` retrievals of k=20 random ids (what every query
+    does after the vector search) and reports the latency,
+  * compares the Pinecone request / response bodies of an upsert and of a
+    query's matches with the chunk text in the metadata (before) and with
+    only the source URL (after). Vectors are text-embedding-3-small sized.
+
+usage: python -m benchmarks.bench_chunk_store [n_queries]
+"""
+import json
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+import docs_loader
+from chunk_store import CHUNK_STORE_DICT_SAMPLES, CHUNK_STORE_METADATA, ChunkStore
+from manifest import chunk_id
+
+K = 20
+DIM = 1536
+BATCH = 500  # chunks per put, like INDEX_BATCH_SIZE
+
+
+def fill(store: ChunkStore, ids, texts, metadatas) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(ids), BATCH):
+        store.put(ids[i: i + BATCH], texts[i: i + BATCH], metadatas[i: i + BATCH])
+    return time.perf_counter() - start
+
+
+def wire_bytes(ids, texts, metadatas, ids_only: bool):
+    """JSON bytes of upserting every chunk, and of the matches of one query (k=K, metadata only)."""
+    rng = np.random.default_rng(0)
+    vector = [round(float(x), 8) for x in rng.standard_normal(DIM)]
+    upsert = query = 0
+    for id_, text, metadata in zip(ids, texts, metadatas):
+        if ids_only:
+            metadata = {**{key: metadata[key] for key in CHUNK_STORE_METADATA if key in metadata}, "text": ""}
+        else:
+            metadata = {**metadata, "text": text}
+        upsert += len(json.dumps({"id": id_, "values": vector, "metadata": metadata}))
+        query += len(json.dumps({"id": id_, "score": 0.5, "values": [], "metadata": metadata}))
+    return upsert, query * K / len(ids)
+
+
+def main(n_queries: int = 2000):
+    docs = []
+    for chunks in docs_loader.load_and_split_parallel():
+        docs += [(chunk_id(doc.metadata["source"], i), doc) for i, doc in enumerate(chunks)]
+    ids = [id_ for id_, _ in docs]
+    texts = [doc.page_content for _, doc in docs]
+    metadatas = [doc.metadata for _, doc in docs]
+    raw = sum(len(text.encode()) for text in texts)
+    print(f"{len(ids)} chunks, {raw / 1e6:.1f} MB of text, {n_queries} hydrations of {K} ids")
+    print(f"{'store':<14}{'ratio':>7}{'stored MB':>11}{'put chunks/s':>14}{'hydrate p50':>13}{'p95':>9}")
+
+    rng = np.random.default_rng(1)
+    lookups = [[ids[i] for i in rng.choice(len(ids), K, replace=False)] for _ in range(n_queries)]
+    for name, dict_samples in (("no dictionary", 0), ("dictionary", CHUNK_STORE_DICT_SAMPLES)):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = ChunkStore("bench", tmp, dict_samples=dict_samples)
+            seconds = fill(store, ids, texts, metadatas)
+            stats = store.stats()
+            latencies = []
+            for batch in lookups:
+                start = time.perf_counter()
+                store.get_by_ids(batch)
+                latencies.append((time.perf_counter() - start) * 1e6)
+            print(f"{name:<14}{stats['compression_ratio']:7.1f}{stats['stored_bytes'] / 1e6:11.2f}"
+                  f"{len(ids) / seconds:14.0f}{np.percentile(latencies, 50):11.0f}µs"
+                  f"{np.percentile(latencies, 95):7.0f}µs")
+            store.close()
+
+    before = wire_bytes(ids, texts, metadatas, ids_only=False)
+    after = wire_bytes(ids, texts, metadatas, ids_only=True)
+    print(f"{'pinecone':<14}{'upsert MB':>11}{'query KB':>10}")
+    for name, (upsert, query) in (("text in index", before), ("ids only", after)):
+        print(f"{name:<14}{upsert / 1e6:11.1f}{query / 1e3:10.1f}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 2000)
@@ -0,0 +1,114 @@
+"""Throughput and chunk quality of the text splitters on the recorded langchain-docs pages.
+
+  recursive-chars   RecursiveCharacterTextSplitter(4000, 200), what ingestion2.py used
+  recursive-tokens  RecursiveCharacterTextSplitter(500, 50) counting tiktoken tokens,
+                    the usual way to get token-sized chunks out of it
+  token-chunker     chunker.TokenChunker(500, 50)
+
+For each: pages/s and MB/s (best of `repeat` runs), the token count of the
+chunks (a tight distribution fills embedding requests and the prompt budget
+predictably), the share over the token target, and how often a chunk starts
+in the middle of a line or inside an indented code block.
+
+tiktoken downloads its vocabularies on first use; offline, a BPE vocabulary
+is built from the corpus itself (all prefixes of its frequent words) with
+cl100k's pre-tokenizer, so the real tiktoken encoder runs, on slightly
+different token counts.
+
+usage: python -m benchmarks.bench_chunker [repeat]
+"""
+import sys
+import time
+from collections import Counter
+from typing import Dict, List
+
+import numpy as np
+import regex
+import tiktoken
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+
+import chunker
+from benchmarks.fixtures import load_fixtures
+
+CL100K_PATTERN = (r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}++|\p{N}{1,3}+| ?[^\s\p{L}\p{N}]++[\r\n]*+"""
+                  r"""|\s++$|\s*[\r\n]|\s+(?!\S)|\s""")
+OFFLINE_VOCABULARY = 50_000
+
+
+def offline_encoding(texts: List[str], size: int = OFFLINE_VOCABULARY) -> tiktoken.Encoding:
+    """A byte-level BPE whose merges spell out the most frequent pre-tokenized words."""
+    pieces = Counter(piece.encode("utf-8") for text in texts for piece in regex.findall(CL100K_PATTERN, text))
+    prefixes = Counter()
+    for piece, count in pieces.items():
+        for end in range(2, len(piece) + 1):
+            prefixes[piece[:end]] += count
+    # shorter prefixes first: every token is the merge of a lower-ranked token and one byte
+    chosen = sorted(prefixes.most_common(size - 256), key=lambda item: (len(item[0]), -item[1]))
+    ranks = {bytes([b]): b for b in range(256)}
+    for token, _ in chosen:
+        if token[:-1] in ranks:
+            ranks[token] = len(ranks)
+    return tiktoken.Encoding(name="offline-cl100k-like", pat_str=CL100K_PATTERN, mergeable_ranks=ranks,
+                             special_tokens={})
+
+
+def bench_encoding(texts: List[str]) -> tiktoken.Encoding:
+    try:
+        return chunker.encoding()
+    except Exception:
+        print(f"(tiktoken's {chunker.CHUNK_ENCODING} unavailable offline: "
+              f"using a {OFFLINE_VOCABULARY}-token vocabulary built from the corpus)")
+        return offline_encoding(texts)
+
+
+def structure_stats(pages: List[Document], chunks: List[Document]) -> Dict[str, float]:
+    texts = {page.metadata["source"]: page.page_content for page in pages}
+    offsets = {}
+    mid_line = in_code = 0
+    for chunk in chunks:
+        text = texts[chunk.metadata["source"]]
+        start = text.find(chunk.page_content, offsets.get(chunk.metadata["source"], 0))
+        offsets[chunk.metadata["source"]] = start + 1
+        line_start = text.rfind("\n", 0, start) + 1
+        mid_line += text[line_start:start].strip() != ""
+        in_code += text[line_start: line_start + 1] in (" ", "\t")  # starts on an indented (code) line
+    return {"mid_line": mid_line / len(chunks), "in_code": in_code / len(chunks)}
+
+
+def main(repeat: int = 3):
+    pages = [Document(page_content=text, metadata={"source": url}) for url, text in load_fixtures().items()]
+    megabytes = sum(len(page.page_content.encode("utf-8")) for page in pages) / 1e6
+    encoding = bench_encoding([page.page_content for page in pages])
+    chunker.token_byte_lengths(encoding)  # built once per process, not per run
+
+    def n_tokens(text: str) -> int:
+        return len(encoding.encode_ordinary(text))
+
+    splitters = {
+        "recursive-chars": (RecursiveCharacterTextSplitter(chunk_size=4000, chunk_overlap=200), None),
+        "recursive-tokens": (RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50,
+                                                            length_function=n_tokens), 500),
+        "token-chunker": (chunker.TokenChunker(chunk_size=500, chunk_overlap=50, encoding=encoding), 500),
+    }
+    print(f"{len(pages)} pages, {megabytes:.1f} MB")
+    print(f"{'splitter':<17} {'pages/s':>8} {'MB/s':>6} {'chunks':>7} {'tokens p5':>9} {'p50':>5} {'p95':>5} "
+          f"{'max':>5} {'std':>5} {'over':>5} {'mid-line':>8} {'in code':>8}")
+    for name, (splitter, target) in splitters.items():
+        seconds = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            chunks = splitter.split_documents(pages)
+            seconds.append(time.perf_counter() - start)
+        best = min(seconds)
+        tokens = np.array([n_tokens(chunk.page_content) for chunk in chunks])
+        over = (tokens > target).mean() if target else float("nan")
+        structure = structure_stats(pages, chunks)
+        print(f"{name:<17} {len(pages) / best:8.0f} {megabytes / best:6.2f} {len(chunks):7d} "
+              f"{np.percentile(tokens, 5):9.0f} {np.percentile(tokens, 50):5.0f} {np.percentile(tokens, 95):5.0f} "
+              f"{tokens.max():5d} {tokens.std():5.0f} {over:5.1%} {structure['mid_line']:8.1%} "
+              f"{structure['in_code']:8.1%}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
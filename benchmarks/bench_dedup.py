@@ -0,0 +1,120 @@
+"""Near-duplicate elimination (dedup.py) on the recorded langchain-docs pages, and at scale.
+
+corpus  the recorded pages, then their chunks (chunker.TokenChunker, 500
+        tokens), go through the page and chunk stages as in ingestion2.py;
+        reports what was dropped, the embeddings (and embedding tokens) saved,
+        and precision / recall against exact Jaccard similarity on a sample
+scale   `n_chunks` synthetic chunks (recorded chunks with a share of their
+        words replaced, so some are near-duplicates and most are not), added
+        in batches of 500: throughput and memory of the index
+
+usage: python -m benchmarks.bench_dedup [n_chunks] [threshold]
+"""
+import random
+import sys
+import time
+from typing import List, Sequence, Set
+
+import numpy as np
+
+import chunker
+from benchmarks.bench_chunker import bench_encoding
+from benchmarks.fixtures import load_fixtures
+from dedup import SHINGLE_SIZE, NearDuplicateIndex
+from pipeline import peak_rss_mb
+
+SAMPLE = 100
+
+
+def shingles(text: str) -> Set[str]:
+    words = text.lower().split()
+    return {" ".join(words[i: i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))}
+
+
+def exact_check(texts: Sequence[str], duplicate: Sequence[bool], threshold: float) -> tuple[float, float]:
+    """(precision, recall) of `duplicate` against the exact Jaccard similarity to any earlier text, on samples."""
+    sets = [shingles(text) for text in texts]
+
+    def nearest(i: int) -> float:
+        return max((len(sets[i] & sets[j]) / len(sets[i] | sets[j]) for j in range(i)), default=0.0)
+
+    rng = random.Random(0)
+    flagged = [i for i, d in enumerate(duplicate) if d]
+    kept = [i for i, d in enumerate(duplicate) if not d]
+    flagged, kept = rng.sample(flagged, min(SAMPLE, len(flagged))), rng.sample(kept, min(SAMPLE, len(kept)))
+    true_positives = sum(nearest(i) >= threshold for i in flagged)
+    false_negatives = sum(nearest(i) >= threshold for i in kept)
+    # scale the sampled counts back to the whole set
+    tp = true_positives / max(len(flagged), 1) * sum(duplicate)
+    fn = false_negatives / max(len(kept), 1) * (len(texts) - sum(duplicate))
+    return tp / max(sum(duplicate), 1), tp / max(tp + fn, 1e-9)
+
+
+def corpus(threshold: float):
+    pages = list(load_fixtures().values())
+    encoding = bench_encoding(pages)
+    splitter = chunker.TokenChunker(chunk_size=500, chunk_overlap=50, encoding=encoding)
+    index = NearDuplicateIndex(threshold)
+
+    start = time.perf_counter()
+    duplicate_pages = index.add(pages)
+    page_seconds = time.perf_counter() - start
+    kept_pages = [page for page, dup in zip(pages, duplicate_pages) if not dup]
+    chunks_of_duplicates = sum(len(splitter.split_text(page)) for page, dup in zip(pages, duplicate_pages) if dup)
+
+    chunks = [chunk for page in kept_pages for chunk in splitter.split_text(page)]
+    chunk_index = NearDuplicateIndex(threshold)
+    start = time.perf_counter()
+    duplicate_chunks = chunk_index.add(chunks)
+    chunk_seconds = time.perf_counter() - start
+
+    all_chunks = chunks_of_duplicates + len(chunks)
+    saved = chunks_of_duplicates + sum(duplicate_chunks)
+    saved_tokens = (sum(len(encoding.encode_ordinary(page)) for page, dup in zip(pages, duplicate_pages) if dup)
+                    + sum(len(encoding.encode_ordinary(c)) for c, dup in zip(chunks, duplicate_chunks) if dup))
+    total_tokens = sum(len(encoding.encode_ordinary(page)) for page in pages)
+    print(f"threshold {threshold}: bands x rows = {index.bands} x {index.rows}")
+    for name, texts, duplicate, seconds in (("pages", pages, duplicate_pages, page_seconds),
+                                            ("chunks", chunks, duplicate_chunks, chunk_seconds)):
+        precision, recall = exact_check(texts, duplicate, threshold)
+        print(f"{name:<7} {sum(duplicate):5d} / {len(texts)} near-duplicates  {len(texts) / seconds:6.0f} {name}/s  "
+              f"precision {precision:.0%}  recall {recall:.0%}")
+    print(f"embeddings saved: {saved} of {all_chunks} chunks ({saved / all_chunks:.0%}), "
+          f"~{saved_tokens / total_tokens:.0%} of the embedding tokens")
+    return chunks
+
+
+def mutate(rng: np.random.Generator, words: List[str], share: float) -> str:
+    words = list(words)
+    for i in rng.choice(len(words), int(len(words) * share), replace=False):
+        words[i] = f"w{rng.integers(1 << 30)}"
+    return " ".join(words)
+
+
+def scale(chunks: List[str], n_chunks: int, threshold: float, batch_size: int = 500):
+    rng = np.random.default_rng(0)
+    base = [chunk.split() for chunk in chunks if len(chunk.split()) > 20]
+    index = NearDuplicateIndex(threshold)
+    rss_before = peak_rss_mb()
+    duplicates = 0
+    seconds = 0.0
+    for first in range(0, n_chunks, batch_size):
+        # 10% light edits of a recorded chunk (near-duplicates), the rest heavily edited (new text)
+        batch = [mutate(rng, base[rng.integers(len(base))], 0.01 if rng.random() < 0.1 else 0.5)
+                 for _ in range(min(batch_size, n_chunks - first))]
+        start = time.perf_counter()
+        duplicates += sum(index.add(batch))
+        seconds += time.perf_counter() - start
+    print(f"scale   {n_chunks} chunks: {n_chunks / seconds:.0f} chunks/s, {duplicates} near-duplicates, "
+          f"index {index.nbytes() / 1e6:.0f} MB ({index.nbytes() / len(index):.0f} bytes per indexed chunk), "
+          f"peak RSS {rss_before:.0f} -> {peak_rss_mb():.0f} MB")
+
+
+def main(n_chunks: int = 300_000, threshold: float = 0.9):
+    chunks = corpus(threshold)
+    scale(chunks, n_chunks, threshold)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 300_000, float(args[1]) if len(args) > 1 else 0.9)
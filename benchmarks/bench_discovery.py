@@ -0,0 +1,136 @@
+"""Site discovery: one TavilyMap call vs sharded discovery into the URL frontier (frontier.py).
+
+A synthetic documentation site of about `n_pages` URLs (sections, sub-sections
+and pages, in no particular order, plus duplicate spellings and off-site
+links) is served by the fake API server, whose /map call takes `latency_ms`
+and returns at most MAP_LIMIT URLs like the real one. Reports, for a single
+map call of the site root and for frontier.discover() (through the
+scheduler, like ingestion2.py):
+
+  coverage         share of the site's pages found
+  map calls        calls made (the scheduler allows 8 at a time)
+  first batch      when the first extract batch of URL_BATCH_SIZE URLs was
+                   handed out, i.e. when extraction can start
+  total            wall time of discovery
+
+usage: python -m benchmarks.bench_discovery [n_pages] [latency_ms]
+"""
+import asyncio
+import random
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import http_clients
+from benchmarks.fake_api_server import FakeAPIHandler, serve
+from frontier import URLFrontier, discover
+from scheduler import DeadLetterQueue, ProviderLimits, Scheduler
+
+SITE = "https://docs.example.com/"
+MAP_LIMIT = 500
+URL_BATCH_SIZE = 20
+
+
+def synthetic_site(n_pages: int) -> List[str]:
+    """Canonical page URLs of a site with uneven sections (some bigger than MAP_LIMIT on their own)."""
+    rng = random.Random(0)
+    urls = []
+    section = 0
+    while len(urls) < n_pages:
+        size = rng.choice((50, 200, 800, 3000))
+        for i in range(size):
+            urls.append(f"{SITE}docs/section-{section}/part-{i % max(size // 150, 1)}/page-{i}")
+        section += 1
+    return urls[:n_pages]
+
+
+def mapped_site(pages: List[str]) -> List[str]:
+    """What the mapper sees: the pages in crawl order, some spelled twice, some links off-site."""
+    rng = random.Random(1)
+    urls = list(pages)
+    urls += [url + "/" for url in rng.sample(pages, len(pages) // 20)]
+    urls += [url + "?utm_source=nav" for url in rng.sample(pages, len(pages) // 20)]
+    urls += [f"https://github.com/example/docs/{i}" for i in range(len(pages) // 50)]
+    rng.shuffle(urls)
+    return urls
+
+
+async def single_call(tavily_map) -> List[str]:
+    return (await tavily_map.ainvoke({"url": SITE}))["results"]
+
+
+async def sharded(tavily_map, frontier: URLFrontier, scheduler: Scheduler):
+    calls = 0
+
+    async def map_shard(url: str, prefix: str, exclude: List[str]) -> Optional[List[str]]:
+        nonlocal calls
+        calls += 1
+
+        async def call():
+            try:
+                result = await tavily_map.ainvoke({"url": url,
+                                                   "select_paths": ["^" + re.escape(prefix) + ".*"],
+                                                   "exclude_paths": ["^" + re.escape(path) for path in exclude] or None})
+            except Exception as e:  # "No crawl results found ..."
+                if not http_clients.is_empty_map(e):
+                    raise
+                return []
+            if isinstance(result, str):
+                return []
+            if "error" in result:
+                raise result["error"]
+            return result["results"]
+
+        return await scheduler.run("tavily", call, batch_id=f"map-{prefix}", payload=[])
+
+    start = time.perf_counter()
+    first_batch = None
+
+    async def consume():
+        nonlocal first_batch
+        async for _ in frontier.batches(URL_BATCH_SIZE):
+            if first_batch is None:
+                first_batch = time.perf_counter() - start
+
+    complete, _ = await asyncio.gather(discover(SITE, map_shard, frontier, MAP_LIMIT), consume())
+    return complete, calls, first_batch, time.perf_counter() - start
+
+
+def main(n_pages: int = 20000, latency_ms: float = 500):
+    server = serve(rate_limit=1e9, error_rate=0.0)
+    FakeAPIHandler.latency = latency_ms / 1000
+    pages = synthetic_site(n_pages)
+    FakeAPIHandler.site_urls = mapped_site(pages)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    tavily_map = http_clients.tavily_map(limit=MAP_LIMIT, tavily_api_key="tvly-bench", api_base_url=base_url)
+    print(f"{len(pages)} pages ({len(FakeAPIHandler.site_urls)} mapped URLs with duplicates and off-site links), "
+          f"map limit {MAP_LIMIT}, map latency {latency_ms:g} ms")
+    print(f"{'discovery':<10}{'coverage':>10}{'map calls':>11}{'first batch':>13}{'total':>9}  complete")
+
+    start = time.perf_counter()
+    found = set(asyncio.run(single_call(tavily_map))) & set(pages)
+    seconds = time.perf_counter() - start
+    print(f"{'single':<10}{len(found) / len(pages):10.1%}{1:>11}{seconds:12.2f}s{seconds:8.2f}s  no")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scheduler = Scheduler(limits={"tavily": ProviderLimits(max_concurrency=8, requests_per_second=1e6,
+                                                               burst=8)},
+                              dead_letters=DeadLetterQueue(Path(tmp) / "dead_letters.jsonl"))
+        frontier = URLFrontier(Path(tmp) / "frontier.sqlite", SITE)
+        complete, calls, first_batch, seconds = asyncio.run(sharded(tavily_map, frontier, scheduler))
+        coverage = len(set(frontier.mapped_urls()) & set(pages)) / len(pages)
+        print(f"{'sharded':<10}{coverage:10.1%}{calls:>11}{first_batch:12.2f}s{seconds:8.2f}s  "
+              f"{'yes' if complete else 'no'}")
+        print(f"frontier: {len(frontier)} URLs, {frontier.duplicates} duplicates and "
+              f"{frontier.rejected} off-site URLs dropped")
+        frontier.close()
+    FakeAPIHandler.site_urls = None
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 20000, float(args[1]) if len(args) > 1 else 500)
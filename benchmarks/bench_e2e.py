@@ -0,0 +1,247 @@
+"""End-to-end ingestion + query benchmark of ingestion2.py, against recorded fixtures.
+
+Runs the real ingestion2.main() (map -> extract -> chunk -> embed -> upsert)
+against the fake Tavily / OpenAI / Pinecone server replaying the recorded
+pages of benchmarks/fixtures.py, with simulated latency and rate limits, then
+times vector queries (query embedding + Pinecone query) on the ingested index.
+
+Every run is a fresh subprocess with empty caches, so runs don't share memory
+or cached embeddings. Parameters are swept one at a time around the defaults
+of ingestion2.py; results are written as JSON to compare between commits:
+
+  url_batch_size        URL_BATCH_SIZE        urls per TavilyExtract call
+  index_batch_size      INDEX_BATCH_SIZE      chunks per vectorstore batch
+  embedding_chunk_size  EMBEDDING_CHUNK_SIZE  texts per embeddings request
+  chunk_tokens          CHUNK_TOKENS          chunk size (tokens, see chunker.py)
+  chunk_overlap_tokens  CHUNK_OVERLAP_TOKENS  chunk overlap (tokens)
+  chunk_size            CHUNK_SIZE            chunk size (characters, CHUNKER=recursive)
+  chunk_overlap         CHUNK_OVERLAP         chunk overlap (characters, CHUNKER=recursive)
+
+usage: python -m benchmarks.bench_e2e [--pages N] [--queries N] [--latency S]
+                                      [--rate-limit RPS] [--error-rate P]
+                                      [--sweep name=v1,v2 ...] [--out results.json]
+       python -m benchmarks.bench_e2e --compare before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import numpy as np
+
+from benchmarks.fake_api_server import serve
+from benchmarks.fixtures import load_fixtures
+
+DEFAULTS = {
+    "url_batch_size": 20,
+    "index_batch_size": 500,
+    "embedding_chunk_size": 50,
+    "chunk_tokens": 500,
+    "chunk_overlap_tokens": 50,
+    "chunk_size": 4000,
+    "chunk_overlap": 200,
+}
+DEFAULT_SWEEP = {
+    "url_batch_size": [10, 40],
+    "index_batch_size": [100],
+    "embedding_chunk_size": [200],
+    "chunk_tokens": [250],
+}
+METRICS = ("docs_per_sec", "chunks_per_sec", "query_p50_ms", "query_p95_ms", "peak_rss_mb")
+HIGHER_IS_BETTER = {"docs_per_sec", "chunks_per_sec"}
+RESULT_PREFIX = "BENCH_RESULT "
+
+
+def child(base_url: str, n_queries: int, resume: bool = False):
+    """Run inside the subprocess: configuration comes from the environment."""
+    import chunker
+    import http_clients
+    import ingestion2
+    from benchmarks.bench_chunker import bench_encoding
+    from logger import metrics
+    from pipeline import peak_rss_mb
+
+    # talk to the fake server instead of api.tavily.com
+    ingestion2.tavily_extract = http_clients.tavily_extract(api_base_url=base_url)
+    ingestion2.tavily_map = http_clients.tavily_map(max_depth=5, max_breadth=100, limit=ingestion2.MAP_LIMIT,
+                                                    api_base_url=base_url)
+    # send raw texts: token-length checking needs tiktoken's BPE files, which may not be downloadable
+    ingestion2.embeddings.embeddings.check_embedding_ctx_length = False
+    # same for the chunker: fall back to a vocabulary built from the recorded pages
+    encoding = bench_encoding(list(load_fixtures().values()))
+    chunker.encoding = lambda: encoding
+
+    start = time.perf_counter()
+    stats = asyncio.run(ingestion2.main(resume=resume))
+    seconds = time.perf_counter() - start
+
+    async def query_latencies() -> List[float]:
+        latencies = []
+        async with ingestion2.vectorstore_session():  # one client session, like a long-running server
+            for i in range(n_queries):
+                query_start = time.perf_counter()
+                for attempt in range(5):  # injected 429s: retry, the retries count towards the latency
+                    try:
+                        await ingestion2.vectorstore.asimilarity_search(f"how do I use a retriever? ({i})", k=4)
+                        break
+                    except Exception:
+                        if attempt == 4:
+                            raise
+                        await asyncio.sleep(0.1)
+                latencies.append((time.perf_counter() - query_start) * 1000)
+        return latencies
+
+    latencies = asyncio.run(query_latencies())
+    print(RESULT_PREFIX + json.dumps({
+        "pages": stats.pages,
+        "chunks": stats.chunks,
+        "indexed_chunks": stats.indexed_chunks,
+        "seconds": seconds,
+        "time_to_first_upsert": stats.time_to_first_upsert,
+        "docs_per_sec": stats.pages / seconds,
+        "chunks_per_sec": stats.indexed_chunks / seconds,
+        "query_p50_ms": float(np.percentile(latencies, 50)),
+        "query_p95_ms": float(np.percentile(latencies, 95)),
+        "peak_rss_mb": peak_rss_mb(),
+        "timings": metrics.summary(),
+    }))
+
+
+def child_env(params: Dict[str, int], base_url: str, tmp: str) -> Dict[str, str]:
+    """Environment of a child run: fake server endpoints, all local state under `tmp`."""
+    return {
+        **os.environ,
+        **{name.upper(): str(value) for name, value in params.items()},
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "TAVILY_API_KEY": "tvly-bench",
+        "PINECONE_API_KEY": "bench",
+        "PINECONE_HOST": base_url,
+        "VECTORSTORE_BACKEND": "pinecone",
+        "INGEST_SITE": "https://api.python.langchain.com/en/latest/",  # where the recorded pages live
+        # fresh local state: nothing is skipped as unchanged or served from cache
+        "EMBEDDING_CACHE_DIR": f"{tmp}/embeddings",
+        "INGESTION_MANIFEST": f"{tmp}/manifest.sqlite",
+        "INGESTION_DEAD_LETTERS": f"{tmp}/dead_letters.jsonl",
+        "BM25_INDEX_DIR": f"{tmp}/bm25",
+        "CHUNK_STORE_DIR": f"{tmp}/chunk_store",
+        "INDEX_VERSION_PATH": f"{tmp}/index_version",
+        "LOG_JSONL_PATH": f"{tmp}/events.jsonl",
+        "INGESTION_CHECKPOINT_DIR": f"{tmp}/checkpoints",
+    }
+
+
+def child_command(base_url: str, n_queries: int, resume: bool = False) -> List[str]:
+    return [sys.executable, "-W", "ignore", "-m", "benchmarks.bench_e2e", "--child",
+            base_url, str(n_queries)] + (["--resume"] if resume else [])
+
+
+def run_one(params: Dict[str, int], base_url: str, n_queries: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        out = subprocess.run(child_command(base_url, n_queries),
+                             env=child_env(params, base_url, tmp), capture_output=True, text=True)
+    lines = [line for line in out.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+    if out.returncode or not lines:
+        raise RuntimeError(f"benchmark run {params} failed:\n{out.stdout[-2000:]}\n{out.stderr[-4000:]}")
+    return {"params": params, **json.loads(lines[-1][len(RESULT_PREFIX):])}
+
+
+def sweep_configs(sweep: Dict[str, List[int]]) -> List[Dict[str, int]]:
+    """The defaults, then one parameter changed at a time."""
+    configs = [dict(DEFAULTS)]
+    for name, values in sweep.items():
+        configs += [{**DEFAULTS, name: value} for value in values if value != DEFAULTS[name]]
+    return configs
+
+
+def describe(params: Dict[str, int]) -> str:
+    changed = [f"{name}={value}" for name, value in params.items() if value != DEFAULTS[name]]
+    return ", ".join(changed) or "defaults"
+
+
+def git_commit() -> str:
+    out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    return out.stdout.strip() or "unknown"
+
+
+def compare(before_path: str, after_path: str):
+    before, after = (json.load(open(path, encoding="utf-8")) for path in (before_path, after_path))
+    print(f"{before['commit']} -> {after['commit']}")
+    # parameters added since `before` was recorded compare as their defaults
+    old_runs = {json.dumps({**DEFAULTS, **run["params"]}, sort_keys=True): run for run in before["runs"]}
+    for run in after["runs"]:
+        old = old_runs.get(json.dumps({**DEFAULTS, **run["params"]}, sort_keys=True))
+        if old is None:
+            continue
+        deltas = []
+        for metric in METRICS:
+            if old.get(metric) and run.get(metric) is not None:
+                change = (run[metric] - old[metric]) / old[metric] * 100
+                better = change > 0 if metric in HIGHER_IS_BETTER else change < 0
+                deltas.append(f"{metric} {change:+.1f}%{'' if abs(change) < 5 else ' (better)' if better else ' (worse)'}")
+        print(f"{describe(run['params']):<28} " + "  ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=None, help="replay only the first N recorded pages")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake API request")
+    parser.add_argument("--rate-limit", type=float, default=50, help="requests per second per provider")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="share of random 429s")
+    parser.add_argument("--sweep", nargs="*", default=None, metavar="NAME=V1,V2")
+    parser.add_argument("--out", default="bench-e2e.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+    if args.compare:
+        return compare(*args.compare)
+
+    sweep = DEFAULT_SWEEP if args.sweep is None else {
+        name: [int(v) for v in values.split(",")]
+        for name, values in (item.split("=", 1) for item in args.sweep)
+    }
+    unknown = set(sweep) - set(DEFAULTS)
+    if unknown:
+        parser.error(f"unknown sweep parameters {sorted(unknown)}, expected {sorted(DEFAULTS)}")
+
+    fixtures = load_fixtures()
+    if args.pages:
+        fixtures = dict(list(fixtures.items())[: args.pages])
+    server = serve(rate_limit=args.rate_limit, error_rate=args.error_rate)
+    handler = server.RequestHandlerClass
+    handler.fixtures = fixtures
+    handler.latency = args.latency
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    print(f"{len(fixtures)} recorded pages, fake API latency {args.latency * 1000:.0f} ms, "
+          f"{args.rate_limit:.0f} req/s per provider, {args.error_rate:.0%} random 429s")
+    print(f"{'params':<28} {'docs/s':>7} {'chunks/s':>8} {'query p50':>9} {'p95':>7} {'peak RSS':>9}")
+    runs = []
+    for params in sweep_configs(sweep):
+        handler.vectors = {}  # empty index for every run
+        run = run_one(params, base_url, args.queries)
+        runs.append(run)
+        print(f"{describe(params):<28} {run['docs_per_sec']:7.1f} {run['chunks_per_sec']:8.1f} "
+              f"{run['query_p50_ms']:6.1f} ms {run['query_p95_ms']:4.1f} ms {run['peak_rss_mb']:6.0f} MB")
+    server.shutdown()
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"commit": git_commit(),
+                   "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                   "server": {"pages": len(fixtures), "latency": args.latency,
+                              "rate_limit": args.rate_limit, "error_rate": args.error_rate},
+                   "runs": runs}, f, indent=2)
+    print(f"results written to {args.out}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(sys.argv[2], int(sys.argv[3]), "--resume" in sys.argv)
+    else:
+        main()
@@ -0,0 +1,68 @@
+"""Connections opened by the Tavily tools, stock vs the shared pooled client (http_clients.py).
+
+`n_calls` TavilyExtract calls (20 urls each, `concurrency` at a time, async
+like ingestion2.py) and `n_calls` sync TavilyMap calls against the fake API
+server, once with the stock tools (a new aiohttp session / `requests.post`
+per call) and once through http_clients. Every new connection costs
+`connect_ms` on the server side, standing in for the TCP + TLS handshake
+round trips to the real APIs.
+
+usage: python -m benchmarks.bench_http_pool [n_calls] [concurrency] [connect_ms]
+"""
+import asyncio
+import sys
+import time
+
+from langchain_tavily import TavilyExtract, TavilyMap
+
+import http_clients
+from benchmarks.fake_api_server import FakeAPIHandler, serve
+
+URLS_PER_CALL = 20
+
+
+def run(name: str, extract, site_map, n_calls: int, concurrency: int):
+    FakeAPIHandler.stats["connections"] = 0
+    slots = asyncio.Semaphore(concurrency)
+
+    async def call(i: int):
+        async with slots:
+            urls = [f"https://python.langchain.com/docs/{i}/{j}" for j in range(URLS_PER_CALL)]
+            await extract.ainvoke(input={"urls": urls, "extract_depth": "basic"})
+
+    async def extract_all():
+        await asyncio.gather(*(call(i) for i in range(n_calls)))
+
+    start = time.perf_counter()
+    asyncio.run(extract_all())
+    extract_seconds = time.perf_counter() - start
+    extract_connections = FakeAPIHandler.stats["connections"]
+
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        site_map.invoke("https://python.langchain.com/")
+    map_seconds = time.perf_counter() - start
+    map_connections = FakeAPIHandler.stats["connections"] - extract_connections
+    print(f"{name:<7} extract: {extract_connections:4d} connections, {n_calls / extract_seconds:6.0f} calls/s   "
+          f"map: {map_connections:4d} connections, {n_calls / map_seconds:6.0f} calls/s")
+
+
+def main(n_calls: int = 500, concurrency: int = 20, connect_ms: float = 30):
+    server = serve(rate_limit=1e9, error_rate=0.0)
+    FakeAPIHandler.latency = 0.02
+    FakeAPIHandler.connect_latency = connect_ms / 1000
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    keys = {"tavily_api_key": "tvly-bench", "api_base_url": base_url}
+    print(f"{n_calls} calls of each, {concurrency} extract calls at a time, "
+          f"fake API latency 20 ms + {connect_ms:g} ms per new connection")
+    run("stock", TavilyExtract(**keys), TavilyMap(**keys), n_calls, concurrency)
+    run("pooled", http_clients.tavily_extract(**keys), http_clients.tavily_map(**keys), n_calls, concurrency)
+    print(f"pool stats: {http_clients.pool_stats()}")
+    server.shutdown()
+    FakeAPIHandler.connect_latency = 0.0
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 500, int(args[1]) if len(args) > 1 else 20,
+         float(args[2]) if len(args) > 2 else 30)
@@ -0,0 +1,109 @@
+"""BM25 lookup latency (bundled corpus + synthetic multi-million chunk corpus)
+and hit rate of dense vs BM25 vs RRF-fused retrieval on API identifier queries.
+
+Identifier queries ("how do I use RunnableParallel?") are built from CamelCase
+identifiers found in the bundled corpus; a hit is any of the top-4 documents
+containing the identifier. Dense search uses offline hashed bag-of-words
+vectors by default (which already favours exact tokens); pass --openai to use
+text-embedding-3-small through the embedding cache for a realistic baseline.
+
+usage: python -m benchmarks.bench_hybrid [n_synthetic_docs] [--openai]
+"""
+import re
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+import docs_loader
+from backend.hybrid_retriever import reciprocal_rank_fusion
+from benchmarks.bench_local_ann import hashed_embeddings, openai_embeddings
+from bm25_index import BM25Index, write_segment
+
+K = 4
+IDENTIFIER_RE = re.compile(r"\b[A-Z][a-z]+(?:[A-Z][a-z0-9]+)+\b")
+
+
+def latency(index: BM25Index, queries: list[str]) -> str:
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, k=20)
+        timings.append((time.perf_counter() - start) * 1000)
+    return f"p50 {np.percentile(timings, 50):6.2f} ms  p99 {np.percentile(timings, 99):6.2f} ms"
+
+
+def build_synthetic(path: str, n_docs: int, vocab_size: int = 200_000, doc_length: int = 120):
+    """Zipf-distributed documents written straight into segments of 250k docs."""
+    rng = np.random.default_rng(0)
+    vocabulary = [f"term{i}" for i in range(vocab_size)]
+    index = BM25Index("synthetic", path)
+    for start in range(0, n_docs, 250_000):
+        n = min(250_000, n_docs - start)
+        terms = np.minimum(rng.zipf(1.1, size=(n, doc_length)), vocab_size) - 1
+        pairs = np.unique((np.arange(start, start + n)[:, None] * vocab_size + terms).ravel(),
+                          return_counts=True)
+        write_segment(index.path / f"seg-{start:010d}",
+                      pairs[0] // vocab_size, pairs[0] % vocab_size, pairs[1],
+                      vocabulary, np.full(n, doc_length))
+        with index.conn:
+            index.conn.executemany("INSERT INTO docs (number, id, text, metadata) VALUES (?, ?, '', '{}')",
+                                   ((i, str(i)) for i in range(start, start + n)))
+    index.close()
+    return BM25Index("synthetic", path), vocabulary
+
+
+def main(n_synthetic: int = 2_000_000, use_openai: bool = False):
+    chunks = [doc for batch in docs_loader.load_and_split_parallel() for doc in batch]
+    for i, doc in enumerate(chunks):
+        doc.id = str(i)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = BM25Index("corpus", tmp)
+        start = time.perf_counter()
+        for i in range(0, len(chunks), 500):  # added in batches like ingestion does
+            index.add_documents(chunks[i: i + 500])
+        print(f"BM25 index over {len(chunks)} chunks built in {time.perf_counter() - start:.1f}s "
+              f"({len(index.segments)} segments)")
+
+        # identifier queries
+        rng = np.random.default_rng(0)
+        identifiers = sorted({m for doc in chunks for m in IDENTIFIER_RE.findall(doc.page_content)})
+        identifiers = [str(x) for x in rng.choice(identifiers, min(200, len(identifiers)), replace=False)]
+        queries = [f"how do I use {identifier}?" for identifier in identifiers]
+        print(f"bundled corpus lookup latency   {latency(index, queries)}")
+
+        embed = openai_embeddings if use_openai else hashed_embeddings
+        vectors = embed([doc.page_content for doc in chunks])
+        query_vectors = embed(queries)
+
+        hits = {"dense": 0, "bm25": 0, "fused (RRF)": 0}
+        for identifier, query, query_vector in zip(identifiers, queries, query_vectors):
+            dense = [chunks[i] for i in np.argsort(-(vectors @ query_vector))[:10]]
+            sparse = index.similarity_search(query, k=20)
+            for name, ranking in (("dense", dense),
+                                  ("bm25", sparse),
+                                  ("fused (RRF)", reciprocal_rank_fusion([dense, sparse]))):
+                hits[name] += any(identifier in doc.page_content for doc in ranking[:K])
+        for name, n_hits in hits.items():
+            print(f"hit@{K} {name:<12} {n_hits / len(queries):.3f}  "
+                  f"({'openai' if use_openai else 'hashed'} embeddings)")
+        index.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        index, vocabulary = build_synthetic(tmp, n_synthetic)
+        print(f"synthetic index with {index.n_docs} docs built in {time.perf_counter() - start:.1f}s")
+        # one frequent term and two rarer ones per query
+        queries = [" ".join([vocabulary[rng.integers(5, 50)]] +
+                            [vocabulary[rng.integers(100, 20_000)] for _ in range(2)])
+                   for _ in range(200)]
+        print(f"synthetic corpus lookup latency {latency(index, queries)}")
+        index.close()
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    main(int(args[0]) if args else 2_000_000, "--openai" in sys.argv)
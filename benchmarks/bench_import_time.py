@@ -0,0 +1,76 @@
+"""Import-time budget of backend/core.py (what main.py waits for before drawing the page).
+
+Runs `python -X importtime -c "import <module>"` in fresh interpreters and
+takes the best of `runs` cumulative times, then lists the slowest imports
+below it. Fails (exit status 1) if
+
+  * the import takes more than IMPORT_BUDGET_MS (default 400 ms), or
+  * it loads any of the heavy modules that are only needed once the chain is
+    built (LangChain chains / hub, OpenAI, Pinecone, Tavily, PIL)
+
+so it can run as a startup-regression check:
+
+usage: python -m benchmarks.bench_import_time [module] [runs]
+"""
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "400"))
+HEAVY_MODULES = ("langchain.chains", "langchain.hub", "langchain_openai", "langchain_pinecone",
+                 "langchain_tavily", "openai", "pinecone", "PIL")
+
+
+def import_times(module: str) -> List[Tuple[int, int, str]]:
+    """(cumulative µs, nesting depth, name) of `module` and every module it imports."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        times.append((int(cumulative), depth, name.strip()))
+    # children are listed before their parent: keep the lines of `module`'s own subtree
+    end = next(i for i, (_, depth, name) in enumerate(times) if depth == 0 and name == module)
+    start = max((i + 1 for i, (_, depth, _) in enumerate(times[:end]) if depth == 0), default=0)
+    return times[start: end + 1]
+
+
+def loaded_heavy_modules(module: str) -> List[str]:
+    code = (f"import json, sys; import {module}; "
+            f"print(json.dumps([m for m in {list(HEAVY_MODULES)!r} if m in sys.modules]))")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main(module: str = "backend.core", runs: int = 5) -> int:
+    best: Dict[str, int] = {}
+    total_ms = float("inf")
+    for _ in range(runs):
+        times = import_times(module)
+        total_ms = min(total_ms, next(t for t, _, name in times if name == module) / 1000)
+        for cumulative, depth, name in times:
+            if depth == 1:  # imported by `module` itself
+                best[name] = min(best.get(name, cumulative), cumulative)
+    print(f"import {module}: {total_ms:.0f} ms (best of {runs}), budget {IMPORT_BUDGET_MS:.0f} ms")
+    for name, cumulative in sorted(best.items(), key=lambda item: -item[1])[:10]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    heavy = loaded_heavy_modules(module)
+    failed = False
+    if total_ms > IMPORT_BUDGET_MS:
+        print(f"FAIL: import {module} is over its {IMPORT_BUDGET_MS:.0f} ms budget")
+        failed = True
+    if heavy:
+        print(f"FAIL: import {module} loads {', '.join(heavy)} (import them where they are used)")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    sys.exit(main(args[0] if args else "backend.core", int(args[1]) if len(args) > 1 else 5))
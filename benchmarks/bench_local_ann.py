@@ -0,0 +1,84 @@
+"""Recall@k and QPS of the local IVF index vs brute-force NumPy search.
+
+Indexes the chunks of the bundled langchain-docs corpus (parsed like
+ingestion.py does). By default the chunks are embedded offline with hashed
+bag-of-words vectors; pass --openai to use text-embedding-3-small (through the
+embedding cache). Queries are the first 200 characters of random chunks.
+
+usage: python -m benchmarks.bench_local_ann [n_queries] [--openai]
+"""
+import re
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+
+import docs_loader
+from local_index import IVFIndex, normalize
+
+K = 10
+HASH_DIM = 384
+
+
+def hashed_embeddings(texts: list[str], dim: int = HASH_DIM) -> np.ndarray:
+    """Signed feature-hashing of word counts (log-scaled), unit-normalized."""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for i, text in enumerate(texts):
+        hashes = np.array([zlib.crc32(token.encode()) for token in re.findall(r"\w+", text.lower())],
+                          dtype=np.uint32)
+        np.add.at(vectors[i], hashes % dim, np.where(hashes & (1 << 31), 1.0, -1.0))
+    return normalize(np.sign(vectors) * np.log1p(np.abs(vectors)))
+
+
+def openai_embeddings(texts: list[str]) -> np.ndarray:
+    from langchain_openai import OpenAIEmbeddings
+
+    from embedding_cache import CachedEmbeddings
+    from http_clients import openai_clients
+
+    embeddings = CachedEmbeddings(OpenAIEmbeddings(model="text-embedding-3-small", **openai_clients()))
+    return np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+
+
+def main(n_queries: int = 200, use_openai: bool = False):
+    texts = [doc.page_content for chunks in docs_loader.load_and_split_parallel() for doc in chunks]
+    embed = openai_embeddings if use_openai else hashed_embeddings
+    start = time.perf_counter()
+    vectors = normalize(embed(texts))
+    print(f"{len(texts)} chunks embedded ({'openai' if use_openai else 'hashed'}) "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    rng = np.random.default_rng(0)
+    queries = normalize(embed([texts[i][:200] for i in rng.choice(len(texts), n_queries, replace=False)]))
+
+    # brute force: exact top-k
+    start = time.perf_counter()
+    truth = [np.argpartition(-(vectors @ q), K)[:K] for q in queries]
+    brute_qps = n_queries / (time.perf_counter() - start)
+    # the corpus has many (near-)identical chunks: any result scoring at least
+    # the k-th best exact score counts as a hit
+    kth_scores = [np.min(vectors[t] @ q) - 1e-6 for t, q in zip(truth, queries)]
+    print(f"{'brute force':<14} recall@{K} 1.000  {brute_qps:9.0f} QPS")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = IVFIndex(tmp)
+        start = time.perf_counter()
+        for i in range(0, len(vectors), 500):  # added in batches like ingestion does
+            index.add(vectors[i: i + 500])
+        print(f"IVF index built in {time.perf_counter() - start:.1f}s "
+              f"({len(index.centroids)} lists, trained on {index.trained_on} vectors)")
+
+        for nprobe in (1, 2, 4, 8, 16, 32):
+            start = time.perf_counter()
+            results = [index.search(q, k=K, nprobe=nprobe)[1] for q in queries]
+            qps = n_queries / (time.perf_counter() - start)
+            recall = np.mean([np.count_nonzero(scores >= kth) / K for kth, scores in zip(kth_scores, results)])
+            print(f"IVF nprobe={nprobe:<4} recall@{K} {recall:.3f}  {qps:9.0f} QPS")
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    main(int(args[0]) if args else 200, "--openai" in sys.argv)
@@ -0,0 +1,47 @@
+"""Wall time to parse + split the bundled ReadTheDocs corpus vs number of processes.
+
+"sequential" is what ingestion.py used to do: ReadTheDocsLoader.load() then
+split_documents on a single core. Uploads are not timed (no API calls).
+
+usage: python -m benchmarks.bench_local_ingestion [max_workers]
+"""
+import os
+import sys
+import time
+
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.document_loaders import ReadTheDocsLoader
+
+import docs_loader
+
+
+def sequential() -> int:
+    raw_documents = ReadTheDocsLoader(docs_loader.DOCS_PATH, encoding="utf-8").load()
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=600, chunk_overlap=50)
+    return len(text_splitter.split_documents(raw_documents))
+
+
+def parallel(workers: int) -> int:
+    return sum(len(chunks) for chunks in docs_loader.load_and_split_parallel(workers=workers))
+
+
+def main(max_workers: int = os.cpu_count() or 1):
+    start = time.perf_counter()
+    n_chunks = sequential()
+    baseline = time.perf_counter() - start
+    print(f"{'sequential':<12} {baseline:7.2f}s  {n_chunks} chunks")
+
+    workers = 1
+    while True:
+        start = time.perf_counter()
+        n_chunks = parallel(workers)
+        elapsed = time.perf_counter() - start
+        print(f"{workers:>2} processes {elapsed:7.2f}s  {n_chunks} chunks  speed-up x{baseline / elapsed:.2f}")
+        if workers >= max_workers:
+            break
+        workers = min(2 * workers, max_workers)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 1)
@@ -0,0 +1,64 @@
+"""Quantized local index (LOCAL_INDEX_QUANTIZATION) vs float32: memory, QPS and recall@10.
+
+Indexes the chunks of the bundled langchain-docs corpus, embedded offline
+like benchmarks/bench_local_ann.py does (hashed bag-of-words vectors), then
+randomly projected to text-embedding-3-small's 1536 dense dimensions: the
+hashed vectors are mostly zeros, which sign bits can't represent, while real
+embeddings are dense (--openai uses the real model). Builds an index per
+quantization and searches every list (nprobe = all) and the default nprobe,
+with several rescoring depths. Recall counts results scoring at least the
+exact k-th best score (the corpus has many identical chunks).
+
+usage: python -m benchmarks.bench_quantization [n_queries] [--openai]
+"""
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import docs_loader
+from benchmarks.bench_local_ann import HASH_DIM, K, hashed_embeddings, openai_embeddings
+from local_index import LOCAL_INDEX_NPROBE, IVFIndex, normalize
+
+DIM = 1536
+
+
+def projected_embeddings(texts: list[str]) -> np.ndarray:
+    """Hashed bag-of-words vectors times a fixed Gaussian matrix (dense, cosines roughly preserved)."""
+    projection = np.random.default_rng(1).standard_normal((HASH_DIM, DIM)).astype(np.float32)
+    return normalize(hashed_embeddings(texts) @ projection)
+
+
+def main(n_queries: int = 200, use_openai: bool = False):
+    texts = [doc.page_content for chunks in docs_loader.load_and_split_parallel() for doc in chunks]
+    embed = openai_embeddings if use_openai else projected_embeddings
+    vectors = normalize(embed(texts))
+    rng = np.random.default_rng(0)
+    queries = normalize(embed([texts[i][:200] for i in rng.choice(len(texts), n_queries, replace=False)]))
+    kth_scores = [np.partition(-(vectors @ q), K - 1)[K - 1] * -1 - 1e-6 for q in queries]
+    print(f"{len(texts)} chunks, {vectors.shape[1]} dims ({'openai' if use_openai else 'hashed + projected'}), "
+          f"{n_queries} queries, k={K}")
+    print(f"{'quantization':<13}{'rescore':>8}{'nprobe':>8}{'searched MB':>13}{'recall@10':>11}{'QPS':>8}")
+
+    for quantization in ("none", "int8", "binary"):
+        with tempfile.TemporaryDirectory() as tmp:
+            index = IVFIndex(tmp, quantization=quantization)
+            for i in range(0, len(vectors), 500):
+                index.add(vectors[i: i + 500])
+            searched_mb = index.nbytes()["searched"] / 1e6
+            for rescore in ((1,) if quantization == "none" else (1, 2, 4, 8, 16)):
+                index.rescore = rescore
+                for nprobe in (len(index.centroids), LOCAL_INDEX_NPROBE):
+                    start = time.perf_counter()
+                    results = [index.search(q, k=K, nprobe=nprobe)[1] for q in queries]
+                    qps = n_queries / (time.perf_counter() - start)
+                    recall = np.mean([np.count_nonzero(scores >= kth) / K
+                                      for kth, scores in zip(kth_scores, results)])
+                    print(f"{quantization:<13}{rescore if quantization != 'none' else '-':>8}{nprobe:>8}"
+                          f"{searched_mb:13.1f}{recall:11.3f}{qps:8.0f}")
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    main(int(args[0]) if args else 200, "--openai" in sys.argv)
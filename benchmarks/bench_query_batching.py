@@ -0,0 +1,123 @@
+"""Query embedding with and without micro-batching (backend/embedding_batcher.py).
+
+`concurrency` callers embed `n_queries` distinct queries in total, back to
+back, against a stub embeddings endpoint that answers after 30 ms (+0.05 ms
+per text) and admits `rps` requests per second (callers over the limit wait
+for a slot, like a client backing off on 429s). Runs async callers
+(backend/api.py) for every max wait, then sync callers in threads (Streamlit
+sessions) for the default one; reports throughput, p50 / p95 latency and requests sent. Then
+the same under light load (8 callers, no rate limit), where waiting for a
+batch to fill is pure added latency.
+
+usage: python -m benchmarks.bench_query_batching [n_queries] [concurrency] [rps]
+"""
+import asyncio
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from backend.embedding_batcher import QUERY_BATCH_MAX_WAIT_MS, QUERY_BATCH_SIZE, BatchingEmbeddings
+
+LATENCY = 0.03
+PER_TEXT = 0.00005
+
+
+class StubEndpoint(Embeddings):
+    """Rate-limited embeddings endpoint: one request starts every 1 / rps seconds at most."""
+
+    def __init__(self, rps: float):
+        self.interval = 1 / rps
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def _delay(self, n_texts: int) -> float:
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_slot)
+            self.next_slot = start + self.interval
+            self.requests += 1
+        return start - now + LATENCY + PER_TEXT * n_texts
+
+    @staticmethod
+    def _vector(text: str) -> List[float]:
+        return [float(len(text))] * 8
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self._delay(len(texts)))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self._delay(len(texts)))
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+def report(name: str, latencies: List[float], seconds: float, endpoint: StubEndpoint):
+    print(f"{name:<22} {len(latencies) / seconds:8.0f} queries/s  p50 {np.percentile(latencies, 50):7.1f} ms  "
+          f"p95 {np.percentile(latencies, 95):7.1f} ms  {endpoint.requests:5d} requests")
+
+
+def run_async(name: str, n_queries: int, concurrency: int, rps: float, max_batch: int, max_wait_ms: float):
+    endpoint = StubEndpoint(rps)
+    embeddings = BatchingEmbeddings(endpoint, max_batch=max_batch, max_wait_ms=max_wait_ms)
+    latencies: List[float] = []
+
+    async def caller(first: int):
+        for i in range(first, n_queries, concurrency):
+            start = time.perf_counter()
+            await embeddings.aembed_query(f"how do I use a retriever? ({i})")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    async def load():
+        await asyncio.gather(*(caller(first) for first in range(concurrency)))
+
+    start = time.perf_counter()
+    asyncio.run(load())
+    report(name, latencies, time.perf_counter() - start, endpoint)
+
+
+def run_threads(name: str, n_queries: int, concurrency: int, rps: float, max_batch: int, max_wait_ms: float):
+    endpoint = StubEndpoint(rps)
+    embeddings = BatchingEmbeddings(endpoint, max_batch=max_batch, max_wait_ms=max_wait_ms)
+    latencies: List[float] = []
+
+    def caller(first: int):
+        for i in range(first, n_queries, concurrency):
+            start = time.perf_counter()
+            embeddings.embed_query(f"how do I use a retriever? ({i})")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(caller, range(concurrency)))
+    report(name, latencies, time.perf_counter() - start, endpoint)
+
+
+def main(n_queries: int = 5000, concurrency: int = 200, rps: float = 50):
+    for callers, limit in ((concurrency, rps), (8, 1e6)):
+        print(f"{n_queries} queries, {callers} concurrent callers, endpoint: {LATENCY * 1000:.0f} ms, "
+              f"{limit:g} requests/s")
+        run_async("async unbatched", n_queries, callers, limit, 1, 0)
+        for max_wait_ms in (1, 2, 5, 10, 20):
+            run_async(f"async wait {max_wait_ms:g} ms", n_queries, callers, limit, QUERY_BATCH_SIZE, max_wait_ms)
+        # threads: fewer queries, a thread per caller
+        run_threads("threads unbatched", n_queries // 5, max(callers // 4, 8), limit, 1, 0)
+        run_threads(f"threads wait {QUERY_BATCH_MAX_WAIT_MS:g} ms", n_queries // 5, max(callers // 4, 8), limit,
+                    QUERY_BATCH_SIZE, QUERY_BATCH_MAX_WAIT_MS)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 5000, int(args[1]) if len(args) > 1 else 200,
+         float(args[2]) if len(args) > 2 else 50)
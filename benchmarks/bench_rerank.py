@@ -0,0 +1,128 @@
+"""Prompt size and grounding of the answer context with and without the reranking stage.
+
+The bundled langchain-docs corpus is split like ingestion2.py does (4000
+characters, 200 overlap). For identifier queries ("how do I use
+RunnableParallel?"), compares:
+
+  stuff top-4   the 4 chunks of the hybrid retriever, stuffed as-is (before)
+  rerank+pack   20 hybrid candidates -> rerank -> dedup -> packed into the budget
+
+A query is grounded when the context contains the identifier it asks about.
+Dense search uses the offline hashed embeddings of bench_local_ann. Tokens are
+counted with the chat model's tiktoken encoding, or, if its BPE file can't be
+downloaded, approximated by tiktoken's pre-tokenizer pieces (about one token each).
+
+usage: python -m benchmarks.bench_rerank [n_queries]
+"""
+import re
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from statistics import mean, median
+
+import numpy as np
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import InMemoryVectorStore
+
+
+import docs_loader
+from backend import core
+from backend.hybrid_retriever import HybridRetriever
+from backend.reranker import RerankingRetriever
+from benchmarks.bench_hybrid import IDENTIFIER_RE
+from benchmarks.bench_local_ann import hashed_embeddings
+from bm25_index import BM25Index
+
+BUDGETS = (1000, 1500, 3000)
+
+
+class HashedEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return hashed_embeddings(texts).tolist()
+
+    def embed_query(self, text):
+        return hashed_embeddings([text])[0].tolist()
+
+
+class ApproxEncoding:
+    """o200k pre-tokenizer pieces as tokens (no BPE merges)."""
+
+    PATTERN = re.compile(r"""[^\r\n\w]?\w+|\d{1,3}| ?[^\s\w]+[\r\n/]*|\s*[\r\n]+|\s+""")
+
+    def encode(self, text: str) -> list[str]:
+        return self.PATTERN.findall(text)
+
+    encode_ordinary = encode  # no special tokens either way
+
+    def decode(self, tokens: list[str]) -> str:
+        return "".join(tokens)
+
+
+def encoding():
+    try:
+        return core._encoding()
+    except Exception:
+        print("(tiktoken BPE unavailable offline: approximating token counts)")
+        return ApproxEncoding()
+
+
+def load_chunks() -> list[Document]:
+    # regroup the small chunks of ingestion.py into pages, then split like ingestion2.py
+    pages = defaultdict(list)
+    for batch in docs_loader.load_and_split_parallel():
+        for doc in batch:
+            pages[doc.metadata["source"]].append(doc.page_content)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=4000, chunk_overlap=200)
+    chunks = splitter.split_documents([Document(page_content="\n".join(texts), metadata={"source": source})
+                                       for source, texts in sorted(pages.items())])
+    for i, doc in enumerate(chunks):
+        doc.id = str(i)
+    return chunks
+
+
+def main(n_queries: int = 200):
+    chunks = load_chunks()
+    enc = encoding()
+    with tempfile.TemporaryDirectory() as tmp:
+        store = InMemoryVectorStore(HashedEmbeddings())
+        store.add_documents(chunks)
+        keyword_index = BM25Index("corpus", tmp)
+        keyword_index.add_documents(chunks)
+
+        rng = np.random.default_rng(0)
+        identifiers = sorted({m for doc in chunks for m in IDENTIFIER_RE.findall(doc.page_content)})
+        identifiers = [str(x) for x in rng.choice(identifiers, min(n_queries, len(identifiers)), replace=False)]
+        queries = [f"how do I use {identifier}?" for identifier in identifiers]
+
+        def hybrid(k: int) -> HybridRetriever:
+            return HybridRetriever(vector_retriever=store.as_retriever(search_kwargs={"k": max(10, k)}),
+                                   keyword_index=keyword_index, k=k, fetch_k=max(20, k))
+
+        setups = {"stuff top-4": hybrid(4)}
+        candidates = hybrid(core.RERANK_FETCH_K)
+        for budget in BUDGETS:
+            setups[f"rerank+pack {budget}"] = RerankingRetriever(base_retriever=candidates, encoding=enc,
+                                                                 max_tokens=budget)
+
+        print(f"{len(chunks)} chunks of up to 4000 characters, {len(queries)} identifier queries, "
+              f"{core.RERANK_FETCH_K} candidates for the reranker")
+        print(f"{'context':<18} {'tokens mean':>11} {'max':>6} {'chunks':>6} {'grounded':>8} {'retrieval p50':>13}")
+        for name, retriever in setups.items():
+            tokens, n_chunks, grounded, timings = [], [], 0, []
+            for identifier, query in zip(identifiers, queries):
+                start = time.perf_counter()
+                documents = retriever.invoke(query)
+                timings.append(time.perf_counter() - start)
+                tokens.append(sum(len(enc.encode_ordinary(doc.page_content)) for doc in documents))
+                n_chunks.append(len(documents))
+                grounded += any(identifier in doc.page_content for doc in documents)
+            print(f"{name:<18} {mean(tokens):11.0f} {max(tokens):6d} {mean(n_chunks):6.1f} "
+                  f"{grounded / len(queries):8.3f} {median(timings) * 1000:10.1f} ms")
+        keyword_index.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,99 @@
+"""Cost of recovering from a crashed ingestion run, with and without --resume.
+
+Starts ingestion2.py against the fake Tavily / OpenAI / Pinecone server (see
+benchmarks/bench_e2e.py), SIGKILLs it once `kill_after` index batches have
+been committed, then finishes the work two ways from copies of the crashed
+run's local state:
+
+  restart  python ingestion2.py            map + extract everything again
+                                           (embeddings of indexed chunks are
+                                           still in the local embedding cache)
+  resume   python ingestion2.py --resume   read the frontier and finished extract
+                                           batches back from the checkpoint,
+                                           skip chunks committed before the crash
+
+and reports, for each, the wall time and the fake API requests it made.
+
+usage: python -m benchmarks.bench_resume [--pages N] [--kill-after N] [--index-batch-size N]
+"""
+import argparse
+import shutil
+import signal
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+from benchmarks.bench_e2e import DEFAULTS, RESULT_PREFIX, child_command, child_env
+from benchmarks.fake_api_server import serve
+from benchmarks.fixtures import load_fixtures
+
+PATHS = ("/map", "/extract", "/v1/embeddings", "/vectors/upsert")
+
+
+def crash(params: Dict[str, int], base_url: str, tmp: str, kill_after: int) -> float:
+    """Run ingestion until `kill_after` index batches are committed, then SIGKILL it."""
+    indexed = Path(tmp) / "checkpoints" / "indexed.jsonl"
+    start = time.perf_counter()
+    process = subprocess.Popen(child_command(base_url, 1), env=child_env(params, base_url, tmp),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    while process.poll() is None:
+        if indexed.exists() and len(indexed.read_text(encoding="utf-8").splitlines()) >= kill_after:
+            process.send_signal(signal.SIGKILL)
+            process.wait()
+            return time.perf_counter() - start
+        time.sleep(0.01)
+    raise RuntimeError(f"ingestion finished before {kill_after} index batches were committed")
+
+
+def finish(handler, params: Dict[str, int], base_url: str, tmp: str, resume: bool) -> Dict[str, Any]:
+    handler.requests = {}
+    start = time.perf_counter()
+    out = subprocess.run(child_command(base_url, 1, resume=resume), env=child_env(params, base_url, tmp),
+                         capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+    lines = [line for line in out.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+    if out.returncode or not lines:
+        raise RuntimeError(f"{'resumed' if resume else 'restarted'} run failed:\n{out.stderr[-4000:]}")
+    return {"seconds": seconds, "requests": dict(handler.requests), "vectors": len(handler.vectors)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=None, help="replay only the first N recorded pages")
+    parser.add_argument("--kill-after", type=int, default=3, help="index batches committed before the crash")
+    parser.add_argument("--index-batch-size", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake API request")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    if args.pages:
+        fixtures = dict(list(fixtures.items())[: args.pages])
+    # no random 429s: both runs should do the same work
+    server = serve(rate_limit=50, error_rate=0)
+    handler = server.RequestHandlerClass
+    handler.fixtures = fixtures
+    handler.latency = args.latency
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    params = {**DEFAULTS, "index_batch_size": args.index_batch_size}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        crashed = f"{tmp}/crashed"
+        crash_seconds = crash(params, base_url, crashed, args.kill_after)
+        crash_vectors = dict(handler.vectors)
+        print(f"{len(fixtures)} recorded pages, index batches of {args.index_batch_size}: killed after "
+              f"{crash_seconds:.1f} s with {len(crash_vectors)} chunks indexed")
+        print(f"{'':<8} {'seconds':>8} " + " ".join(f"{path:>15}" for path in PATHS) + f" {'vectors':>8}")
+        for name, resume in (("restart", False), ("resume", True)):
+            shutil.copytree(crashed, f"{tmp}/{name}")
+            handler.vectors = dict(crash_vectors)  # the index as the crashed run left it
+            run = finish(handler, params, base_url, f"{tmp}/{name}", resume)
+            print(f"{name:<8} {run['seconds']:8.1f} "
+                  + " ".join(f"{run['requests'].get(path, 0):15d}" for path in PATHS)
+                  + f" {run['vectors']:8d}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
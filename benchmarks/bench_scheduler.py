@@ -0,0 +1,75 @@
+"""Bare asyncio.gather vs the shared Scheduler against the fake 429-injecting server.
+
+usage: python -m benchmarks.bench_scheduler [n_batches]
+"""
+import asyncio
+import json
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.fake_api_server import FakeAPIHandler, serve
+from scheduler import DeadLetterQueue, ProviderLimits, Scheduler
+
+
+class HTTPStatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def post(url: str, body: dict) -> dict:
+    request = urllib.request.Request(url, data=json.dumps(body).encode(),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        raise HTTPStatusError(e.code) from None
+
+
+async def extract(base_url: str, batch: list[str]) -> dict:
+    return await asyncio.to_thread(post, f"{base_url}/extract", {"urls": batch})
+
+
+async def run_gather(base_url: str, batches):
+    results = await asyncio.gather(*(extract(base_url, b) for b in batches), return_exceptions=True)
+    return sum(1 for r in results if not isinstance(r, Exception))
+
+
+async def run_scheduled(base_url: str, batches, dead_letter_path: str):
+    scheduler = Scheduler(
+        limits={"tavily": ProviderLimits(max_concurrency=8, requests_per_second=8, burst=8,
+                                         base_delay=0.2, max_delay=5.0)},
+        dead_letters=DeadLetterQueue(dead_letter_path),
+    )
+    results = await asyncio.gather(*(
+        scheduler.run("tavily", lambda b=b: extract(base_url, b), batch_id=str(i), payload=b)
+        for i, b in enumerate(batches)
+    ))
+    return sum(1 for r in results if r is not None), scheduler.stats["tavily"]
+
+
+def main(n_batches: int = 100):
+    server = serve(rate_limit=10, error_rate=0.05)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    batches = [[f"https://example.com/page-{i}-{j}" for j in range(20)] for i in range(n_batches)]
+
+    start = time.perf_counter()
+    ok = asyncio.run(run_gather(base_url, batches))
+    print(f"gather:    {ok}/{n_batches} batches ok in {time.perf_counter() - start:.2f}s "
+          f"(server stats {FakeAPIHandler.stats})")
+
+    FakeAPIHandler.stats = {"ok": 0, "rate_limited": 0, "connections": 0}
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        ok, stats = asyncio.run(run_scheduled(base_url, batches, f"{tmp}/dead_letters.jsonl"))
+        print(f"scheduler: {ok}/{n_batches} batches ok in {time.perf_counter() - start:.2f}s "
+              f"(scheduler stats {stats}, server stats {FakeAPIHandler.stats})")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,187 @@
+"""End-to-end latency of multi-turn conversations: sequential vs speculative retrieval.
+
+Runs scripted conversations through run_llm (sync, like main.py) and
+arun_llm (async, like backend/api.py) with a chain built by
+core.build_qa_chain() in each RETRIEVAL_MODE. Nothing leaves the process:
+
+  chat model  a stub that takes `rephrase_ms` to rephrase a follow-up (into a
+              scripted standalone question: the question itself for a
+              self-contained follow-up, a rewrite for one like "how do I
+              stream it?"), as long to write the MULTI_QUERY phrasings, and
+              `answer_ms` to answer
+  retrieval   an in-memory vector store over fake embeddings that takes
+              `search_ms` per search (query embedding + vector search), under
+              the reranker like the real chain
+
+Reports the median latency of first turns, of self-contained ("unchanged")
+and of rewritten ("rephrased") follow-ups, and the searches per turn.
+
+usage: python -m benchmarks.bench_speculative_retrieval [rephrase_ms] [search_ms] [answer_ms]
+"""
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+from statistics import mean, median
+from typing import Any, List
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import BaseChatModel
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from backend import core
+from backend.answer_cache import AnswerCache
+from backend.reranker import RerankingRetriever
+from benchmarks.bench_rerank import encoding
+from benchmarks.bench_time_to_first_token import STAND_IN_PROMPTS  # also sets a stub OPENAI_API_KEY
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+
+# (question, standalone question after the rephrase, or None when it is self-contained)
+CONVERSATIONS = [
+    [("What is LCEL?", None),
+     ("How do I stream it?", "How do I stream an LCEL chain?"),
+     ("What is a retriever?", None),
+     ("Can it return scores?", "Can a LangChain retriever return similarity scores?")],
+    [("How do I load a PDF?", None),
+     ("And split it into chunks?", "How do I split a loaded PDF into chunks?"),
+     ("What is the RecursiveCharacterTextSplitter?", None),
+     ("How do I set the chunk overlap?", None)],
+    [("What are tools?", None),
+     ("How do I bind them to a chat model?", "How do I bind tools to a chat model?"),
+     ("Which chat models support tool calling?", None),
+     ("Show an example with the second one", "Show a tool calling example with Anthropic chat models")],
+    [("What is LangGraph?", None),
+     ("How does it persist state?", "How does LangGraph persist state between runs?"),
+     ("What is a checkpointer?", None),
+     ("What is the difference between invoke and stream?", None)],
+]
+STANDALONE = {question: standalone for conversation in CONVERSATIONS for question, standalone in conversation
+              if standalone}
+ANSWER = "Here is how, according to the documentation."
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Rephrases, paraphrases or answers after a fixed delay, depending on the prompt."""
+
+    rephrase_s: float
+    answer_s: float
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _reply(self, messages) -> tuple[str, float]:
+        prompt = messages[-1].content
+        question = prompt.split(": ", 1)[-1].strip()
+        if "search queries" in prompt:
+            return "\n".join(f"{i}. {question} (phrasing {i})" for i in range(1, 4)), self.rephrase_s
+        if "standalone question" in prompt:
+            return STANDALONE.get(question, question), self.rephrase_s
+        return ANSWER, self.answer_s
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        text, delay = self._reply(messages)
+        time.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        text, delay = self._reply(messages)
+        await asyncio.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+class SlowRetriever(BaseRetriever):
+    """Vector store retriever that takes `delay` seconds per search, like embedding + Pinecone."""
+
+    retriever: BaseRetriever
+    delay: float
+    searches: int = 0
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                **kwargs: Any) -> List[Document]:
+        self.searches += 1
+        time.sleep(self.delay)
+        return self.retriever.invoke(query)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun,
+                                       **kwargs: Any) -> List[Document]:
+        self.searches += 1
+        await asyncio.sleep(self.delay)
+        return self.retriever.invoke(query)
+
+
+def setup(tmp: str):
+    hub_dir = Path(tmp) / "hub"
+    hub_dir.mkdir()
+    for owner_repo, prompt in STAND_IN_PROMPTS.items():  # the stub recognizes these prompts
+        (hub_dir / f"{owner_repo.replace('/', '__')}.json").write_text(dumps(prompt), encoding="utf-8")
+    core.HUB_CACHE_DIR = hub_dir
+
+    enc = encoding()
+    core._encoding = lambda: enc  # trim_chat_history, without downloading tiktoken's BPE file
+    embeddings = DeterministicFakeEmbedding(size=256)
+    store = InMemoryVectorStore(embeddings)
+    store.add_documents([Document(id=str(i), page_content=f"page {i} about chains, retrievers and tools",
+                                  metadata={"source": f"https://python.langchain.com/docs/{i}"})
+                         for i in range(200)])
+    return store, CachedEmbeddings(embeddings, EmbeddingCache(Path(tmp) / "embeddings", "fake"))
+
+
+def run_conversations(run, arun) -> dict:
+    """Latencies (seconds) of every turn, by kind."""
+    latencies = {"first": [], "unchanged": [], "rephrased": []}
+
+    def record(i: int, question: str, start: float):
+        kind = "first" if i == 0 else "rephrased" if question in STANDALONE else "unchanged"
+        latencies[kind].append(time.perf_counter() - start)
+
+    for conversation in CONVERSATIONS:
+        history = []
+        for i, (question, _) in enumerate(conversation):
+            start = time.perf_counter()
+            result = run(question, history) if run else asyncio.run(arun(question, history))
+            record(i, question, start)
+            history += [("human", question), ("ai", result["result"])]
+    return latencies
+
+
+def main(rephrase_ms: float = 400, search_ms: float = 150, answer_ms: float = 300):
+    modes = (("sequential", 0), ("speculative", 0), ("speculative", 3))
+    turns = sum(map(len, CONVERSATIONS))
+    print(f"{len(CONVERSATIONS)} conversations, {turns} turns; stub latencies: rephrase {rephrase_ms:g} ms, "
+          f"search {search_ms:g} ms, answer {answer_ms:g} ms")
+    print(f"{'median ms':<31}{'first':>8}{'unchanged':>11}{'rephrased':>11}{'mean':>8}{'searches/turn':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        store, cached_embeddings = setup(tmp)
+        for mode, multi_query in modes:
+            for path in ("sync", "async"):
+                search = SlowRetriever(retriever=store.as_retriever(search_kwargs={"k": 20}),
+                                       delay=search_ms / 1000)
+                chat = ScriptedChatModel(rephrase_s=rephrase_ms / 1000, answer_s=answer_ms / 1000)
+                core._qa_chain = core.build_qa_chain(
+                    chat=chat, retriever=RerankingRetriever(base_retriever=search, encoding=encoding()),
+                    retrieval_mode=mode, multi_query=multi_query)
+                core._embeddings = cached_embeddings  # build_qa_chain set up OpenAI's
+                core.answer_cache = AnswerCache(threshold=2.0)  # never hit: measure the full chain every time
+                if path == "sync":
+                    latencies = run_conversations(core.run_llm, None)
+                else:
+                    latencies = run_conversations(None, core.arun_llm)
+                label = mode + (f" + {multi_query} queries" if multi_query else "")
+                print(f"{label:<24}{path:<7}{median(latencies['first']) * 1000:8.0f}"
+                      f"{median(latencies['unchanged']) * 1000:11.0f}{median(latencies['rephrased']) * 1000:11.0f}"
+                      f"{mean(sum(latencies.values(), [])) * 1000:8.0f}{search.searches / turns:15.2f}")
+                if mode == "speculative":
+                    print(f"{'':<31}{core.speculative_retrieval_stats()}")
+
+
+if __name__ == "__main__":
+    args = [float(a) for a in sys.argv[1:]]
+    main(*args)
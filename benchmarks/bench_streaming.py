@@ -0,0 +1,106 @@
+"""Phased vs streaming ingestion against the fake Tavily/OpenAI server.
+
+Both modes use the same scheduler and the same extract / split / embed stages;
+"phased" runs them one after the other like ingestion2 used to, "streaming"
+connects them with the bounded queues of pipeline.run_streaming. Each mode runs
+in its own subprocess, so the reported peak RSS is not shared between them.
+
+usage: python -m benchmarks.bench_streaming [n_batches] [page_kb]
+"""
+import asyncio
+import json
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_scheduler import post
+from benchmarks.fake_api_server import serve
+from pipeline import PipelineStats, peak_rss_mb, run_streaming
+from scheduler import ProviderLimits, Scheduler
+
+CHUNK_SIZE = 4000
+BATCH_SIZE = 500
+
+
+def make_stages(base_url: str):
+    scheduler = Scheduler(limits={
+        "tavily": ProviderLimits(max_concurrency=8, requests_per_second=20, burst=8, base_delay=0.2),
+        "openai": ProviderLimits(max_concurrency=4, requests_per_second=20, burst=4, base_delay=0.2),
+    })
+
+    async def extract(urls, batch_num):
+        result = await scheduler.run(
+            "tavily", lambda: asyncio.to_thread(post, f"{base_url}/extract", {"urls": urls}))
+        return None if result is None else result["results"]
+
+    def split(pages):
+        return [page["raw_content"][i: i + CHUNK_SIZE]
+                for page in pages
+                for i in range(0, len(page["raw_content"]), CHUNK_SIZE)]
+
+    async def index(chunks, batch_num):
+        async def embed():
+            # embed in requests of 50 texts, like OpenAIEmbeddings(chunk_size=50)
+            for i in range(0, len(chunks), 50):
+                await asyncio.to_thread(post, f"{base_url}/v1/embeddings", {"input": chunks[i: i + 50]})
+            return True
+        return await scheduler.run("openai", embed) is True
+
+    return extract, split, index
+
+
+async def run_phased(url_batches, extract, split, index, stats: PipelineStats):
+    pages = [page
+             for result in await asyncio.gather(*(extract(b, i) for i, b in enumerate(url_batches, 1)))
+             if result is not None
+             for page in result]
+    stats.pages = len(pages)
+    chunks = split(pages)
+    stats.chunks = len(chunks)
+    batches = [chunks[i: i + BATCH_SIZE] for i in range(0, len(chunks), BATCH_SIZE)]
+
+    async def index_one(batch, batch_num):
+        if await index(batch, batch_num):
+            stats.mark_upsert(len(batch))
+
+    await asyncio.gather(*(index_one(b, i) for i, b in enumerate(batches, 1)))
+
+
+def child(mode: str, base_url: str, n_batches: int):
+    url_batches = [[f"https://example.com/page-{i}-{j}" for j in range(20)] for i in range(n_batches)]
+    extract, split, index = make_stages(base_url)
+    stats = PipelineStats()
+    if mode == "streaming":
+        asyncio.run(run_streaming(url_batches, extract, split, index, batch_size=BATCH_SIZE, stats=stats))
+    else:
+        asyncio.run(run_phased(url_batches, extract, split, index, stats))
+    print(json.dumps({"mode": mode,
+                      "time_to_first_upsert": stats.time_to_first_upsert,
+                      "total": time.perf_counter() - stats.started,
+                      "chunks": f"{stats.indexed_chunks}/{stats.chunks}",
+                      "peak_rss_mb": peak_rss_mb()}))
+
+
+def main(n_batches: int = 50, page_kb: int = 64):
+    server = serve(rate_limit=200, error_rate=0.01)
+    server.RequestHandlerClass.page_bytes = page_kb * 1024
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    # the server runs in this process, so its memory is not counted in the children's RSS
+    print(f"{n_batches} batches x 20 pages x {page_kb} KB")
+    for mode in ("phased", "streaming"):
+        out = subprocess.run([sys.executable, "-m", "benchmarks.bench_streaming", "--child",
+                              mode, base_url, str(n_batches)],
+                             capture_output=True, text=True, check=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        print(f"{mode:<10} first upsert after {result['time_to_first_upsert']:6.2f}s  "
+              f"total {result['total']:6.2f}s  chunks {result['chunks']}  "
+              f"peak RSS {result['peak_rss_mb']:7.1f} MB")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+    else:
+        args = sys.argv[1:]
+        main(int(args[0]) if args else 50, int(args[1]) if len(args) > 1 else 64)
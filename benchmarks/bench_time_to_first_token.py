@@ -0,0 +1,114 @@
+"""Time to first visible output of run_llm (blocking) vs stream_llm (streaming).
+
+The chat model is a stub that streams a fixed answer one character every
+`token_delay` seconds (or returns it whole after the same total time) and the
+retriever is an in-memory vector store over fake embeddings, so no API calls
+are made and only the chain plumbing is measured.
+If the hub prompts were never cached in .cache/hub, stand-ins with the same
+input variables are used.
+
+usage: python -m benchmarks.bench_time_to_first_token [n_queries] [token_delay]
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from statistics import median
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.load import dumps
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.vectorstores import InMemoryVectorStore
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-stub")  # the real client is built but never called
+
+from backend import core
+from backend.answer_cache import AnswerCache
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+
+ANSWER = ("A chain is a sequence of calls to components such as models, retrievers and "
+          "prompts, composed with the LangChain Expression Language. ") * 4
+
+STAND_IN_PROMPTS = {
+    "langchain-ai/retrieval-qa-chat": ChatPromptTemplate.from_messages([
+        ("system", "Answer any use questions based solely on the context below:\n\n<context>\n{context}\n</context>"),
+        MessagesPlaceholder("chat_history", optional=True),
+        ("human", "{input}"),
+    ]),
+    "langchain-ai/chat-langchain-rephrase": ChatPromptTemplate.from_messages([
+        MessagesPlaceholder("chat_history"),
+        ("human", "Rephrase the follow up question as a standalone question: {input}"),
+    ]),
+}
+
+
+class StubChatModel(FakeListChatModel):
+    """Takes as long to answer in one piece as it takes to stream the answer."""
+
+    def _call(self, *args, **kwargs) -> str:
+        response = super()._call(*args, **kwargs)
+        time.sleep(len(response) * (self.sleep or 0))
+        return response
+
+
+def setup(tmp: str, token_delay: float):
+    hub_dir = Path(tmp) / "hub"
+    for owner_repo, prompt in STAND_IN_PROMPTS.items():
+        name = f"{owner_repo.replace('/', '__')}.json"
+        cached = core.HUB_CACHE_DIR / name
+        (hub_dir / name).parent.mkdir(parents=True, exist_ok=True)
+        (hub_dir / name).write_text(cached.read_text(encoding="utf-8") if cached.exists() else dumps(prompt),
+                                    encoding="utf-8")
+    core.HUB_CACHE_DIR = hub_dir
+
+    embeddings = DeterministicFakeEmbedding(size=256)
+    store = InMemoryVectorStore(embeddings)
+    store.add_documents([Document(page_content=f"page {i} about chains and retrievers",
+                                  metadata={"source": f"https://python.langchain.com/docs/{i}"})
+                         for i in range(100)])
+    chat = StubChatModel(responses=[ANSWER], sleep=token_delay)
+
+    core._qa_chain = core.build_qa_chain(chat=chat, retriever=store.as_retriever())
+    core._embeddings = CachedEmbeddings(embeddings, EmbeddingCache(Path(tmp) / "embeddings", "fake"))
+    core.answer_cache = AnswerCache(threshold=2.0)  # never hit: measure the full chain every time
+
+
+def measure_blocking(query: str) -> float:
+    start = time.perf_counter()
+    core.run_llm(query)
+    return time.perf_counter() - start
+
+
+def measure_streaming(query: str):
+    start = time.perf_counter()
+    first_sources = first_token = None
+    for chunk in core.stream_llm(query):
+        now = time.perf_counter() - start
+        if "source_documents" in chunk and first_sources is None:
+            first_sources = now
+        if "answer" in chunk and first_token is None:
+            first_token = now
+    return first_sources, first_token, time.perf_counter() - start
+
+
+def main(n: int = 5, token_delay: float = 0.01):
+    with tempfile.TemporaryDirectory() as tmp:
+        setup(tmp, token_delay)
+        queries = [f"what is a chain? ({i})" for i in range(n)]
+
+        blocking = [measure_blocking(q) for q in queries]
+        streaming = [measure_streaming(q) for q in queries]
+
+    print(f"median over {n} queries, stub model streaming {len(ANSWER)} tokens at {token_delay * 1000:.0f} ms each")
+    print(f"run_llm    first output (full answer) {median(blocking) * 1000:8.1f} ms")
+    print(f"stream_llm source documents           {median(s[0] for s in streaming) * 1000:8.1f} ms")
+    print(f"stream_llm first token                {median(s[1] for s in streaming) * 1000:8.1f} ms")
+    print(f"stream_llm full answer                {median(s[2] for s in streaming) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 0.01)
@@ -0,0 +1,203 @@
+"""Local fake Tavily / OpenAI / Pinecone server that injects 429s.
+
+Endpoints (POST, JSON):
+  /map             Tavily-shaped    {"url", "limit", "select_paths", "exclude_paths"} -> {"results": [urls]}
+  /extract         Tavily-shaped    {"urls": [...]} -> {"results": [{"url", "raw_content"}]}
+  /v1/embeddings   OpenAI-shaped    {"input": [...]} -> {"data": [{"embedding", "index"}]}
+  /vectors/upsert  Pinecone-shaped  data plane, vectors kept in memory
+  /vectors/delete, /query
+
+With `fixtures` set (recorded pages, see benchmarks/fixtures.py), /map and
+/extract replay them; otherwise pages are made up from their URL. /map
+returns the site's URLs under the requested URL that pass the path regexes,
+the first `limit` of them (`site_urls` stands in for a larger site). Embeddings
+are pseudo-random but deterministic per text.
+
+Requests above `rate_limit` per second (counted per provider), or picked at
+random with probability `error_rate`, get a 429. Point the clients at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1, PINECONE_HOST=http://127.0.0.1:<port>
+and TavilyExtract(api_base_url="http://127.0.0.1:<port>").
+
+usage: python -m benchmarks.fake_api_server [port] [rate_limit] [error_rate]
+"""
+import base64
+import json
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import numpy as np
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+    disable_nagle_algorithm = True  # headers and body are separate writes: no delayed-ACK stalls on reused connections
+    rate_limit = 10.0  # requests per second
+    error_rate = 0.05  # extra random 429s
+    latency = 0.05  # seconds per request
+    connect_latency = 0.0  # seconds per new connection (stands in for the TCP + TLS handshake)
+    page_bytes = 0  # pad every extracted page to roughly this size
+    embedding_dim = 1536
+    fixtures: Optional[Dict[str, str]] = None  # url -> raw_content
+    site_urls: Optional[List[str]] = None  # what /map finds, if not the fixtures' URLs
+
+    lock = threading.Lock()
+    windows: Dict[str, List[float]] = {}  # provider -> [window start, requests in window]
+    stats = {"ok": 0, "rate_limited": 0, "connections": 0}
+    requests: Dict[str, int] = {}  # path -> successful requests
+    vectors: Dict[str, tuple] = {}  # Pinecone id -> (values, metadata)
+
+    def log_message(self, *args):
+        pass  # keep the console quiet
+
+    def setup(self):
+        super().setup()
+        with self.lock:
+            type(self).stats["connections"] += 1
+        time.sleep(self.connect_latency)
+
+    def _provider(self) -> str:
+        if self.path.startswith("/v1/"):
+            return "openai"
+        if self.path in ("/map", "/extract"):
+            return "tavily"
+        return "pinecone"
+
+    def _throttled(self) -> bool:
+        cls = type(self)
+        with cls.lock:
+            now = time.monotonic()
+            window = cls.windows.setdefault(self._provider(), [now, 0])
+            if now - window[0] >= 1.0:
+                window[0], window[1] = now, 0
+            window[1] += 1
+            throttled = window[1] > cls.rate_limit or random.random() < cls.error_rate
+            cls.stats["rate_limited" if throttled else "ok"] += 1
+            if not throttled:
+                cls.requests[self.path] = cls.requests.get(self.path, 0) + 1
+            return throttled
+
+    def _send(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _page(self, url: str) -> str:
+        if self.fixtures is not None:
+            return self.fixtures.get(url, "")
+        text = f"# {url}\n\nfake page content for {url}"
+        sentence = f" lorem ipsum for {url}."
+        return text + sentence * (self.page_bytes // len(sentence))
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self._throttled():
+            return self._send(429, {"error": "rate limit exceeded"})
+        time.sleep(self.latency)
+
+        if self.path == "/map":
+            return self._send(200, {"base_url": body.get("url"), "results": self._map(body)})
+        if self.path == "/extract":
+            urls = body.get("urls", [])
+            urls = [urls] if isinstance(urls, str) else urls
+            results = [{"url": url, "raw_content": self._page(url)} for url in urls]
+            return self._send(200, {"results": results, "failed_results": []})
+        if self.path == "/v1/embeddings":
+            texts = body.get("input", [])
+            texts = [texts] if isinstance(texts, str) else texts
+            data = []
+            for i, text in enumerate(texts):
+                vector = self._embedding(text)
+                data.append({"object": "embedding", "index": i,
+                             "embedding": base64.b64encode(vector.tobytes()).decode()
+                             if body.get("encoding_format") == "base64" else vector.tolist()})
+            return self._send(200, {"object": "list", "data": data, "model": body.get("model"),
+                                    "usage": {"prompt_tokens": 0, "total_tokens": 0}})
+        if self.path == "/vectors/upsert":
+            with self.lock:
+                for vector in body.get("vectors", []):
+                    self.vectors[vector["id"]] = (np.asarray(vector["values"], dtype=np.float32),
+                                                  vector.get("metadata", {}))
+            return self._send(200, {"upsertedCount": len(body.get("vectors", []))})
+        if self.path == "/vectors/delete":
+            with self.lock:
+                for id_ in body.get("ids", []):
+                    self.vectors.pop(id_, None)
+            return self._send(200, {})
+        if self.path == "/query":
+            return self._send(200, {"matches": self._query(body), "namespace": body.get("namespace", "")})
+        self._send(404, {"error": f"unknown path {self.path}"})
+
+    def _map(self, body: dict) -> List[str]:
+        base = body.get("url", "https://example.com/")
+        if self.site_urls is not None:
+            urls = self.site_urls
+        elif self.fixtures is not None:
+            urls = list(self.fixtures)
+        else:
+            urls = [f"{base.rstrip('/')}/page-{i}" for i in range(100)]
+        root = urlsplit(base if "://" in base else "https://" + base)
+        select = [re.compile(p) for p in body.get("select_paths") or []]
+        exclude = [re.compile(p) for p in body.get("exclude_paths") or []]
+        under = f"{root.scheme}://{root.netloc}{root.path.rstrip('/')}"
+        found = []
+        for url in urls:
+            if not url.startswith(under):
+                continue
+            parts = urlsplit(url)
+            if select and not any(p.search(parts.path) for p in select):
+                continue
+            if any(p.search(parts.path) for p in exclude):
+                continue
+            found.append(url)
+        return found[: body.get("limit") or None]
+
+    def _embedding(self, text) -> np.ndarray:
+        text = text if isinstance(text, str) else json.dumps(text)  # token ids
+        vector = np.random.default_rng(zlib.crc32(text.encode())).standard_normal(self.embedding_dim)
+        return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+    def _query(self, body: dict) -> list:
+        with self.lock:
+            items = list(self.vectors.items())
+        if not items:
+            return []
+        matrix = np.stack([values for _, (values, _) in items])
+        scores = matrix @ np.asarray(body["vector"], dtype=np.float32)
+        top = np.argsort(-scores)[: body.get("topK", 4)]
+        return [{"id": items[i][0], "score": float(scores[i]), "values": [],
+                 "metadata": items[i][1][1] if body.get("includeMetadata") else None}
+                for i in top]
+
+
+def serve(port: int = 0, rate_limit: float = 10.0, error_rate: float = 0.05) -> ThreadingHTTPServer:
+    """Start the fake server on a background thread and return it (port 0 = any free port)."""
+    FakeAPIHandler.rate_limit = rate_limit
+    FakeAPIHandler.error_rate = error_rate
+    FakeAPIHandler.windows = {}
+    FakeAPIHandler.stats = {"ok": 0, "rate_limited": 0, "connections": 0}
+    FakeAPIHandler.requests = {}
+    FakeAPIHandler.vectors = {}
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeAPIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    server = serve(int(args[0]) if args else 8765,
+                   float(args[1]) if len(args) > 1 else 10.0,
+                   float(args[2]) if len(args) > 2 else 0.05)
+    print(f"fake Tavily/OpenAI/Pinecone server on http://127.0.0.1:{server.server_port}")
+    threading.Event().wait()
@@ -0,0 +1,70 @@
+"""Recorded pages replayed by the fake API server (benchmarks/fake_api_server.py).
+
+A fixture file is gzipped JSON lines, one {"url", "raw_content"} per page, i.e.
+what TavilyMap + TavilyExtract returned for a site. Two ways to record one:
+
+  corpus  offline, from the bundled ReadTheDocs mirror (text cleaned like
+          ingestion.py does, canonical https URLs)
+  live    from the real Tavily API (needs TAVILY_API_KEY), for a given site
+
+usage: python -m benchmarks.fixtures corpus [out]
+       python -m benchmarks.fixtures live <site url> [out]
+"""
+import gzip
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Iterable
+
+FIXTURES_PATH = Path(os.getenv("BENCH_FIXTURES", ".cache/bench_fixtures/langchain-docs.jsonl.gz"))
+
+
+def write_fixtures(pages: Iterable[Dict[str, str]], path: Path = FIXTURES_PATH) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    n = 0
+    tmp = path.with_name(path.name + ".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        for page in pages:
+            f.write(json.dumps({"url": page["url"], "raw_content": page["raw_content"]}) + "\n")
+            n += 1
+    tmp.replace(path)
+    return n
+
+
+def load_fixtures(path: Path = FIXTURES_PATH) -> Dict[str, str]:
+    """url -> raw_content, recording them from the bundled corpus on first use."""
+    if not path.exists():
+        print(f"recording fixtures from the bundled corpus into {path}")
+        write_fixtures(corpus_pages(), path)
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return {page["url"]: page["raw_content"] for page in map(json.loads, f)}
+
+
+def corpus_pages() -> Iterable[Dict[str, str]]:
+    import docs_loader
+    from frontier import clean_source
+
+    for path in sorted(Path(docs_loader.DOCS_PATH).rglob("*.htm*")):
+        text = docs_loader.clean_html(path.read_text(encoding="utf-8"))
+        if text:
+            yield {"url": clean_source(str(path)), "raw_content": text}
+
+
+def live_pages(site: str) -> Iterable[Dict[str, str]]:
+    from langchain_tavily import TavilyExtract, TavilyMap
+
+    urls = TavilyMap(max_depth=5, max_breadth=100, limit=500).invoke(site)["results"]
+    extract = TavilyExtract()
+    for i in range(0, len(urls), 20):
+        for page in extract.invoke({"urls": urls[i: i + 20], "extract_depth": "advanced"})["results"]:
+            yield {"url": page["url"], "raw_content": page["raw_content"]}
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["live"]:
+        out = Path(sys.argv[3]) if len(sys.argv) > 3 else FIXTURES_PATH
+        print(f"recorded {write_fixtures(live_pages(sys.argv[2]), out)} pages into {out}")
+    else:
+        out = Path(sys.argv[2]) if len(sys.argv) > 2 else FIXTURES_PATH
+        print(f"recorded {write_fixtures(corpus_pages(), out)} pages into {out}")
@@ -0,0 +1,352 @@
+"""Local BM25 keyword index, built incrementally during ingestion.
+
+Dense search often misses exact API identifiers (class names, method names);
+a keyword index finds them. The index is a list of immutable segments, one
+per added batch, merged into one once there are too many of them:
+
+    seg-<n>/terms.json   term -> [offset, count] into the posting arrays
+    seg-<n>/docs.npy     uint32 document numbers, grouped by term
+    seg-<n>/tfs.npy      uint16 term frequencies, same order
+    seg-<n>/lengths.npy  uint32 length (in tokens) of every document of the segment
+    segments.json        the live segments, replaced atomically when they change
+    docs.sqlite          document number -> id, text, metadata, deleted flag
+
+Posting arrays are memory-mapped, so a lookup only touches the postings of
+the query terms. Adding an id that already exists replaces the old document.
+The statistics BM25 needs (live documents, their total length, and the
+document frequency of every term over them) are kept up to date on every
+add and delete, so deleted documents stop counting before the next merge.
+
+A merge writes a new segment, swaps segments.json to it, and only then
+removes the segments it replaced: a crash leaves either the old segments or
+the merged one in use (the other is cleaned up on the next open). Other
+processes (the app) reload the index once the ingestion calls
+mark_index_updated().
+"""
+import json
+import math
+import os
+import re
+import shutil
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from backend.answer_cache import IndexVersionWatch
+
+BM25_INDEX_DIR = os.getenv("BM25_INDEX_DIR", str(Path(__file__).resolve().parent / ".cache" / "bm25"))
+
+K1 = 1.2
+B = 0.75
+MAX_SEGMENTS = 8  # merge all segments into one past this many
+
+TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it its of on or that the this "
+    "to was what when where which who why will with you your do does can".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words; identifiers also yield their camelCase / snake_case parts,
+    so both "RecursiveCharacterTextSplitter" and "text splitter" match it."""
+    tokens = []
+    for word in TOKEN_RE.findall(text):
+        lower = word.lower()
+        if lower not in STOPWORDS:
+            tokens.append(lower)
+        parts = [p.lower() for piece in word.split("_") for p in CAMEL_RE.findall(piece)]
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p not in STOPWORDS)
+    return tokens
+
+
+class Segment:
+    def __init__(self, path: Path):
+        self.path = path
+        self.terms: Dict[str, List[int]] = json.loads((path / "terms.json").read_text(encoding="utf-8"))
+        self.docs = np.load(path / "docs.npy", mmap_mode="r")
+        self.tfs = np.load(path / "tfs.npy", mmap_mode="r")
+        self.lengths = np.load(path / "lengths.npy")
+        self.doc_start = int(path.name.split("-")[1])
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        offset, count = self.terms.get(term, (0, 0))
+        return self.docs[offset: offset + count], self.tfs[offset: offset + count]
+
+
+def write_segment(path: Path,
+                  doc_numbers: np.ndarray,
+                  term_ids: np.ndarray,
+                  tfs: np.ndarray,
+                  vocabulary: Sequence[str],
+                  lengths: np.ndarray) -> None:
+    """Write (doc, term, tf) triples as a segment, grouping the postings by term."""
+    order = np.lexsort((doc_numbers, term_ids))
+    term_ids = term_ids[order]
+    unique_terms, offsets, counts = np.unique(term_ids, return_index=True, return_counts=True)
+    tmp = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    np.save(tmp / "docs.npy", doc_numbers[order].astype(np.uint32))
+    np.save(tmp / "tfs.npy", np.minimum(tfs[order], np.iinfo(np.uint16).max).astype(np.uint16))
+    np.save(tmp / "lengths.npy", lengths.astype(np.uint32))
+    (tmp / "terms.json").write_text(json.dumps(
+        {vocabulary[t]: [int(o), int(c)] for t, o, c in zip(unique_terms, offsets, counts)}), encoding="utf-8")
+    # a segment only becomes visible once it is complete
+    tmp.rename(path)
+
+
+class BM25Index:
+    def __init__(self, index_name: str = "default", path: str | Path = BM25_INDEX_DIR):
+        self.path = Path(path) / index_name
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(self.path / "docs.sqlite", check_same_thread=False)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                number INTEGER PRIMARY KEY,
+                id TEXT NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS docs_id ON docs (id);
+            """
+        )
+        self.index_version = IndexVersionWatch()
+        self._load()
+
+    def _segment_names(self) -> List[str]:
+        listing = self.path / "segments.json"
+        if listing.exists():
+            return json.loads(listing.read_text(encoding="utf-8"))
+        # indexes written before segments.json: every complete segment, or the merged one
+        # if a merge was interrupted after it removed the segments it replaced
+        merged = sorted(self.path.glob("seg-*.merged"))
+        if merged:
+            recovered = merged[-1].with_name(merged[-1].name[: -len(".merged")] + "-merged")
+            merged[-1].rename(recovered)
+            return [recovered.name]
+        return [p.name for p in sorted(self.path.glob("seg-*")) if "." not in p.name]
+
+    def _save_segment_names(self) -> None:
+        tmp = self.path / "segments.json.tmp"
+        tmp.write_text(json.dumps([segment.path.name for segment in self.segments]), encoding="utf-8")
+        tmp.replace(self.path / "segments.json")
+
+    def _load(self) -> None:
+        names = self._segment_names()
+        self.segments = [Segment(self.path / name) for name in names]
+        self._load_statistics()
+
+    def _remove_unlisted(self) -> None:
+        """Delete segments a crash left behind (half-written, or merged but never swapped in)."""
+        live = {segment.path.name for segment in self.segments}
+        for path in self.path.glob("seg-*"):
+            if path.name not in live:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _load_statistics(self) -> None:
+        n_docs = self.conn.execute("SELECT COALESCE(MAX(number) + 1, 0) FROM docs").fetchone()[0]
+        self.lengths = np.zeros(n_docs, dtype=np.float32)
+        for segment in self.segments:
+            self.lengths[segment.doc_start: segment.doc_start + len(segment.lengths)] = segment.lengths
+        self.deleted = np.zeros(n_docs, dtype=bool)
+        deleted = [number for (number,) in self.conn.execute("SELECT number FROM docs WHERE deleted = 1")]
+        self.deleted[deleted] = True
+
+        self._n_docs = int(n_docs - np.count_nonzero(self.deleted))
+        self._total_length = float(self.lengths[~self.deleted].sum())
+        self.df: Counter = Counter()
+        for segment in self.segments:
+            if not segment.terms:
+                continue
+            # live postings of each term: a cumulative count of the live ones, read at the term boundaries
+            live = np.concatenate([[0], np.cumsum(~self.deleted[np.asarray(segment.docs, dtype=np.int64)])])
+            for term, (offset, count) in segment.terms.items():
+                df = int(live[offset + count] - live[offset])
+                if df:
+                    self.df[term] += df
+
+    @property
+    def n_docs(self) -> int:
+        return self._n_docs
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    # --- writes -------------------------------------------------------------------
+
+    def add_documents(self, documents: Sequence[Document], ids: Optional[Sequence[str]] = None) -> None:
+        """Index a batch of documents (one new segment). Existing ids are replaced."""
+        ids = list(ids) if ids is not None else [doc.id for doc in documents]
+        if any(id_ is None for id_ in ids):
+            raise ValueError("BM25Index needs an id for every document")
+        if not documents:
+            return
+
+        vocabulary: Dict[str, int] = {}
+        doc_numbers, term_ids, tfs, lengths = [], [], [], []
+        with self.lock:
+            self._remove_unlisted()
+            self.delete(ids)
+            start = len(self.deleted)
+            df: Counter = Counter()
+            for i, doc in enumerate(documents):
+                tokens = tokenize(doc.page_content)
+                lengths.append(len(tokens))
+                counts = Counter(tokens)
+                df.update(counts.keys())
+                for term, tf in counts.items():
+                    doc_numbers.append(start + i)
+                    term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                    tfs.append(tf)
+
+            segment_path = self.path / f"seg-{start:010d}"
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT INTO docs (number, id, text, metadata) VALUES (?, ?, ?, ?)",
+                    [(start + i, id_, doc.page_content, json.dumps(doc.metadata))
+                     for i, (id_, doc) in enumerate(zip(ids, documents))],
+                )
+                write_segment(segment_path,
+                              np.array(doc_numbers, dtype=np.int64),
+                              np.array(term_ids, dtype=np.int64),
+                              np.array(tfs, dtype=np.int64),
+                              list(vocabulary),
+                              np.array(lengths))
+                self.segments.append(Segment(segment_path))
+                self._save_segment_names()
+            self.lengths = np.concatenate([self.lengths, np.array(lengths, dtype=np.float32)])
+            self.deleted = np.concatenate([self.deleted, np.zeros(len(documents), dtype=bool)])
+            self._n_docs += len(documents)
+            self._total_length += float(sum(lengths))
+            self.df.update(df)
+            if len(self.segments) > MAX_SEGMENTS:
+                self.merge()
+
+    def delete(self, ids: Sequence[str]) -> None:
+        with self.lock, self.conn:
+            for i in range(0, len(ids), 500):
+                batch = list(ids[i: i + 500])
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT number, text FROM docs WHERE deleted = 0 AND id IN ({placeholders})", batch).fetchall()
+                self.conn.execute(f"UPDATE docs SET deleted = 1 WHERE id IN ({placeholders})", batch)
+                numbers = [number for number, _ in rows]
+                self.deleted[numbers] = True
+                self._n_docs -= len(numbers)
+                self._total_length -= float(self.lengths[numbers].sum())
+                # the terms of a deleted document: tokenized again, as add_documents did
+                self.df.subtract(term for _, text in rows for term in set(tokenize(text)))
+
+    def merge(self) -> None:
+        """Rewrite all segments as one, dropping the postings of deleted documents."""
+        with self.lock:
+            if len(self.segments) < 2:
+                return
+            vocabulary = sorted({term for segment in self.segments for term in segment.terms})
+            term_numbers = {term: i for i, term in enumerate(vocabulary)}
+            doc_numbers, term_ids, tfs = [], [], []
+            for segment in self.segments:
+                for term, (offset, count) in segment.terms.items():
+                    doc_numbers.append(segment.docs[offset: offset + count])
+                    tfs.append(segment.tfs[offset: offset + count])
+                    term_ids.append(np.full(count, term_numbers[term], dtype=np.int64))
+            doc_numbers = np.concatenate(doc_numbers).astype(np.int64)
+            keep = ~self.deleted[doc_numbers]
+
+            start = self.segments[0].doc_start
+            lengths = self.lengths[start:]
+            # named after the documents it covers, so it doesn't collide with the segments it replaces
+            merged = self.path / f"seg-{start:010d}-{len(self.deleted):010d}"
+            self._remove_unlisted()
+            write_segment(merged,
+                          doc_numbers[keep],
+                          np.concatenate(term_ids)[keep],
+                          np.concatenate(tfs).astype(np.int64)[keep],
+                          vocabulary,
+                          lengths)
+            old = [segment.path for segment in self.segments]
+            self.segments = [Segment(merged)]
+            self._save_segment_names()  # from here on the merged segment is the index
+            for path in old:
+                shutil.rmtree(path, ignore_errors=True)
+
+    # --- search -------------------------------------------------------------------
+
+    def reload_if_updated(self) -> None:
+        """Reload segments and statistics if the index was re-ingested (by another process)."""
+        with self.lock:
+            if self.index_version.changed():
+                self._load()
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[int, float]]:
+        """Top-k (document number, BM25 score)."""
+        with self.lock:
+            self.reload_if_updated()
+            n_docs = self.n_docs
+            if not n_docs:
+                return []
+            avg_length = self._total_length / n_docs or 1.0
+
+            doc_parts, score_parts = [], []
+            for term in set(tokenize(query)):
+                df = self.df[term]
+                if df <= 0:
+                    continue
+                postings = [segment.postings(term) for segment in self.segments]
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for docs, tfs in postings:
+                    if not len(docs):
+                        continue
+                    tfs = np.asarray(tfs, dtype=np.float32)
+                    norm = K1 * (1 - B + B * self.lengths[docs] / avg_length)
+                    doc_parts.append(np.asarray(docs))
+                    score_parts.append(idf * tfs * (K1 + 1) / (tfs + norm))
+            if not doc_parts:
+                return []
+
+            docs = np.concatenate(doc_parts)
+            scores = np.concatenate(score_parts)
+            # sum the per-term scores of each document: densely when the postings
+            # cover a good part of the corpus, otherwise only over the matched documents
+            if len(docs) > len(self.deleted) // 16:
+                scores = np.bincount(docs, weights=scores, minlength=len(self.deleted))
+                docs = np.flatnonzero(scores)
+                scores = scores[docs]
+            else:
+                docs, inverse = np.unique(docs, return_inverse=True)
+                scores = np.bincount(inverse, weights=scores)
+            scores[self.deleted[docs]] = -np.inf
+
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(int(docs[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def documents(self, numbers: Sequence[int]) -> Dict[int, Document]:
+        if not numbers:
+            return {}
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT number, id, text, metadata FROM docs WHERE number IN ({','.join('?' * len(numbers))})",
+                list(numbers),
+            )
+            return {number: Document(id=id_, page_content=text, metadata=json.loads(metadata))
+                    for number, id_, text, metadata in rows}
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        hits = self.search(query, k)
+        documents = self.documents([number for number, _ in hits])
+        return [documents[number] for number, _ in hits]
+
+    def close(self) -> None:
+        self.conn.close()
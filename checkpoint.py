@@ -0,0 +1,139 @@
+"""Per-phase checkpoints of an ingestion run, so a crashed run can be resumed.
+
+    run.json                   run parameters + status ("running" / "done")
+    frontier.sqlite            discovered URLs, their extract batches and the mapped shards (frontier.py)
+    replay_chunks.jsonl.gz     dead-lettered chunks taken over from earlier runs
+    replay.json                keys of the dead letters this run replays (acked when it finishes)
+    extract/batch-<n>.jsonl.gz pages of every completed extract batch
+    indexed.jsonl              one line per committed index batch: {chunk id: content hash}
+
+Every file is written atomically (tmp + rename) or, for indexed.jsonl,
+appended one flushed line at a time, so whatever is on disk after a crash
+describes completed work only. `ingestion2.py --resume` picks up from there:
+shards already mapped and completed extract batches are read back from disk, and
+chunks whose exact content was already committed are not embedded again.
+"""
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from logger import log_warning
+
+CHECKPOINT_DIR = os.getenv("INGESTION_CHECKPOINT_DIR",
+                           str(Path(__file__).resolve().parent / ".cache" / "checkpoints" / "ingestion"))
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+
+
+def _dump_documents(documents: List[Document]) -> bytes:
+    lines = (json.dumps({"id": doc.id, "page_content": doc.page_content, "metadata": doc.metadata})
+             for doc in documents)
+    return gzip.compress(("\n".join(lines) + "\n").encode("utf-8"), compresslevel=6)
+
+
+def _load_documents(path: Path) -> List[Document]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [Document(**json.loads(line)) for line in f if line.strip()]
+
+
+class RunCheckpoint:
+    def __init__(self, path: str | Path = CHECKPOINT_DIR):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.committed: Dict[str, str] = {}  # chunk id -> content hash, from indexed.jsonl
+        self.resumed = False
+
+    # --- lifecycle ----------------------------------------------------------------
+
+    def start(self, params: Dict[str, Any], resume: bool = False) -> bool:
+        """Start a run. With `resume`, continue an unfinished run that used the
+        same parameters; otherwise (or if there is none) start from scratch.
+
+        Returns whether an earlier run is being resumed."""
+        run = self._read_json("run.json")
+        if resume and run and run.get("status") == "running" and run.get("params") == params:
+            self.resumed = True
+            self.committed = self._load_committed()
+            return True
+        if resume and run and run.get("status") == "running":
+            # parameters changed: batch numbers and chunks no longer line up
+            log_warning(f"♻️ Checkpoint: parameters changed ({run.get('params')} -> {params}), starting over")
+        shutil.rmtree(self.path, ignore_errors=True)
+        (self.path / "extract").mkdir(parents=True)
+        self._write_json("run.json", {"status": "running", "started": time.time(), "params": params})
+        return False
+
+    def finish(self) -> None:
+        """Mark the run complete and drop the bulky extract checkpoints."""
+        run = self._read_json("run.json") or {}
+        self._write_json("run.json", {**run, "status": "done", "finished": time.time()})
+        shutil.rmtree(self.path / "extract", ignore_errors=True)
+
+    # --- dead letters --------------------------------------------------------------
+
+    def save_replay_chunks(self, chunks: List[Document], dead_letter_keys: List[str]) -> None:
+        _write_atomic(self.path / "replay_chunks.jsonl.gz", _dump_documents(chunks))
+        self._write_json("replay.json", {"dead_letters": dead_letter_keys})
+
+    def load_replayed_dead_letters(self) -> List[str]:
+        return (self._read_json("replay.json") or {}).get("dead_letters", []) if self.resumed else []
+
+    def load_replay_chunks(self) -> List[Document]:
+        path = self.path / "replay_chunks.jsonl.gz"
+        return _load_documents(path) if self.resumed and path.exists() else []
+
+    # --- extract ------------------------------------------------------------------
+
+    def _extract_path(self, batch_num: int) -> Path:
+        return self.path / "extract" / f"batch-{batch_num:06d}.jsonl.gz"
+
+    def save_extract(self, batch_num: int, pages: List[Document]) -> None:
+        _write_atomic(self._extract_path(batch_num), _dump_documents(pages))
+
+    def load_extract(self, batch_num: int) -> Optional[List[Document]]:
+        """Pages of an extract batch completed before the crash (None if it wasn't)."""
+        path = self._extract_path(batch_num)
+        return _load_documents(path) if self.resumed and path.exists() else None
+
+    # --- index --------------------------------------------------------------------
+
+    def record_indexed(self, batch_num: int, chunk_hashes: Dict[str, str]) -> None:
+        line = json.dumps({"batch": batch_num, "chunks": chunk_hashes}) + "\n"
+        with self.lock, open(self.path / "indexed.jsonl", "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+            self.committed.update(chunk_hashes)
+
+    def _load_committed(self) -> Dict[str, str]:
+        committed = {}
+        path = self.path / "indexed.jsonl"
+        if path.exists():
+            for line in path.read_text(encoding="utf-8").splitlines():
+                try:
+                    committed.update(json.loads(line)["chunks"])
+                except (json.JSONDecodeError, KeyError):
+                    pass  # line cut short by the crash: that batch isn't committed
+        return committed
+
+    # --- helpers ------------------------------------------------------------------
+
+    def _read_json(self, name: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads((self.path / name).read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_json(self, name: str, data: Dict[str, Any]) -> None:
+        _write_atomic(self.path / name, json.dumps(data).encode("utf-8"))
@@ -0,0 +1,475 @@
+"""Compressed local chunk store, so the vector index only carries ids.
+
+Every upsert used to send the full chunk text (as Pinecone metadata) and
+every query brought it back over the wire. ChunkStoreVectorStore wraps the
+vectorstore of vectorstores.py: chunk texts and metadata go to a local
+ChunkStore, the vector index gets the vectors with the id and
+CHUNK_STORE_METADATA (the source URL) only, and retrieved ids are hydrated
+back into full Documents from the store.
+
+The store is content addressed: a record (metadata as JSON, a newline, the
+text) is keyed by its sha256, so identical chunks are stored once, and
+compressed with zstd using a dictionary trained on the first
+CHUNK_STORE_DICT_SAMPLES records (chunks are small and alike: about 5x
+smaller with the dictionary, 1.8x without).
+
+Layout of a store directory:
+    chunks-<generation>.zst  zstd frames, one per record, appended
+    dict-<n>.zdict           compression dictionaries
+    index.sqlite             offset index: record hash -> offset, length, dictionary;
+                             chunk id -> record hash, source
+
+The data file is memory-mapped for reads, so hydrating a query's results is
+an SQLite lookup plus a few microseconds of decompression per chunk. Deleted
+records are dropped from the index and their bytes reclaimed by rewriting
+the file into the next generation once most of it is dead (readers in other
+processes switch over on their next lookup).
+
+CHUNK_STORE=false (the default with Pinecone, whose vectors other machines
+read) keeps the texts in the vector index as before. Backends that can't
+take precomputed vectors (Chroma) keep their texts too; their results are
+still hydrated from the store.
+"""
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import zstandard as zstd
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from logger import log_warning
+
+CHUNK_STORE_DIR = os.getenv("CHUNK_STORE_DIR", str(Path(__file__).resolve().parent / ".cache" / "chunk_store"))
+CHUNK_STORE_LEVEL = int(os.getenv("CHUNK_STORE_LEVEL", "3"))  # zstd level
+CHUNK_STORE_DICT_SAMPLES = int(os.getenv("CHUNK_STORE_DICT_SAMPLES", "2000"))  # records to train the dictionary on
+CHUNK_STORE_DICT_BYTES = 32 * 1024  # larger dictionaries need more samples than a first batch has
+CHUNK_STORE_METADATA = [key for key in os.getenv("CHUNK_STORE_METADATA", "source").split(",") if key]
+
+COMPACT_MIN_DEAD_BYTES = 1 << 20  # below this, deleted records aren't worth a rewrite
+PINECONE_UPSERT_BATCH = 100  # vectors per upsert request
+
+
+class Record(NamedTuple):
+    text: str
+    metadata: Dict[str, Any]
+
+
+def _payload(text: str, metadata: Dict[str, Any]) -> bytes:
+    # json.dumps escapes newlines: the first one ends the metadata
+    return (json.dumps(metadata, sort_keys=True, default=str) + "\n" + text).encode("utf-8")
+
+
+def _record(payload: bytes) -> Record:
+    metadata, _, text = payload.decode("utf-8").partition("\n")
+    return Record(text, json.loads(metadata))
+
+
+class ChunkStore:
+    def __init__(self,
+                 index_name: str = "default",
+                 path: str | Path = CHUNK_STORE_DIR,
+                 level: int = CHUNK_STORE_LEVEL,
+                 dict_samples: int = CHUNK_STORE_DICT_SAMPLES):
+        self.path = Path(path) / index_name
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.level = level
+        self.dict_samples = dict_samples
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(self.path / "index.sqlite", check_same_thread=False)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                raw_length INTEGER NOT NULL,
+                dict INTEGER NOT NULL     -- 0 = no dictionary
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                hash TEXT NOT NULL,
+                source TEXT
+            );
+            CREATE INDEX IF NOT EXISTS chunks_hash ON chunks (hash);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            INSERT OR IGNORE INTO meta VALUES ('generation', 0), ('dict', 0), ('dead_bytes', 0);
+            """
+        )
+        self.conn.commit()
+        self._map: Optional[mmap.mmap] = None
+        self._map_generation = -1
+        self._compressors: Dict[int, zstd.ZstdCompressor] = {}
+        self._decompressors: Dict[int, zstd.ZstdDecompressor] = {}
+
+    # --- files ----------------------------------------------------------------------
+
+    def _meta(self, key: str) -> int:
+        return self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+
+    def _data_path(self, generation: int) -> Path:
+        return self.path / f"chunks-{generation}.zst"
+
+    def _dictionary(self, dict_id: int) -> Optional[zstd.ZstdCompressionDict]:
+        return zstd.ZstdCompressionDict((self.path / f"dict-{dict_id}.zdict").read_bytes()) if dict_id else None
+
+    def _compressor(self, dict_id: int) -> zstd.ZstdCompressor:
+        if dict_id not in self._compressors:
+            self._compressors[dict_id] = zstd.ZstdCompressor(level=self.level, dict_data=self._dictionary(dict_id))
+        return self._compressors[dict_id]
+
+    def _decompressor(self, dict_id: int) -> zstd.ZstdDecompressor:
+        if dict_id not in self._decompressors:
+            self._decompressors[dict_id] = zstd.ZstdDecompressor(dict_data=self._dictionary(dict_id))
+        return self._decompressors[dict_id]
+
+    def _data(self, generation: int, end: int) -> mmap.mmap:
+        """The data file of `generation`, mapped up to at least `end`."""
+        if self._map is None or self._map_generation != generation or len(self._map) < end:
+            if self._map is not None:
+                self._map.close()
+            with open(self._data_path(generation), "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._map_generation = generation
+        return self._map
+
+    # --- reads ----------------------------------------------------------------------
+
+    def _records(self, ids: Sequence[str]) -> Dict[str, Record]:
+        if not ids:
+            return {}
+        rows = []
+        for i in range(0, len(ids), 500):
+            batch = list(ids[i: i + 500])
+            # one statement: the offsets and the generation they belong to are read together
+            rows += self.conn.execute(
+                f"""SELECT c.id, b.offset, b.length, b.dict, m.value
+                    FROM chunks c JOIN blobs b ON b.hash = c.hash JOIN meta m ON m.key = 'generation'
+                    WHERE c.id IN ({','.join('?' * len(batch))})""", batch).fetchall()
+        records = {}
+        for id_, offset, length, dict_id, generation in rows:
+            data = self._data(generation, offset + length)
+            records[id_] = _record(self._decompressor(dict_id).decompress(data[offset: offset + length]))
+        return records
+
+    def get_by_ids(self, ids: Sequence[str]) -> List[Document]:
+        """Stored chunks of `ids`, in that order (unknown ids are skipped)."""
+        with self.lock:
+            records = self._records(ids)
+        return [Document(id=id_, page_content=records[id_].text, metadata=records[id_].metadata)
+                for id_ in ids if id_ in records]
+
+    def hydrate(self, documents: Sequence[Document]) -> List[Document]:
+        """Fill in the text and metadata of documents returned by the vector index.
+
+        Documents the store doesn't know keep what the index returned (vectors
+        upserted before the store existed), unless that is nothing at all."""
+        with self.lock:
+            records = self._records([doc.id for doc in documents if doc.id])
+        hydrated = []
+        for doc in documents:
+            record = records.get(doc.id) if doc.id else None
+            if record is not None:
+                hydrated.append(Document(id=doc.id, page_content=record.text,
+                                         metadata={**record.metadata, **doc.metadata}))
+            elif doc.page_content:
+                hydrated.append(doc)
+        return hydrated
+
+    def sources(self, ids: Sequence[str]) -> Dict[str, str]:
+        """Source URL of every known id, from the index alone (nothing decompressed)."""
+        with self.lock:
+            return {id_: source for id_, source in self.conn.execute(
+                f"SELECT id, source FROM chunks WHERE id IN ({','.join('?' * len(ids))}) AND source IS NOT NULL",
+                list(ids))}
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Chunks, distinct records, and their raw and compressed sizes."""
+        with self.lock:
+            records, raw, stored = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(raw_length), 0), COALESCE(SUM(length), 0) FROM blobs").fetchone()
+            return {"chunks": len(self),
+                    "records": records,
+                    "raw_bytes": raw,
+                    "stored_bytes": stored,
+                    "dead_bytes": self._meta("dead_bytes"),
+                    "compression_ratio": raw / stored if stored else 0.0}
+
+    # --- writes ---------------------------------------------------------------------
+
+    def put(self, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> None:
+        """Store (or replace) the chunks of `ids`."""
+        payloads = [_payload(text, metadata) for text, metadata in zip(texts, metadatas)]
+        hashes = [hashlib.sha256(payload).hexdigest() for payload in payloads]
+        with self.lock:
+            known = set()
+            unique = list(dict.fromkeys(hashes))
+            for i in range(0, len(unique), 500):
+                batch = unique[i: i + 500]
+                known.update(hash_ for (hash_,) in self.conn.execute(
+                    f"SELECT hash FROM blobs WHERE hash IN ({','.join('?' * len(batch))})", batch))
+            new = {hash_: payload for hash_, payload in zip(hashes, payloads) if hash_ not in known}
+
+            dict_id = self._meta("dict")
+            trained = False
+            if not dict_id and self.dict_samples and self._count_blobs() + len(new) >= self.dict_samples:
+                dict_id = self._train_dictionary(list(new.values()))
+                trained = bool(dict_id)
+            generation = self._meta("generation")
+            compressor = self._compressor(dict_id)
+            rows = []
+            with open(self._data_path(generation), "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                for hash_, payload in new.items():
+                    frame = compressor.compress(payload)
+                    f.write(frame)
+                    rows.append((hash_, offset, len(frame), len(payload), dict_id))
+                    offset += len(frame)
+            # the frames are on disk before the index points at them
+            with self.conn:
+                self.conn.executemany("INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?, ?)", rows)
+                replaced = self._hashes_of(ids)
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO chunks (id, hash, source) VALUES (?, ?, ?)",
+                    [(id_, hash_, metadata.get("source")) for id_, hash_, metadata in zip(ids, hashes, metadatas)])
+                self._drop_orphans(replaced - set(hashes))
+            if trained and self._count_blobs(dict_id=0):
+                self.compact()  # recompress the records written before the dictionary
+            else:
+                self._maybe_compact()
+
+    def delete(self, ids: Sequence[str]) -> None:
+        with self.lock:
+            with self.conn:
+                hashes = self._hashes_of(ids)
+                for i in range(0, len(ids), 500):
+                    batch = list(ids[i: i + 500])
+                    self.conn.execute(f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch)
+                self._drop_orphans(hashes)
+            self._maybe_compact()
+
+    def _count_blobs(self, dict_id: Optional[int] = None) -> int:
+        if dict_id is None:
+            return self.conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+        return self.conn.execute("SELECT COUNT(*) FROM blobs WHERE dict = ?", (dict_id,)).fetchone()[0]
+
+    def _hashes_of(self, ids: Sequence[str]) -> set:
+        hashes = set()
+        for i in range(0, len(ids), 500):
+            batch = list(ids[i: i + 500])
+            hashes.update(hash_ for (hash_,) in self.conn.execute(
+                f"SELECT hash FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch))
+        return hashes
+
+    def _drop_orphans(self, hashes: Iterable[str]) -> None:
+        """Remove records no chunk refers to any more (inside the caller's transaction)."""
+        dead = 0
+        for hash_ in hashes:
+            if self.conn.execute("SELECT 1 FROM chunks WHERE hash = ? LIMIT 1", (hash_,)).fetchone():
+                continue
+            row = self.conn.execute("SELECT length FROM blobs WHERE hash = ?", (hash_,)).fetchone()
+            if row:
+                dead += row[0]
+                self.conn.execute("DELETE FROM blobs WHERE hash = ?", (hash_,))
+        if dead:
+            self.conn.execute("UPDATE meta SET value = value + ? WHERE key = 'dead_bytes'", (dead,))
+
+    def _train_dictionary(self, samples: List[bytes]) -> int:
+        samples = samples + [self._raw(offset, length, dict_id) for offset, length, dict_id in
+                             self.conn.execute("SELECT offset, length, dict FROM blobs LIMIT ?", (self.dict_samples,))]
+        try:
+            dictionary = zstd.train_dictionary(CHUNK_STORE_DICT_BYTES, samples[: 4 * self.dict_samples])
+        except zstd.ZstdError as e:
+            log_warning(f"🗜️ ChunkStore: couldn't train a compression dictionary ({e}), compressing without one")
+            self.dict_samples = 0
+            return 0
+        tmp = self.path / "dict-1.zdict.tmp"
+        tmp.write_bytes(dictionary.as_bytes())
+        tmp.replace(self.path / "dict-1.zdict")
+        with self.conn:
+            self.conn.execute("UPDATE meta SET value = 1 WHERE key = 'dict'")
+        return 1
+
+    def _raw(self, offset: int, length: int, dict_id: int) -> bytes:
+        data = self._data(self._meta("generation"), offset + length)
+        return self._decompressor(dict_id).decompress(data[offset: offset + length])
+
+    def _maybe_compact(self) -> None:
+        dead = self._meta("dead_bytes")
+        live = self.conn.execute("SELECT COALESCE(SUM(length), 0) FROM blobs").fetchone()[0]
+        if dead > max(live, COMPACT_MIN_DEAD_BYTES):
+            self.compact()
+
+    def compact(self) -> None:
+        """Rewrite the live records into the next generation's file (with the current dictionary)."""
+        with self.lock:
+            generation = self._meta("generation")
+            dict_id = self._meta("dict")
+            compressor = self._compressor(dict_id)
+            rows = []
+            path = self._data_path(generation + 1)
+            with open(path, "wb") as f:
+                offset = 0
+                for hash_, old_offset, length, old_dict in self.conn.execute(
+                        "SELECT hash, offset, length, dict FROM blobs ORDER BY offset").fetchall():
+                    data = self._data(generation, old_offset + length)
+                    frame = data[old_offset: old_offset + length]
+                    if old_dict != dict_id:
+                        frame = compressor.compress(self._decompressor(old_dict).decompress(frame))
+                    f.write(frame)
+                    rows.append((offset, len(frame), dict_id, hash_))
+                    offset += len(frame)
+            with self.conn:
+                self.conn.executemany("UPDATE blobs SET offset = ?, length = ?, dict = ? WHERE hash = ?", rows)
+                self.conn.execute("UPDATE meta SET value = ? WHERE key = 'generation'", (generation + 1,))
+                self.conn.execute("UPDATE meta SET value = 0 WHERE key = 'dead_bytes'")
+            # readers still holding the old file keep their mapping until their next lookup
+            self._data_path(generation).unlink(missing_ok=True)
+
+    def close(self) -> None:
+        with self.lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self.conn.close()
+
+
+class ChunkStoreVectorStore(VectorStore):
+    """`vectorstore` holding vectors, ids and CHUNK_STORE_METADATA; texts and full metadata live in `store`."""
+
+    def __init__(self, vectorstore: VectorStore, store: ChunkStore):
+        self.vectorstore = vectorstore
+        self.store = store
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.vectorstore.embeddings
+
+    @property
+    def ids_only(self) -> bool:
+        """Whether vectors can be upserted without their texts (local index, Pinecone)."""
+        return hasattr(self.vectorstore, "add_embeddings") or hasattr(getattr(self.vectorstore, "index", None),
+                                                                      "upsert")
+
+    @staticmethod
+    def _index_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: metadata[key] for key in CHUNK_STORE_METADATA if key in metadata}
+
+    def _prepare(self, texts: Iterable[str], metadatas: Optional[List[dict]], ids: Optional[List[str]]):
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = [id_ or str(uuid.uuid4()) for id_ in ids] if ids else [str(uuid.uuid4()) for _ in texts]
+        return texts, metadatas, ids
+
+    def _upsert(self, ids: List[str], vectors: List[List[float]], metadatas: List[dict]) -> None:
+        metadatas = [self._index_metadata(metadata) for metadata in metadatas]
+        if hasattr(self.vectorstore, "add_embeddings"):
+            self.vectorstore.add_embeddings(["" for _ in ids], vectors, metadatas, ids)
+            return
+        # Pinecone: results without the text key are skipped, so it stays, empty
+        text_key = getattr(self.vectorstore, "_text_key", "text")
+        self.vectorstore.index.upsert(vectors=[(id_, vector, {**metadata, text_key: ""})
+                                               for id_, vector, metadata in zip(ids, vectors, metadatas)],
+                                      batch_size=PINECONE_UPSERT_BATCH,
+                                      show_progress=False)
+
+    def add_texts(self,
+                  texts: Iterable[str],
+                  metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None,
+                  **kwargs: Any) -> List[str]:
+        texts, metadatas, ids = self._prepare(texts, metadatas, ids)
+        self.store.put(ids, texts, metadatas)
+        if not self.ids_only:
+            return self.vectorstore.add_texts(texts, metadatas=metadatas, ids=ids, **kwargs)
+        self._upsert(ids, self.embeddings.embed_documents(texts), metadatas)
+        return ids
+
+    async def aadd_texts(self,
+                         texts: Iterable[str],
+                         metadatas: Optional[List[dict]] = None,
+                         ids: Optional[List[str]] = None,
+                         **kwargs: Any) -> List[str]:
+        texts, metadatas, ids = self._prepare(texts, metadatas, ids)
+        await asyncio.to_thread(self.store.put, ids, texts, metadatas)
+        if not self.ids_only:
+            return await self.vectorstore.aadd_texts(texts, metadatas=metadatas, ids=ids, **kwargs)
+        vectors = await self.embeddings.aembed_documents(texts)
+        await asyncio.to_thread(self._upsert, ids, vectors, metadatas)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        result = self.vectorstore.delete(ids=ids, **kwargs)
+        if ids:
+            self.store.delete(ids)
+        return result
+
+    async def adelete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        result = await self.vectorstore.adelete(ids=ids, **kwargs)
+        if ids:
+            await asyncio.to_thread(self.store.delete, ids)
+        return result
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        return self.store.get_by_ids(ids)
+
+    # --- search: the index finds ids, the store fills them in -----------------------
+
+    def _hydrate_scored(self, results: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+        scores = {doc.id: score for doc, score in results}
+        return [(doc, scores[doc.id]) for doc in self.store.hydrate([doc for doc, _ in results])]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.store.hydrate(self.vectorstore.similarity_search(query, k=k, **kwargs))
+
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.store.hydrate(await self.vectorstore.asimilarity_search(query, k=k, **kwargs))
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self._hydrate_scored(self.vectorstore.similarity_search_with_score(query, k=k, **kwargs))
+
+    async def asimilarity_search_with_score(self, query: str, k: int = 4,
+                                            **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self._hydrate_scored(await self.vectorstore.asimilarity_search_with_score(query, k=k, **kwargs))
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.store.hydrate(self.vectorstore.similarity_search_by_vector(embedding, k=k, **kwargs))
+
+    async def asimilarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                           **kwargs: Any) -> List[Document]:
+        return self.store.hydrate(await self.vectorstore.asimilarity_search_by_vector(embedding, k=k, **kwargs))
+
+    def _select_relevance_score_fn(self):
+        return self.vectorstore._select_relevance_score_fn()
+
+    async def __aenter__(self):
+        # keep the wrapped store's async session open (see ingestion2.vectorstore_session)
+        if hasattr(self.vectorstore, "__aenter__"):
+            await self.vectorstore.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if hasattr(self.vectorstore, "__aexit__"):
+            await self.vectorstore.__aexit__(*exc_info)
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, index_name: str = "default",
+                   **kwargs: Any) -> "ChunkStoreVectorStore":
+        """Texts added to the configured backend (`backend=` overrides it) wrapped with a chunk store."""
+        from vectorstores import get_vectorstore
+
+        store = get_vectorstore(index_name, embedding, chunk_store=True, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
@@ -0,0 +1,202 @@
+"""Token-targeted, structure-aware text splitter.
+
+RecursiveCharacterTextSplitter cuts by characters, so chunk sizes in tokens
+(what the embeddings API and the answer prompt are limited by) vary a lot,
+and a code block or a section can be cut anywhere. TokenChunker instead:
+
+  1. encodes each page once with tiktoken (a whole batch of pages at a time)
+     and maps every token to its byte offset with a vocabulary-wide lookup
+     table, so the token count of any span is a subtraction;
+  2. finds candidate cut points with numpy over the page bytes: every line
+     start, ranked  heading (markdown `#`, html `<h1>`..`<h6>`, sphinx `¶`)
+     > block (unindented line, i.e. not inside an indented code block)
+     > line; inside fenced code blocks every cut point is ranked as a line;
+  3. packs greedily: each chunk takes up to `chunk_size` tokens and ends at
+     the best-ranked cut point in the second half of that window (the last
+     one of that rank), or at a line break if there is none. Only a single
+     line longer than `chunk_size` is cut between two tokens.
+
+Overlap is whole lines, up to `chunk_overlap` tokens, taken from the end of
+the previous chunk (starting at a block boundary when there is one).
+
+CHUNKER=tokens     TokenChunker, sizes in tokens of CHUNK_ENCODING (default)
+CHUNKER=recursive  RecursiveCharacterTextSplitter, sizes in characters
+
+When the CHUNK_ENCODING vocabulary can't be loaded (tiktoken downloads it on
+first use, and an air-gapped host can't), text_splitter() falls back to
+RecursiveCharacterTextSplitter with a warning.
+"""
+import os
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import tiktoken
+from langchain.text_splitter import RecursiveCharacterTextSplitter, TextSplitter
+from langchain_core.documents import Document
+
+from logger import log_warning
+
+CHUNKER = os.getenv("CHUNKER", "tokens")
+CHUNK_ENCODING = os.getenv("CHUNK_ENCODING", "cl100k_base")  # tokenizer of text-embedding-3-*
+ENCODE_THREADS = min(8, os.cpu_count() or 1)
+
+LINE, BLOCK, HEADING = 0, 1, 2
+NEWLINE, SPACE, TAB, HASH, BACKTICK, TILDE = b"\n \t#`~"
+SPHINX_HEADING_RE = re.compile(rb"\xc2\xb6[ \t]*(?=\n|$)")  # "¶" at the end of a line
+HTML_HEADING_RE = re.compile(rb"(?<=\n)<h[1-6][\s>]", re.IGNORECASE)
+
+_token_bytes: Dict[str, np.ndarray] = {}
+_token_bytes_lock = threading.Lock()
+_encoding_error: Optional[Exception] = None  # why CHUNK_ENCODING couldn't be loaded, if it couldn't
+
+
+def encoding() -> tiktoken.Encoding:
+    return tiktoken.get_encoding(CHUNK_ENCODING)
+
+
+def token_byte_lengths(encoding: tiktoken.Encoding) -> np.ndarray:
+    """Length in bytes of every token of the vocabulary (0 for unused ids)."""
+    with _token_bytes_lock:
+        if encoding.name not in _token_bytes:
+            lengths = np.zeros(encoding.n_vocab, dtype=np.int64)
+            for token in range(encoding.n_vocab):
+                try:
+                    lengths[token] = len(encoding.decode_single_token_bytes(token))
+                except KeyError:
+                    pass
+            _token_bytes[encoding.name] = lengths
+        return _token_bytes[encoding.name]
+
+
+def cut_points(data: bytes) -> tuple[np.ndarray, np.ndarray]:
+    """Byte offsets of all line starts (after the first line) and their rank."""
+    page = np.frombuffer(data, dtype=np.uint8)
+    starts = np.flatnonzero(page[:-1] == NEWLINE) + 1
+    following = page[starts]
+    ranks = np.where((following == SPACE) | (following == TAB) | (following == NEWLINE), LINE, BLOCK).astype(np.int8)
+
+    ranks[following == HASH] = HEADING
+    if HTML_HEADING_RE.search(data):
+        ranks[np.searchsorted(starts, [m.start() for m in HTML_HEADING_RE.finditer(data)])] = HEADING
+    sphinx = [m.start() for m in SPHINX_HEADING_RE.finditer(data)]
+    if sphinx:
+        # the heading is the line holding the "¶": cut right before that line
+        lines = np.searchsorted(starts, sphinx, side="right") - 1
+        ranks[lines[lines >= 0]] = HEADING
+
+    # fenced code blocks: no headings / blocks between an opening and a closing fence
+    fenced = np.zeros(len(starts), dtype=bool)
+    tail = np.minimum(starts + 2, len(page) - 1)
+    for mark in (BACKTICK, TILDE):
+        fenced |= (following == mark) & (page[np.minimum(starts + 1, len(page) - 1)] == mark) & (page[tail] == mark)
+    if fenced.any():
+        inside = (np.cumsum(fenced) - fenced) % 2 == 1  # an odd number of fences opened before this line
+        ranks[inside] = LINE
+    return starts, ranks
+
+
+class TokenChunker(TextSplitter):
+    """Split into chunks of at most `chunk_size` tokens, at structural boundaries."""
+
+    def __init__(self, chunk_size: int = 500, chunk_overlap: int = 50,
+                 encoding: Optional[tiktoken.Encoding] = None, **kwargs: Any):
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap, **kwargs)
+        self._encoding = encoding
+
+    @property
+    def encoding(self) -> tiktoken.Encoding:
+        if self._encoding is None:
+            self._encoding = encoding()
+        return self._encoding
+
+    def split_text(self, text: str) -> List[str]:
+        return self._split(text, self.encoding.encode_ordinary(text))
+
+    def split_texts(self, texts: List[str]) -> List[List[str]]:
+        """Chunks of every text, encoding all of them in one batch."""
+        if ENCODE_THREADS > 1 and len(texts) > 1:
+            batch = self.encoding.encode_ordinary_batch(texts, num_threads=ENCODE_THREADS)
+        else:  # a thread pool only adds overhead on a single core
+            batch = map(self.encoding.encode_ordinary, texts)
+        return [self._split(text, tokens) for text, tokens in zip(texts, batch)]
+
+    def create_documents(self, texts: List[str], metadatas: Optional[List[dict]] = None) -> List[Document]:
+        metadatas = metadatas or [{}] * len(texts)
+        return [Document(page_content=chunk, metadata=dict(metadata))
+                for chunks, metadata in zip(self.split_texts(texts), metadatas)
+                for chunk in chunks]
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        documents = list(documents)
+        return self.create_documents([doc.page_content for doc in documents],
+                                     [doc.metadata for doc in documents])
+
+    def _split(self, text: str, tokens: List[int]) -> List[str]:
+        if not tokens:
+            return []
+        data = text.encode("utf-8")
+        # ends[i] = byte offset right after token i
+        ends = np.cumsum(token_byte_lengths(self.encoding)[np.asarray(tokens)])
+        starts, ranks = cut_points(data)
+        # token index of every cut point (a token straddling it goes to the later side)
+        cuts = np.searchsorted(ends, starts, side="right")
+        n_tokens = len(tokens)
+        size, overlap = self._chunk_size, self._chunk_overlap
+
+        chunks = []
+        start = 0
+        while start < n_tokens:
+            end = start + size
+            if end >= n_tokens:
+                end = n_tokens
+            else:
+                lo = np.searchsorted(cuts, start + size // 2, side="left")
+                hi = np.searchsorted(cuts, end, side="right")
+                if hi > lo:
+                    # last cut point of the best rank in the second half of the window
+                    window = ranks[lo:hi]
+                    end = int(cuts[lo + np.flatnonzero(window == window.max())[-1]])
+                else:
+                    lo = np.searchsorted(cuts, start, side="right")
+                    if hi > lo:  # first half only: still better than cutting a line
+                        end = int(cuts[hi - 1])
+            # a cut between two tokens may fall inside a multi-byte character
+            chunk = data[ends[start - 1] if start else 0: ends[end - 1]].decode("utf-8", errors="ignore")
+            if self._strip_whitespace:
+                chunk = chunk.strip()
+            if chunk:
+                chunks.append(chunk)
+            if end >= n_tokens:
+                break
+            # overlap: the lines of the last `overlap` tokens, without going back past this chunk's start,
+            # from the first block boundary among them if there is one
+            next_start = end
+            if overlap:
+                lo = np.searchsorted(cuts, max(end - overlap, start + 1), side="left")
+                hi = np.searchsorted(cuts, end, side="left")
+                if hi > lo:
+                    blocks = np.flatnonzero(ranks[lo:hi] >= BLOCK)
+                    next_start = int(cuts[lo + (blocks[0] if len(blocks) else 0)])
+            start = next_start
+        return chunks
+
+
+def text_splitter(chunk_tokens: int, chunk_overlap_tokens: int,
+                  chunk_chars: int, chunk_overlap_chars: int) -> TextSplitter:
+    """The splitter selected by CHUNKER, with sizes in tokens or characters accordingly."""
+    global _encoding_error
+    if CHUNKER != "recursive" and _encoding_error is None:
+        try:
+            return TokenChunker(chunk_size=chunk_tokens, chunk_overlap=chunk_overlap_tokens, encoding=encoding())
+        except Exception as e:
+            _encoding_error = e
+            log_warning(f"✂️ Chunker: couldn't load the {CHUNK_ENCODING} encoding ({e.__class__.__name__}), "
+                        f"splitting by characters instead")
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_chars, chunk_overlap=chunk_overlap_chars)
+
+
+def describe(splitter: TextSplitter) -> str:
+    unit = "token" if isinstance(splitter, TokenChunker) else "character"
+    return f"{splitter._chunk_size}-{unit} chunks with {splitter._chunk_overlap}-{unit} overlap"
@@ -0,0 +1,219 @@
+"""Near-duplicate elimination before embedding (MinHash + LSH).
+
+TavilyMap returns versioned and boilerplate-heavy pages, and the ReadTheDocs
+tree repeats its navigation text; embedding them again adds cost, not
+recall. During a run, every page (between extraction and chunking) and every
+chunk (after chunking) is checked against the ones seen before it, and
+dropped if the Jaccard similarity of their word 3-gram sets is at least
+INGEST_DEDUP_THRESHOLD.
+
+  signature    NUM_PERM min-hashes of the 3-gram hashes, computed with numpy
+               for a whole batch of texts at once
+  LSH          the signature is cut into bands; texts sharing a band hash
+               are candidates (bands x rows picked so that 95% of the pairs
+               at the threshold are)
+  check        candidates are confirmed on an 8-bit fingerprint of every
+               min-hash (b-bit MinHash), which is all that is kept per text
+
+An indexed text costs NUM_PERM bytes + 12 bytes per band (about 250 bytes at
+the default threshold) in flat numpy arrays, with no Python object per text,
+so hundreds of thousands of chunks fit in tens of MB. Hashes are Python's string hashes: signatures are
+only comparable within one process, i.e. one run.
+
+A page whose content was dropped is recorded as such in the manifest and
+planned again on the next run, since the text it duplicated may have changed
+or been removed by then (see manifest.py).
+
+INGEST_DEDUP=pages,chunks  stages to run (empty: off)
+"""
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEDUP_STAGES = [stage for stage in os.getenv("INGEST_DEDUP", "pages,chunks").split(",") if stage]
+DEDUP_THRESHOLD = float(os.getenv("INGEST_DEDUP_THRESHOLD", "0.9"))
+NUM_PERM = 128
+SHINGLE_SIZE = 3
+FINGERPRINT_BITS = 8
+BLOCK_SHINGLES = 8192  # shingles hashed at a time, bounds the (shingles x NUM_PERM) temporaries
+RECENT_KEYS = 16384  # unsorted band hashes searched linearly before they are merged into the sorted run
+
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+@lru_cache(maxsize=None)
+def lsh_params(threshold: float, num_perm: int = NUM_PERM, recall: float = 0.95) -> Tuple[int, int]:
+    """(bands, rows) with the fewest candidates below `threshold` among those that
+    still find pairs at `threshold` with probability `recall`.
+
+    Candidates are confirmed on their fingerprints, so a false positive only
+    costs a comparison, while a false negative is an embedding we pay for."""
+    s = np.linspace(0, threshold, 200)
+    best, best_fp = (num_perm, 1), float("inf")
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        if 1 - (1 - threshold ** rows) ** bands < recall:
+            continue
+        false_positives = (1 - (1 - s ** rows) ** bands).mean()  # candidate probability below the threshold
+        if false_positives < best_fp:
+            best, best_fp = (bands, rows), false_positives
+    return best
+
+
+def shingle_hashes(text: str) -> np.ndarray:
+    """uint64 hashes of the word 3-grams of `text` (the whole text if it is shorter)."""
+    words = text.lower().split()
+    if len(words) < SHINGLE_SIZE:
+        return np.array([hash(" ".join(words))], dtype=np.int64).view(np.uint64)
+    h = np.array([hash(word) for word in words], dtype=np.int64).view(np.uint64)
+    shingles = h[: len(h) - SHINGLE_SIZE + 1].copy()
+    for offset in range(1, SHINGLE_SIZE):
+        shingles = shingles * _MIX + h[offset: len(h) - SHINGLE_SIZE + 1 + offset]
+    return shingles
+
+
+class NearDuplicateIndex:
+    """Texts added so far, to tell whether a new text is a near-duplicate of one of them."""
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, num_perm: int = NUM_PERM, seed: int = 0):
+        self.threshold = threshold
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        rng = np.random.default_rng(seed)
+        # permutations of the 32-bit hashes: x -> a * x + b (odd a), then an xorshift to mix the low bits
+        self.a = rng.integers(0, 2 ** 32, num_perm, dtype=np.uint32)[:, None] | np.uint32(1)
+        self.b = rng.integers(0, 2 ** 32, num_perm, dtype=np.uint32)[:, None]
+        self.band_salts = rng.integers(0, 2 ** 63, self.bands, dtype=np.uint64)
+        self.fingerprints = np.zeros((1024, num_perm), dtype=np.uint8)
+        self.size = 0
+        # band hash -> text number: one sorted run + recently added, unsorted ones
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.key_items = np.zeros(0, dtype=np.int32)
+        self.recent_keys = np.zeros(0, dtype=np.uint64)
+        self.recent_items = np.zeros(0, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def signatures(self, texts: Sequence[str]) -> np.ndarray:
+        """(len(texts), num_perm) uint32 min-hashes."""
+        hashes = [shingle_hashes(text) for text in texts]
+        offsets = np.cumsum([0] + [len(h) for h in hashes])
+        shingles = np.concatenate(hashes)
+        shingles = (shingles ^ (shingles >> np.uint64(32))).astype(np.uint32)
+        signatures = np.full((len(texts), len(self.a)), np.iinfo(np.uint32).max, dtype=np.uint32)
+        # a block of shingles at a time, wherever the texts start and end;
+        # (num_perm, shingles) layout, so every min runs over contiguous memory
+        for start in range(0, len(shingles), BLOCK_SHINGLES):
+            end = min(start + BLOCK_SHINGLES, len(shingles))
+            segments = np.r_[start, offsets[(offsets > start) & (offsets < end)]]
+            owners = np.searchsorted(offsets, start, side="right") - 1 + np.arange(len(segments))
+            permuted = self.a * shingles[start:end] + self.b
+            permuted ^= permuted >> np.uint32(15)
+            minima = np.minimum.reduceat(permuted, segments - start, axis=1).T
+            signatures[owners] = np.minimum(signatures[owners], minima)
+        return signatures
+
+    def band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """(n, bands) uint64 hash of every band of every signature."""
+        bands = signatures[:, : self.bands * self.rows].reshape(len(signatures), self.bands, self.rows)
+        keys = np.zeros((len(signatures), self.bands), dtype=np.uint64) + self.band_salts
+        for row in range(self.rows):
+            keys = keys * _MIX + bands[:, :, row].astype(np.uint64)
+        return keys
+
+    def similarity(self, fingerprint: np.ndarray, items: np.ndarray) -> np.ndarray:
+        """Jaccard similarity estimated from b-bit fingerprints (corrected for chance matches)."""
+        matches = (self.fingerprints[items] == fingerprint).mean(axis=1)
+        chance = 2.0 ** -FINGERPRINT_BITS
+        return (matches - chance) / (1 - chance)
+
+    def _candidates(self, keys: np.ndarray) -> List[np.ndarray]:
+        """Indexed texts sharing at least one band hash with each row of `keys`."""
+        left = np.searchsorted(self.keys, keys, side="left")
+        right = np.searchsorted(self.keys, keys, side="right")
+        recent = np.isin(keys, self.recent_keys) if len(self.recent_keys) else np.zeros(keys.shape, dtype=bool)
+        candidates = []
+        for i in range(len(keys)):
+            found = [self.key_items[l:r] for l, r in zip(left[i], right[i]) if r > l]
+            found += [self.recent_items[self.recent_keys == key] for key in keys[i][recent[i]]]
+            candidates.append(np.unique(np.concatenate(found)) if found else np.zeros(0, dtype=np.int32))
+        return candidates
+
+    def add(self, texts: Sequence[str], keep: Optional[Sequence[bool]] = None) -> List[bool]:
+        """Check `texts` in order against the indexed ones (and each other).
+
+        Returns, for each text, whether it is a near-duplicate; the others are
+        indexed. Texts with `keep` set are indexed in any case (e.g. already
+        embedded ones, that later texts may duplicate)."""
+        if not texts:
+            return []
+        signatures = self.signatures(texts)
+        fingerprints = (signatures & np.uint32(2 ** FINGERPRINT_BITS - 1)).astype(np.uint8)
+        keys = self.band_keys(signatures)
+        candidates = self._candidates(keys)
+
+        # texts of this batch sharing a band hash with an earlier text of the batch
+        earlier: Dict[int, set] = {}
+        for band in range(self.bands):
+            order = np.argsort(keys[:, band], kind="stable")
+            sorted_keys = keys[order, band]
+            same = np.flatnonzero(sorted_keys[1:] == sorted_keys[:-1]) + 1
+            for k in same:  # order[k] shares the band with everything before it in its group
+                first = k
+                while first > 0 and sorted_keys[first - 1] == sorted_keys[k]:
+                    first -= 1
+                earlier.setdefault(int(order[k]), set()).update(int(g) for g in order[first:k])
+
+        duplicate = []
+        batch_items = {}  # position in `texts` -> text number, for texts indexed so far
+        for i in range(len(texts)):
+            near = candidates[i]
+            if i in earlier:
+                near = np.concatenate([near, [batch_items[j] for j in earlier[i] if j in batch_items]]).astype(np.int32)
+            is_duplicate = len(near) > 0 and bool((self.similarity(fingerprints[i], near) >= self.threshold).any())
+            duplicate.append(is_duplicate and not (keep is not None and keep[i]))
+            if not duplicate[-1]:
+                batch_items[i] = self._store(fingerprints[i])
+
+        added = np.array(sorted(batch_items), dtype=np.int64)
+        if len(added):
+            self.recent_keys = np.concatenate([self.recent_keys, keys[added].ravel()])
+            self.recent_items = np.concatenate([self.recent_items,
+                                                np.repeat([batch_items[i] for i in added], self.bands).astype(np.int32)])
+            if len(self.recent_keys) > RECENT_KEYS:
+                self._merge()
+        return duplicate
+
+    def _store(self, fingerprint: np.ndarray) -> int:
+        if self.size == len(self.fingerprints):
+            self.fingerprints = np.concatenate([self.fingerprints, np.zeros_like(self.fingerprints)])
+        self.fingerprints[self.size] = fingerprint
+        self.size += 1
+        return self.size - 1
+
+    def _merge(self) -> None:
+        # insert the (few) recent keys into the sorted run: a copy, not a sort of everything
+        order = np.argsort(self.recent_keys, kind="stable")
+        positions = np.searchsorted(self.keys, self.recent_keys[order], side="right")
+        self.keys = np.insert(self.keys, positions, self.recent_keys[order])
+        self.key_items = np.insert(self.key_items, positions, self.recent_items[order])
+        self.recent_keys = np.zeros(0, dtype=np.uint64)
+        self.recent_items = np.zeros(0, dtype=np.int32)
+
+    def nbytes(self) -> int:
+        return (self.size * self.fingerprints.shape[1] + self.keys.nbytes + self.key_items.nbytes
+                + self.recent_keys.nbytes + self.recent_items.nbytes)
+
+
+class Deduplicator:
+    """The page and chunk indexes of one run (only for the stages in `stages`)."""
+
+    def __init__(self, stages: Sequence[str] = tuple(DEDUP_STAGES), threshold: float = DEDUP_THRESHOLD):
+        self.indexes = {stage: NearDuplicateIndex(threshold) for stage in stages}
+
+    def duplicates(self, stage: str, texts: Sequence[str], keep: Optional[Sequence[bool]] = None) -> List[bool]:
+        if stage not in self.indexes:
+            return [False] * len(texts)
+        return self.indexes[stage].add(texts, keep)
@@ -0,0 +1,89 @@
+"""Parse and split the local ReadTheDocs mirror (langchain-docs/) in a process pool.
+
+Kept apart from ingestion.py, which builds the OpenAI and vector store
+clients: the pool's workers import this module only (spawn platforms
+re-import it in every worker), so they open no cache and need no API key.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterator, List
+
+from bs4 import BeautifulSoup, Comment, NavigableString, Tag
+from langchain_core.documents import Document
+
+from chunker import text_splitter as make_text_splitter
+from frontier import clean_source
+
+DOCS_PATH = "langchain-docs/api.python.langchain.com/en/latest"
+
+# HTML parsing + splitting is fanned out over this many processes
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", str(os.cpu_count() or 1)))
+FILES_PER_TASK = 8  # html files parsed per process pool task
+
+# same extraction as ReadTheDocsLoader: the main content, without code/binary elements
+MAIN_TAGS = [("main", {"id": "main-content"}), ("div", {"role": "main"})]
+SKIPPED_TAGS = {"script", "noscript", "canvas", "meta", "svg", "map", "area", "audio", "source", "track",
+                "video", "embed", "object", "param", "picture", "iframe", "frame", "frameset", "noframes",
+                "applet", "form", "button", "select", "base", "style", "img"}
+NEWLINE_TAGS = {"p", "div", "ul", "ol", "li", "h1", "h2", "h3", "h4", "h5", "h6", "pre", "table", "tr"}
+
+
+def _text(element) -> str:
+    if isinstance(element, Comment) or getattr(element, "name", None) in SKIPPED_TAGS:
+        return ""
+    if isinstance(element, NavigableString):
+        return str(element)
+    if element.name == "br":
+        return "\n"
+    text = "".join(_text(child) for child in element.children
+                   if isinstance(child, (Tag, NavigableString)))
+    return text + "\n" if element.name in NEWLINE_TAGS else text
+
+
+def clean_html(html: str) -> str:
+    """Text of the main content of a ReadTheDocs page, newlines kept, empty lines dropped."""
+    soup = BeautifulSoup(html, "html.parser")
+    for tag, attrs in MAIN_TAGS:
+        element = soup.find(tag, attrs)
+        if element is not None:
+            return "\n".join(line for line in _text(element).strip().split("\n") if line)
+    return ""
+
+
+def load_and_split_files(paths: List[str]) -> List[Document]:
+    """Parse and chunk a few html files (runs in a worker process)."""
+    raw_documents = [
+        Document(page_content=clean_html(Path(path).read_text(encoding="utf-8")), metadata={"source": path})
+        for path in paths
+    ]
+
+    # ~150 tokens is what the 600 character chunks used to average
+    text_splitter = make_text_splitter(150, 15, 600, 50)
+    documents = text_splitter.split_documents(raw_documents)
+
+    for doc in documents:
+        doc.metadata.update({"source": clean_source(doc.metadata["source"])})
+    return documents
+
+
+def load_and_split_parallel(
+    path: str = DOCS_PATH, workers: int = INGESTION_WORKERS
+) -> Iterator[List[Document]]:
+    """Parse and chunk every html file under `path` in a process pool.
+
+    Yields the chunks of each group of files as soon as that group is done."""
+    # same files ReadTheDocsLoader would pick up
+    paths = sorted(
+        str(p)
+        for pattern in ("*.htm", "*.html")
+        for p in Path(path).rglob(pattern)
+        if not p.is_dir()
+    )
+    tasks = [paths[i : i + FILES_PER_TASK] for i in range(0, len(paths), FILES_PER_TASK)]
+    print(f"parsing {len(paths)} files with {workers} processes")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(load_and_split_files, task) for task in tasks]
+        for future in as_completed(futures):
+            yield future.result()
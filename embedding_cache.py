@@ -0,0 +1,270 @@
+"""Persistent local cache of embeddings, keyed by (model, sha256(text)).
+
+Vectors live in a memory-mapped float32 matrix (one row per cached text) and
+an SQLite index maps each text hash to its row and last use. Once the cache
+holds `max_entries` vectors, the least recently used rows are overwritten.
+
+CachedEmbeddings wraps any LangChain embeddings object, so re-ingested chunks
+and repeated user queries are only sent to the embeddings API once.
+"""
+import asyncio
+import hashlib
+import mmap
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", str(Path(__file__).resolve().parent / ".cache" / "embeddings"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+FLOAT32_BYTES = 4
+MIN_GROWTH = 1024  # rows added to the matrix file at a time (at least)
+SQLITE_MAX_VARIABLES = 500
+
+
+def text_hash(text: str) -> str:
+    """sha256 of a text, hex encoded."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Embeddings of one model: <path>/<model>/vectors.f32 + <path>/<model>/index.sqlite."""
+
+    def __init__(self,
+                 path: str | Path,
+                 model: str,
+                 max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.model = model
+        self.max_entries = max_entries
+        self.dir = Path(path) / re.sub(r"[^\w.-]", "_", model)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.dir / "vectors.f32"
+        self.vectors_path.touch(exist_ok=True)
+
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(self.dir / "index.sqlite", check_same_thread=False)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                slot INTEGER NOT NULL UNIQUE,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+            CREATE TABLE IF NOT EXISTS meta (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        self.dim: Optional[int] = int(row[0]) if row else None
+        self.mm: Optional[mmap.mmap] = None
+
+        self.hits = 0
+        self.misses = 0
+
+    # --- matrix file ---------------------------------------------------------
+
+    def _row_bytes(self) -> int:
+        return self.dim * FLOAT32_BYTES
+
+    def _mapped_rows(self) -> int:
+        return len(self.mm) // self._row_bytes() if self.mm is not None else 0
+
+    def _remap(self) -> None:
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        if self.vectors_path.stat().st_size > 0:
+            with self.vectors_path.open("r+b") as f:
+                self.mm = mmap.mmap(f.fileno(), 0)
+
+    def _ensure_rows(self, n_rows: int) -> None:
+        """Make the matrix file at least `n_rows` rows long (grows geometrically)."""
+        if n_rows <= self._mapped_rows():
+            return
+        # another process may have grown the file already
+        self._remap()
+        if n_rows <= self._mapped_rows():
+            return
+        rows = min(self.max_entries, max(n_rows, 2 * self._mapped_rows(), MIN_GROWTH))
+        with self.vectors_path.open("r+b") as f:
+            f.truncate(rows * self._row_bytes())
+        self._remap()
+
+    def _read_row(self, slot: int) -> List[float]:
+        self._ensure_rows(slot + 1)
+        start = slot * self._row_bytes()
+        return array("f", self.mm[start: start + self._row_bytes()]).tolist()
+
+    def _write_row(self, slot: int, vector: Sequence[float]) -> None:
+        start = slot * self._row_bytes()
+        self.mm[start: start + self._row_bytes()] = array("f", vector).tobytes()
+
+    # --- lookups ---------------------------------------------------------------
+
+    def _slots(self, keys: Sequence[str]) -> Dict[str, int]:
+        """Map key -> slot for the keys that are cached."""
+        slots: Dict[str, int] = {}
+        for i in range(0, len(keys), SQLITE_MAX_VARIABLES):
+            batch = keys[i: i + SQLITE_MAX_VARIABLES]
+            rows = self.conn.execute(
+                f"SELECT key, slot FROM entries WHERE key IN ({','.join('?' * len(batch))})",
+                batch,
+            )
+            slots.update(rows.fetchall())
+        return slots
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Cached vector of each text, None where the text is not cached."""
+        keys = [text_hash(text) for text in texts]
+        with self.lock:
+            slots = self._slots(list(dict.fromkeys(keys)))
+            if slots:
+                now = time.time()
+                with self.conn:
+                    self.conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                          [(now, key) for key in slots])
+            vectors = [self._read_row(slots[key]) if key in slots else None for key in keys]
+
+            hits = sum(1 for vector in vectors if vector is not None)
+            self.hits += hits
+            self.misses += len(vectors) - hits
+        return vectors
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """Store vectors, evicting the least recently used ones past `max_entries`."""
+        new = {text_hash(text): vector for text, vector in zip(texts, vectors)}
+        # more new vectors than the cache can hold: keep the last ones
+        new = dict(list(new.items())[-self.max_entries:])
+        if not new:
+            return
+
+        with self.lock, self.conn:
+            if self.dim is None:
+                self.dim = len(next(iter(new.values())))
+                self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('dim', ?)",
+                                  (str(self.dim),))
+
+            # texts cached in the meantime (e.g. by another thread) keep their row
+            slots = self._slots(list(new))
+            to_insert = [key for key in new if key not in slots]
+
+            next_slot = self.conn.execute(
+                "SELECT COALESCE(MAX(slot) + 1, 0) FROM entries"
+            ).fetchone()[0]
+            n_fresh = max(0, min(len(to_insert), self.max_entries - next_slot))
+            free_slots = list(range(next_slot, next_slot + n_fresh))
+
+            # full: reuse the rows of the least recently used entries
+            n_evict = len(to_insert) - n_fresh
+            if n_evict:
+                candidates = self.conn.execute(
+                    "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?",
+                    (n_evict + len(slots),),
+                ).fetchall()
+                evicted = [(key, slot) for key, slot in candidates if key not in slots][:n_evict]
+                self.conn.executemany("DELETE FROM entries WHERE key = ?",
+                                      [(key,) for key, _ in evicted])
+                free_slots += [slot for _, slot in evicted]
+            slots.update(zip(to_insert, free_slots))
+
+            self._ensure_rows(max(slots.values()) + 1)
+            for key, slot in slots.items():
+                self._write_row(slot, new[key])
+            self.mm.flush()
+
+            now = time.time()
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                [(key, slot, now) for key, slot in slots.items()],
+            )
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries}
+
+    def close(self) -> None:
+        with self.lock:
+            if self.mm is not None:
+                self.mm.close()
+                self.mm = None
+            self.conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings that look texts up in an EmbeddingCache before calling the wrapped model.
+
+    Only the texts that miss are sent to the wrapped embeddings (deduplicated),
+    so the cache is transparent to vectorstores and retrievers."""
+
+    def __init__(self,
+                 embeddings: Embeddings,
+                 cache: Optional[EmbeddingCache] = None,
+                 model: Optional[str] = None):
+        self.embeddings = embeddings
+        model = model or getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.cache = cache or EmbeddingCache(EMBEDDING_CACHE_DIR, model)
+
+    def _missing(self, texts: List[str], vectors: List[Optional[List[float]]]) -> List[str]:
+        return list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+
+    def _merge(self,
+               texts: List[str],
+               vectors: List[Optional[List[float]]],
+               missing: List[str],
+               embedded: List[List[float]]) -> List[List[float]]:
+        by_text = dict(zip(missing, embedded))
+        return [vector if vector is not None else by_text[text]
+                for text, vector in zip(texts, vectors)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.cache.get_many(texts)
+        missing = self._missing(texts, vectors)
+        if not missing:
+            return vectors
+        embedded = self.embeddings.embed_documents(missing)
+        self.cache.put_many(missing, embedded)
+        return self._merge(texts, vectors, missing, embedded)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get_many([text])[0]
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put_many([text], [vector])
+        return vector
+
+    # the cache's SQLite / mmap I/O runs in a worker thread, off the event loop
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = await asyncio.to_thread(self.cache.get_many, texts)
+        missing = self._missing(texts, vectors)
+        if not missing:
+            return vectors
+        embedded = await self.embeddings.aembed_documents(missing)
+        await asyncio.to_thread(self.cache.put_many, missing, embedded)
+        return self._merge(texts, vectors, missing, embedded)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vector = (await asyncio.to_thread(self.cache.get_many, [text]))[0]
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            await asyncio.to_thread(self.cache.put_many, [text], [vector])
+        return vector
+
+    def stats(self) -> Dict[str, float]:
+        """Cache hits / misses so far (every hit is a text we didn't pay to embed)."""
+        return self.cache.stats()
@@ -0,0 +1,274 @@
+"""Sharded site discovery feeding a persistent, deduplicating URL frontier.
+
+A single TavilyMap call stops after `limit` URLs, so a large site used to be
+silently truncated. Discovery now maps the site root first; if the call came
+back full, the site is split into shards, one per sub-path seen in the
+results (/docs/how_to/, /docs/integrations/, ...), which are mapped
+concurrently and split again while they come back full. The rest of a split
+shard (its own pages, and sub-paths the full call never got to) is then
+mapped once more without the sub-paths already done, until that call isn't
+full either. At most INGEST_MAX_SHARDS map calls are made. A shard that is
+still full and can't be split, or a map call that failed, leaves discovery
+incomplete, which is logged, and stale pages are then not deleted (their
+absence from the map proves nothing).
+
+Every discovered URL goes through the frontier:
+
+  canonical   clean_source (local mirror paths -> https URLs), lowercase
+              host, no fragment, default port, tracking parameters, index.html
+              or trailing slash
+  rules       same host as the site, INGEST_INCLUDE_PATHS / INGEST_EXCLUDE_PATHS
+              (comma-separated regexes searched in the URL path)
+  dedup       each canonical URL is kept once
+
+and is handed out in extract batches as soon as a batch is full, so
+extraction starts while the rest of the site is still being mapped. The
+frontier is an SQLite file in the run's checkpoint directory: a resumed run
+skips the shards already mapped and hands out its batches again with the
+same numbers and URLs (see checkpoint.py).
+"""
+import asyncio
+import os
+import re
+import sqlite3
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+INGEST_MAX_SHARDS = int(os.getenv("INGEST_MAX_SHARDS", "256"))  # map calls per discovery, at most
+INGEST_INCLUDE_PATHS = [p for p in os.getenv("INGEST_INCLUDE_PATHS", "").split(",") if p]
+INGEST_EXCLUDE_PATHS = [p for p in os.getenv("INGEST_EXCLUDE_PATHS", "").split(",") if p]
+
+# click / campaign trackers only: parameters like ?ref= or ?source= select content on some sites
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|gclid|dclid|fbclid|msclkid|mc_cid|mc_eid|_ga)$")
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def clean_source(source: str) -> str:
+    """Turn a local mirror path into the canonical https URL of the page."""
+    new_url = source
+
+    # convert Windows-style backlashes to forward slashed
+    new_url = new_url.replace("\\", "/")
+    new_url = new_url.replace("langchain-docs/", "")
+
+    # remove all protocol prefixes first
+    new_url = new_url.replace("https://", "").replace("http://", "")
+
+    # add single clean https:// prefix
+    return "https://" + new_url.lstrip("/")
+
+
+def canonical_url(url: str) -> str:
+    """One spelling per page, so the same page found by two shards is extracted once."""
+    parts = urlsplit(clean_source(url.strip()))
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(parts.scheme):
+        host = f"{host}:{parts.port}"
+    path = re.sub(r"/{2,}", "/", parts.path or "/")
+    path = re.sub(r"/index\.html?$", "/", path)
+    if len(path) > 1:
+        path = path.rstrip("/")
+    query = urlencode(sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                             if not TRACKING_PARAMS.match(key)))
+    return urlunsplit(("https", host, path, query, ""))
+
+
+class URLFrontier:
+    def __init__(self,
+                 path: str | Path,
+                 site: str,
+                 include_paths: Sequence[str] = tuple(INGEST_INCLUDE_PATHS),
+                 exclude_paths: Sequence[str] = tuple(INGEST_EXCLUDE_PATHS)):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.host = urlsplit(canonical_url(site)).netloc
+        self.include = [re.compile(p) for p in include_paths]
+        self.exclude = [re.compile(p) for p in exclude_paths]
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS urls (
+                seq INTEGER PRIMARY KEY,
+                url TEXT NOT NULL UNIQUE,
+                mapped INTEGER NOT NULL,  -- 0 for URLs replayed from dead letters
+                batch INTEGER             -- extract batch, once handed out
+            );
+            CREATE INDEX IF NOT EXISTS urls_batch ON urls (batch);
+            CREATE TABLE IF NOT EXISTS shards (
+                key TEXT PRIMARY KEY,     -- path prefix, "<prefix> -<n>" for the rest after n sub-paths
+                status TEXT NOT NULL      -- complete, full
+            );
+            """
+        )
+        self.discovering = True
+        self.changed = asyncio.Event()
+        self.rejected = 0
+        self.duplicates = 0
+
+    def allowed(self, url: str) -> bool:
+        parts = urlsplit(url)
+        if parts.netloc != self.host:
+            return False
+        if self.include and not any(p.search(parts.path) for p in self.include):
+            return False
+        return not any(p.search(parts.path) for p in self.exclude)
+
+    def add(self, urls: Iterable[str], mapped: bool = True) -> int:
+        """Add URLs (canonicalized, filtered, deduplicated). Returns how many were new."""
+        new = 0
+        with self.conn:
+            for url in urls:
+                url = canonical_url(url)
+                if not self.allowed(url):
+                    self.rejected += 1
+                    continue
+                inserted = self.conn.execute("INSERT OR IGNORE INTO urls (url, mapped) VALUES (?, ?)",
+                                             (url, int(mapped))).rowcount
+                new += inserted
+                self.duplicates += 1 - inserted
+                if not inserted and mapped:
+                    # replayed from dead letters first, then found by the map: it is part of the site
+                    self.conn.execute("UPDATE urls SET mapped = 1 WHERE url = ? AND mapped = 0", (url,))
+        if new:
+            self.changed.set()
+        return new
+
+    def finish_discovery(self) -> None:
+        self.discovering = False
+        self.changed.set()
+
+    def mapped_urls(self) -> List[str]:
+        return [url for (url,) in self.conn.execute("SELECT url FROM urls WHERE mapped = 1 ORDER BY seq")]
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+
+    # --- extract batches ------------------------------------------------------------
+
+    def _assign(self, batch_size: int) -> Tuple[int, List[str]]:
+        batch_num = (self.conn.execute("SELECT MAX(batch) FROM urls").fetchone()[0] or 0) + 1
+        rows = self.conn.execute("SELECT seq, url FROM urls WHERE batch IS NULL ORDER BY seq LIMIT ?",
+                                 (batch_size,)).fetchall()
+        with self.conn:
+            self.conn.executemany("UPDATE urls SET batch = ? WHERE seq = ?", [(batch_num, seq) for seq, _ in rows])
+        return batch_num, [url for _, url in rows]
+
+    def _pending(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM urls WHERE batch IS NULL").fetchone()[0]
+
+    async def batches(self, batch_size: int) -> AsyncIterator[Tuple[int, List[str]]]:
+        """(batch number, URLs) as soon as `batch_size` URLs are waiting, the rest once discovery is over.
+
+        Batches handed out before (by the run being resumed) come first, unchanged."""
+        assigned: Dict[int, List[str]] = {}
+        for batch_num, url in self.conn.execute(
+                "SELECT batch, url FROM urls WHERE batch IS NOT NULL ORDER BY batch, seq"):
+            assigned.setdefault(batch_num, []).append(url)
+        for batch_num, urls in assigned.items():
+            yield batch_num, urls
+
+        while True:
+            pending = self._pending()
+            if pending >= batch_size or (pending and not self.discovering):
+                yield self._assign(batch_size)
+            elif not self.discovering:
+                return
+            else:
+                self.changed.clear()
+                await self.changed.wait()
+
+    # --- shards -----------------------------------------------------------------------
+
+    def shard_status(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT status FROM shards WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_shard_status(self, key: str, status: str) -> None:
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO shards (key, status) VALUES (?, ?)", (key, status))
+
+    def shard_count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM shards").fetchone()[0]
+
+    def urls_under(self, prefix: str) -> List[str]:
+        return [url for (url,) in self.conn.execute(
+            "SELECT url FROM urls WHERE url LIKE ? ESCAPE '\\'",
+            (_like_prefix(f"https://{self.host}{prefix}"),))]
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def _like_prefix(prefix: str) -> str:
+    return re.sub(r"([%_\\])", r"\\\1", prefix) + "%"
+
+
+def sub_prefixes(urls: Iterable[str], prefix: str) -> List[str]:
+    """Path prefixes one directory below `prefix` that have pages under them."""
+    children = set()
+    for url in urls:
+        path = urlsplit(url).path
+        if not path.startswith(prefix):
+            continue
+        rest = path[len(prefix):].lstrip("/")
+        if "/" in rest:  # a directory below the prefix, not a page directly in it
+            children.add(prefix.rstrip("/") + "/" + rest.split("/", 1)[0] + "/")
+    return sorted(children)
+
+
+async def discover(site: str,
+                   map_shard: Callable[[str, str, List[str]], Awaitable[Optional[List[str]]]],
+                   frontier: URLFrontier,
+                   limit: int,
+                   max_shards: int = INGEST_MAX_SHARDS) -> bool:
+    """Map `site` shard by shard into `frontier`.
+
+    map_shard(url, path prefix, sub-path prefixes to leave out) returns the URLs
+    the mapper found (None if the call failed). Returns whether discovery is
+    complete: no call failed, and no shard stayed truncated at `limit` URLs."""
+    root = canonical_url(site)
+    origin = root[: len(root) - len(urlsplit(root).path)]
+    root_prefix = urlsplit(root).path.rstrip("/") + "/"
+    calls = 0
+    complete = True
+
+    async def map_once(key: str, prefix: str, exclude: List[str]) -> Optional[str]:
+        """complete / full, or None if the call failed or was over budget (not recorded:
+        a resumed run makes it again)."""
+        nonlocal calls
+        status = frontier.shard_status(key)
+        if status is not None:
+            return status
+        if calls >= max_shards:
+            return None
+        calls += 1
+        urls = await map_shard(origin + prefix, prefix, exclude)
+        if urls is None:
+            return None
+        frontier.add(urls)
+        status = "full" if len(urls) >= limit else "complete"
+        frontier.set_shard_status(key, status)
+        return status
+
+    async def shard(prefix: str) -> None:
+        nonlocal complete
+        status = await map_once(prefix, prefix, [])
+        done: List[str] = []
+        while status == "full":
+            children = [child for child in sub_prefixes(frontier.urls_under(prefix), prefix) if child not in done]
+            if not children:  # only pages directly under the prefix: truncated
+                complete = False
+                return
+            await asyncio.gather(*(shard(child) for child in children))
+            done += children
+            # the rest of the prefix, which may reveal sub-paths the full calls never got to
+            status = await map_once(f"{prefix} -{len(done)}", prefix, done)
+        if status is None:
+            complete = False
+
+    try:
+        await shard(root_prefix)
+    finally:
+        frontier.finish_discovery()
+    return complete
@@ -0,0 +1,254 @@
+"""Shared, pooled HTTP clients for the Tavily, OpenAI and Pinecone calls.
+
+Every tool and client used to manage its own connections: the Tavily tools
+post with a bare `requests.post` (sync) or a new aiohttp session per call
+(async), so hundreds of concurrent extract batches meant as many TCP + TLS
+handshakes and sockets. Instead, one process-wide httpx client (and one
+async client) keeps connections alive and bounded:
+
+  HTTP_MAX_CONNECTIONS     open connections per client          (default 100)
+  HTTP_MAX_KEEPALIVE       idle connections kept for reuse      (default 20)
+  HTTP_KEEPALIVE_EXPIRY    seconds an idle connection is kept   (default 30)
+  HTTP_TIMEOUT             seconds per request                  (default 60)
+  HTTP2                    auto (HTTP/2 if `h2` is installed), 1 or 0
+
+They are passed to OpenAIEmbeddings / ChatOpenAI (`http_client`,
+`http_async_client`) and to the Tavily tools (their API wrappers post
+through them). The Pinecone SDK can't take an external client (urllib3 /
+aiohttp inside), so its index gets the same pool size instead and is built
+once per process.
+
+`pool_stats()` counts requests, new connections and TLS handshakes, and the
+connections open / idle right now.
+"""
+import asyncio
+import importlib.util
+import os
+import ssl
+import threading
+import weakref
+from functools import lru_cache
+from typing import Any, ClassVar, Dict, Optional
+
+import certifi
+import httpx
+from langchain_core.tools import ToolException
+from langchain_tavily import TavilyCrawl, TavilyExtract, TavilyMap
+from langchain_tavily._utilities import (TAVILY_API_URL,
+                                         TavilyCrawlAPIWrapper,
+                                         TavilyExtractAPIWrapper,
+                                         TavilyMapAPIWrapper)
+
+from logger import log_info
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+HTTP2 = os.getenv("HTTP2", "auto")
+
+_stats = {"requests": 0, "connections_opened": 0, "tls_handshakes": 0}
+_stats_lock = threading.Lock()
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def http2_enabled() -> bool:
+    if HTTP2 == "auto":
+        return importlib.util.find_spec("h2") is not None
+    return HTTP2 == "1"
+
+
+def _transport_options() -> Dict[str, Any]:
+    return {
+        "verify": ssl.create_default_context(cafile=certifi.where()),
+        "http2": http2_enabled(),
+        "limits": httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                               max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                               keepalive_expiry=HTTP_KEEPALIVE_EXPIRY),
+    }
+
+
+def _record(event: str) -> None:
+    # httpcore trace events, e.g. "connection.connect_tcp.complete"
+    if event.endswith("connect_tcp.complete"):
+        key = "connections_opened"
+    elif event.endswith("start_tls.complete"):
+        key = "tls_handshakes"
+    else:
+        return
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def _count_request() -> None:
+    with _stats_lock:
+        _stats["requests"] += 1
+
+
+class _CountingTransport(httpx.HTTPTransport):
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        _count_request()
+        request.extensions = {**request.extensions, "trace": lambda event, info: _record(event)}
+        return super().handle_request(request)
+
+
+class _PerLoopTransport(httpx.AsyncBaseTransport):
+    """One connection pool per event loop: pooled connections can't move between
+    loops, and a process may run several (asyncio.run() per phase, a server)."""
+
+    def __init__(self):
+        self.transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport]" = \
+            weakref.WeakKeyDictionary()
+
+    def current(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        if loop not in self.transports:
+            self.transports[loop] = httpx.AsyncHTTPTransport(**_transport_options())
+        return self.transports[loop]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        async def trace(event: str, info: Dict[str, Any]) -> None:
+            _record(event)
+
+        _count_request()
+        request.extensions = {**request.extensions, "trace": trace}
+        return await self.current().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        transport = self.transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+def http_client() -> httpx.Client:
+    """The process-wide sync client."""
+    with _clients_lock:
+        if "sync" not in _clients:
+            _clients["sync"] = httpx.Client(transport=_CountingTransport(**_transport_options()),
+                                            timeout=HTTP_TIMEOUT)
+        return _clients["sync"]
+
+
+def async_http_client() -> httpx.AsyncClient:
+    """The process-wide async client (one connection pool per event loop)."""
+    with _clients_lock:
+        if "async" not in _clients:
+            _clients["async"] = httpx.AsyncClient(transport=_PerLoopTransport(), timeout=HTTP_TIMEOUT)
+        return _clients["async"]
+
+
+def openai_clients() -> Dict[str, Any]:
+    """Keyword arguments for OpenAIEmbeddings / ChatOpenAI."""
+    return {"http_client": http_client(), "http_async_client": async_http_client()}
+
+
+def pool_stats() -> Dict[str, Any]:
+    pools = []
+    if "sync" in _clients:
+        pools.append(_clients["sync"]._transport._pool)
+    if "async" in _clients:
+        pools.extend(transport._pool for transport in list(_clients["async"]._transport.transports.values()))
+    connections = [connection for pool in pools for connection in pool.connections]
+    with _stats_lock:
+        stats = dict(_stats)
+    return {
+        **stats,
+        "reused": max(stats["requests"] - stats["connections_opened"], 0),
+        "open_connections": len(connections),
+        "idle_connections": sum(connection.is_idle() for connection in connections),
+        "http2": http2_enabled(),
+    }
+
+
+def log_pool_stats() -> None:
+    stats = pool_stats()
+    log_info(f"   • HTTP pool: {stats['requests']} requests over {stats['connections_opened']} connections "
+             f"({stats['tls_handshakes']} TLS handshakes, {stats['idle_connections']} idle, "
+             f"HTTP/2 {'on' if stats['http2'] else 'off'})")
+
+
+# --- Tavily ----------------------------------------------------------------------
+
+
+class _PooledTavilyAPI:
+    """Send a Tavily API wrapper's requests through the shared clients.
+
+    The tools call `raw_results(**params)`; like the stock wrappers, unset
+    (None) parameters are left out of the request body."""
+
+    endpoint: ClassVar[str]
+
+    def _request(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "url": f"{self.api_base_url or TAVILY_API_URL}/{self.endpoint}",
+            "json": {key: value for key, value in params.items() if value is not None},
+            "headers": {
+                "Authorization": f"Bearer {self.tavily_api_key.get_secret_value()}",
+                "Content-Type": "application/json",
+                "X-Client-Source": "langchain-tavily",
+            },
+        }
+
+    @staticmethod
+    def _result(response: httpx.Response) -> Dict[str, Any]:
+        if response.status_code != 200:
+            detail = response.json().get("detail", {})
+            error_message = detail.get("error") if isinstance(detail, dict) else "Unknown error"
+            raise ValueError(f"Error {response.status_code}: {error_message}")
+        return response.json()
+
+    def raw_results(self, **params: Any) -> Dict[str, Any]:
+        return self._result(http_client().post(**self._request(params)))
+
+    async def raw_results_async(self, **params: Any) -> Dict[str, Any]:
+        return self._result(await async_http_client().post(**self._request(params)))
+
+
+class PooledTavilyExtractAPIWrapper(_PooledTavilyAPI, TavilyExtractAPIWrapper):
+    endpoint: ClassVar[str] = "extract"
+
+
+class PooledTavilyMapAPIWrapper(_PooledTavilyAPI, TavilyMapAPIWrapper):
+    endpoint: ClassVar[str] = "map"
+
+
+class PooledTavilyCrawlAPIWrapper(_PooledTavilyAPI, TavilyCrawlAPIWrapper):
+    endpoint: ClassVar[str] = "crawl"
+
+
+def _wrapper_kwargs(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: kwargs.pop(key) for key in ("tavily_api_key", "api_base_url") if key in kwargs}
+
+
+def tavily_extract(**kwargs: Any) -> TavilyExtract:
+    """TavilyExtract(**kwargs), sending its requests through the shared clients."""
+    return TavilyExtract(apiwrapper=PooledTavilyExtractAPIWrapper(**_wrapper_kwargs(kwargs)), **kwargs)
+
+
+def tavily_map(**kwargs: Any) -> TavilyMap:
+    return TavilyMap(api_wrapper=PooledTavilyMapAPIWrapper(**_wrapper_kwargs(kwargs)), **kwargs)
+
+
+def is_empty_map(error: BaseException) -> bool:
+    """TavilyMap raises ToolException("No crawl results found for ...") when nothing matched."""
+    return isinstance(error, ToolException) and str(error).startswith("No crawl results found")
+
+
+def tavily_crawl(**kwargs: Any) -> TavilyCrawl:
+    return TavilyCrawl(api_wrapper=PooledTavilyCrawlAPIWrapper(**_wrapper_kwargs(kwargs)), **kwargs)
+
+
+# --- Pinecone --------------------------------------------------------------------
+
+
+@lru_cache(maxsize=None)
+def pinecone_index(index_name: str, host: Optional[str] = None):
+    """The index of `index_name` (or at `host`, default PINECONE_HOST), one per process,
+    with a connection pool as large as the shared clients'."""
+    from pinecone import Pinecone
+
+    client = Pinecone(api_key=os.environ.get("PINECONE_API_KEY"))
+    host = host or os.environ.get("PINECONE_HOST")
+    location = {"host": host} if host else {"name": index_name}
+    return client.Index(**location, connection_pool_maxsize=HTTP_MAX_CONNECTIONS)
@@ -1,65 +1,89 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
-from langchain_community.document_loaders import ReadTheDocsLoader
-from langchain_pinecone import PineconeVectorStore
+from langchain_core.documents import Document
+
+from backend.answer_cache import mark_index_updated
+from bm25_index import BM25Index
+from dedup import Deduplicator
+from docs_loader import load_and_split_parallel
+from embedding_cache import CachedEmbeddings
+from http_clients import openai_clients
+from vectorstores import get_vectorstore
 
-embeddings = OpenAIEmbeddings(
-    model="text-embedding-3-small"
-)  # same model as pinecone vectorstore
 INDEX_NAME = "documentation-assistant-project"
+UPLOAD_WORKERS = 4  # batches being embedded / upserted at the same time
+BATCH_SIZE = 100  # too large might get pinecone upserting error
 
 
 def ingest_docs():
-    loader = ReadTheDocsLoader(
-        "langchain-docs/api.python.langchain.com/en/latest", encoding="utf-8"
-    )
-
-    raw_documents = loader.load()
-    print(f"loaded {len(raw_documents)} documents")
-
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=600, chunk_overlap=50)
-    documents = text_splitter.split_documents(raw_documents)
-
-    # iterate over the chunked documents
-    for doc in documents:
-        new_url = doc.metadata["source"]
-
-        # convert Windows-style backlashes to forward slashed
-        new_url = new_url.replace("\\", "/")
-        new_url = new_url.replace("langchain-docs/", "")
-
-        # remove all protocol prefixes first
-        new_url = new_url.replace("https://", "").replace("http://", "")
-
-        # add single clean https:// prefix
-        new_url = "https://" + new_url.lstrip("/")
-
-        doc.metadata.update({"source": new_url})
-
-    print(f"Going to add {len(documents)} documents to Pinecone")
-
-    # create vectorstore
-    vectorstore = PineconeVectorStore(
-        index_name=INDEX_NAME,
-        embedding=embeddings,
-    )
-
-    # define batch size
-    batch_size = 100  # too large might get pinecone upserting error
-
-    # loop through documents in batches
-    for i in range(0, len(documents), batch_size):
-        batch = documents[i : i + batch_size]
-        vectorstore.add_documents(
-            batch
-        )  # convert to embeddings and upsert to pinecone vectorstore
-        print(f"Uploaded batch {i // batch_size + 1} with {len(batch)} documents")
-
-    print("***** Loading to vectorstore done! *****")
+    # chunks that were embedded on a previous run are read back from the local cache
+    embeddings = CachedEmbeddings(
+        OpenAIEmbeddings(model="text-embedding-3-small", **openai_clients())
+    )  # same model as pinecone vectorstore
+    # create vectorstore (backend picked by VECTORSTORE_BACKEND)
+    vectorstore = get_vectorstore(INDEX_NAME, embeddings)
+    # keyword index for the hybrid search of backend/core.py, built alongside
+    keyword_index = BM25Index(INDEX_NAME)
+
+    # uploads run in a thread pool while later files are still being parsed;
+    # the semaphore bounds how many batches are waiting, so parsing can't run away
+    pending_uploads = threading.BoundedSemaphore(2 * UPLOAD_WORKERS)
+    uploaded = 0
+    uploaded_lock = threading.Lock()
+
+    def upload(batch: List[Document]):
+        nonlocal uploaded
+        try:
+            ids = vectorstore.add_documents(
+                batch
+            )  # convert to embeddings and upsert to pinecone vectorstore
+            keyword_index.add_documents(batch, ids=ids)
+            with uploaded_lock:
+                uploaded += len(batch)
+            print(f"Uploaded batch with {len(batch)} documents ({uploaded} so far)")
+        finally:
+            pending_uploads.release()
+
+    # repeated navigation / boilerplate chunks are embedded once (dedup.py)
+    dedup = Deduplicator()
+    duplicates = 0
+    chunks = 0
+
+    futures = []
+    buffer: List[Document] = []
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as uploads:
+
+        def submit(batch: List[Document]):
+            pending_uploads.acquire()
+            futures.append(uploads.submit(upload, batch))
+
+        for documents in load_and_split_parallel():
+            is_duplicate = dedup.duplicates("chunks", [doc.page_content for doc in documents])
+            chunks += len(documents)
+            duplicates += sum(is_duplicate)
+            buffer.extend(doc for doc, dup in zip(documents, is_duplicate) if not dup)
+            while len(buffer) >= BATCH_SIZE:
+                submit(buffer[:BATCH_SIZE])
+                del buffer[:BATCH_SIZE]
+        if buffer:
+            submit(buffer)
+
+    # surface upload errors
+    for future in futures:
+        future.result()
+
+    print(f"***** Loading {uploaded} documents to vectorstore done! *****")
+    print(f"Dedup: {duplicates} of {chunks} chunks were near-duplicates and were not embedded")
+    # cached answers of the chat app may be stale now
+    mark_index_updated()
+    print(f"Embedding cache: {embeddings.stats()}")
 
 
 if __name__ == "__main__":
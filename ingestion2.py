@@ -1,7 +1,12 @@
+import argparse
 import asyncio
 import os
-import ssl
-from typing import Any, Dict, List
+import re
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, List, Optional, Set, Tuple
 
 
 import certifi # for getting valid certificate,
@@ -12,95 +17,222 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.text_splitter import TextSplitter
 # split top-down with the default order ["\n\n", "\n", " ", ""]
 
-from langchain_chroma import Chroma # local vectorstore
-from langchain_pinecone import PineconeVectorStore # cloud based vectorstore
 
 from langchain_core.documents import Document # represent text document with metadata
 # Document(page_content: str, metadata: Dict)
 
 from langchain_openai import OpenAIEmbeddings
-from langchain_tavily import TavilyCrawl, TavilyExtract, TavilyMap
 
 
+from backend.answer_cache import mark_index_updated
+from bm25_index import BM25Index
+from checkpoint import CHECKPOINT_DIR, RunCheckpoint
+from chunker import describe, text_splitter as make_text_splitter
+from dedup import DEDUP_STAGES, Deduplicator
+from embedding_cache import CachedEmbeddings
+from frontier import INGEST_EXCLUDE_PATHS, URLFrontier, canonical_url, discover
+import http_clients
+from manifest import IngestionManifest, chunk_id, content_hash
+from pipeline import PipelineStats, peak_rss_mb, run_streaming
+from scheduler import DeadLetterQueue, ProviderLimits, Scheduler, dead_letter_key
+from vectorstores import get_vectorstore
 from logger import (Colors,
+                    count,
                     log_info,
                     log_error,
                     log_warning,
                     log_header,
-                    log_success)
+                    log_success,
+                    log_metrics_summary,
+                    serve_prometheus,
+                    span,
+                    write_prometheus)
 
 
-# configure SSL context to use certifi certificates
-# for making tons of requests for Tavily API
-ssl_context = ssl.create_default_context(cafile=certifi.where())
+# use certifi certificates for making tons of requests for Tavily API
+# (the shared, pooled clients of http_clients.py are built with them)
 os.environ["SSL_CERT_FILE"] = certifi.where()
 os.environ["REQUEST_CA_BUNDLE"] = certifi.where()
 
 
-embeddings = OpenAIEmbeddings(
+# site to ingest, mapped in shards of at most MAP_LIMIT urls (see frontier.py)
+SITE_URL = os.getenv("INGEST_SITE", "https://python.langchain.com/")
+MAP_LIMIT = int(os.getenv("MAP_LIMIT", "500"))  # urls per TavilyMap call
+
+# batch sizes and splitter settings (benchmarks/bench_e2e.py sweeps them)
+URL_BATCH_SIZE = int(os.getenv("URL_BATCH_SIZE", "20")) # urls per TavilyExtract call
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "500")) # chunks per vectorstore batch
+EMBEDDING_CHUNK_SIZE = int(os.getenv("EMBEDDING_CHUNK_SIZE", "50")) # texts per embeddings request
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "500"))  # chunk size in tokens (CHUNKER=tokens, see chunker.py)
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "4000"))  # chunk size in characters (CHUNKER=recursive)
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+
+
+# re-ingested chunks whose text didn't change are read back from the local embedding cache
+embeddings = CachedEmbeddings(OpenAIEmbeddings(
     model="text-embedding-3-small",
     show_progress_bar=False, # show indexing progress
-    chunk_size=50, # for rate limiting
+    chunk_size=EMBEDDING_CHUNK_SIZE, # for rate limiting
     # number of text objects to be embedded in OpenAI at a single request
-    retry_min_seconds=30,
-    # in case a batch fails (sth wrong with the payload, or rate limits, most of the time the later),
-    # we'll wait 'retry_min_seconds' seconds before we try to retry it
+    max_retries=0,
+    # don't retry (and sleep) inside the client: a 429 is surfaced to the scheduler,
+    # which backs off with jitter and shrinks the concurrency instead of stalling everything
+    **http_clients.openai_clients(), # keep-alive connections shared with the Tavily tools (http_clients.py)
+))
+
+
+# cloud based (Pinecone) or local (Chroma / IVF index) vectorstore, see VECTORSTORE_BACKEND
+vectorstore = get_vectorstore("documentation-assistant-project-v2", embeddings)
+# BM25 keyword index kept in sync with the vectorstore, for hybrid search
+keyword_index = BM25Index("documentation-assistant-project-v2")
+# langchain tools, posting through the shared connection pool
+tavily_extract = http_clients.tavily_extract()
+tavily_map = http_clients.tavily_map(max_depth=5,
+                                     max_breadth=100,
+                                     limit=MAP_LIMIT,
+                                     categories=["Documentation"],
+                                     )
+tavily_crawl = http_clients.tavily_crawl()
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+
+# local record of what is already in the vectorstore (content hash per page and per chunk)
+MANIFEST_PATH = os.getenv("INGESTION_MANIFEST", str(PROJECT_ROOT / ".cache" / "ingestion_manifest.sqlite"))
+
+# batches that keep failing end up here and are replayed on the next run
+DEAD_LETTER_PATH = os.getenv("INGESTION_DEAD_LETTERS", str(PROJECT_ROOT / ".cache" / "dead_letters.jsonl"))
+dead_letters = DeadLetterQueue(DEAD_LETTER_PATH)
+
+# what the current run has completed so far (url frontier, extract batches, index batches),
+# so `python ingestion2.py --resume` can continue a crashed run
+checkpoint = RunCheckpoint(CHECKPOINT_DIR)
+
+# per-provider concurrency caps / request rates shared by every phase
+scheduler = Scheduler(
+    limits={
+        "tavily": ProviderLimits(max_concurrency=8, requests_per_second=4, burst=8),
+        "openai": ProviderLimits(max_concurrency=4, requests_per_second=2, burst=4),
+    },
+    dead_letters=dead_letters,
 )
 
+# "streaming": extract, chunk and index concurrently through bounded queues
+# "phased": extract everything, then chunk everything, then index everything
+INGESTION_MODE = os.getenv("INGESTION_MODE", "streaming")
+
+
+def document_to_record(doc: Document) -> Dict[str, Any]:
+    """JSON-serializable form of a Document (for dead letters)."""
+    return {"id": doc.id, "page_content": doc.page_content, "metadata": doc.metadata}
+
 
-# local vectorstore
-# chroma = Chroma(persist_directory="chroma_db", # store DB under project's cwd
-#                 embedding_function=embeddings,
-#                 )
-# cloud based vectorstore
-vectorstore = PineconeVectorStore(index_name="documentation-assistant-project-v2",
-                                  embedding=embeddings,
-                                  )
-tavily_extract = TavilyExtract() # a langchain tool
-tavily_map = TavilyMap(max_depth=5,
-                       max_breadth=100,
-                       limit=500,
-                       categories=["Documentation"],
-                       ) # a langchain tool
-tavily_crawl = TavilyCrawl() # a langchain tool
-
-
-def chunk_urls(urls: List[str], chunk_size: int = 3) -> List[List[str]]:
-    """Split URLs into chunks of specified size."""
+def replay_dead_letters():
+    """Read the batches that failed on previous runs (they stay in the file until acked).
+
+    Returns (urls to extract again, chunks to index again, dead letter keys)."""
+    urls = []
     chunks = []
-    for i in range(0, len(urls), chunk_size):
-        chunk = urls[i:i + chunk_size]
-        chunks.append(chunk)
-    return chunks
+    records = dead_letters.pending()
+    for record in records:
+        if record["provider"] == "tavily":
+            urls.extend(record["payload"])
+        else:
+            chunks.extend(Document(**doc) for doc in record["payload"])
+    if urls or chunks:
+        log_warning(f"♻️ Dead letters: replaying {len(urls)} URLs and {len(chunks)} chunks from previous runs")
+    return urls, chunks, [dead_letter_key(record) for record in records]
+
+
+async def map_prefix(url: str, prefix: str, exclude: List[str]) -> Dict[str, Any]:
+    """Map the part of the site under a path prefix, except the sub-paths in `exclude`.
+
+    Errors are raised, so the scheduler can retry."""
+    with span("map", prefix=prefix, excluded=len(exclude)) as fields:
+        exclude_paths = INGEST_EXCLUDE_PATHS + ["^" + re.escape(sub_path) for sub_path in exclude]
+        try:
+            site_map = await tavily_map.ainvoke({"url": url,
+                                                 "select_paths": ["^" + re.escape(prefix) + ".*"],
+                                                 "exclude_paths": exclude_paths or None})
+        except Exception as e:
+            # the tool raises on an empty map ("No crawl results found for ...")
+            if not http_clients.is_empty_map(e):
+                raise
+            site_map = {"results": []}
+        if isinstance(site_map, str):
+            # ... or, with handle_tool_error, returns that message
+            site_map = {"results": []}
+        if "error" in site_map:
+            raise site_map["error"]
+        fields["urls"] = len(site_map["results"])
+    return site_map
+
+
+async def map_shard(url: str, prefix: str, exclude: List[str]) -> Optional[List[str]]:
+    """URLs found under `prefix`, or None if the map call failed (discovery is then incomplete)."""
+    result = await scheduler.run("tavily",
+                                 lambda: map_prefix(url, prefix, exclude),
+                                 batch_id=f"map-{prefix}" + (f"-{len(exclude)}" if exclude else ""),
+                                 payload=[])
+    if result is None:
+        return None
+    log_info(f"🗺️ TavilyMap: {len(result['results'])} URLs under {prefix}", Colors.PURPLE)
+    return result["results"]
+
 
 async def extract_batch(urls: List[str], # a batch
                         batch_num: int # for logging
-                        ) -> List[Dict[str, Any]]:
-    """Extract documents from a batch of URLs."""
-    try:
-        log_info(f"🔄 TavilyExtract: Processing batch {batch_num} with {len(urls)} URLs",
-                 Colors.BLUE,
-                 )
+                        ) -> Dict[str, Any]:
+    """Extract documents from a batch of URLs.
+
+    Errors are raised, so the scheduler can retry the batch."""
+    log_info(f"🔄 TavilyExtract: Processing batch {batch_num} with {len(urls)} URLs",
+             Colors.BLUE,
+             )
+    with span("extract", batch=batch_num, urls=len(urls)) as fields:
         docs = await tavily_extract.ainvoke(input={"urls": urls,
                                                    "extract_depth": "advanced"})
-        extracted_docs_count = len(docs.get("results", []))
-        if extracted_docs_count > 0:
-            log_success(
-                f"✅ TavilyExtract: Completed batch {batch_num} - extracted {extracted_docs_count} documents"
-            )
-        else:
-            log_error(
-                f"❌ TavilyExtract: Batch {batch_num} failed to extract any documents, {docs}"
-            )
-        return docs
-    except Exception as e:
-        log_error(f"❌ TavilyExtract: Failed to extract batch {batch_num} - {e}")
-        return []
+        if "error" in docs:
+            # the tool returns HTTP errors (429s included) instead of raising them
+            raise docs["error"]
+        fields["pages"] = extracted_docs_count = len(docs.get("results", []))
+    if extracted_docs_count > 0:
+        log_success(
+            f"✅ TavilyExtract: Completed batch {batch_num} - extracted {extracted_docs_count} documents"
+        )
+    else:
+        log_error(
+            f"❌ TavilyExtract: Batch {batch_num} failed to extract any documents, {docs}"
+        )
+    return docs
+
 
 
+async def extract_pages(urls: List[str],
+                        batch_num: int) -> Optional[List[Document]]:
+    """Extract a batch of URLs under the scheduler's Tavily limits.
+
+    Returns the extracted pages, or None if the batch failed (it is dead-lettered)."""
+    pages = checkpoint.load_extract(batch_num)
+    if pages is not None:
+        log_info(f"♻️ Checkpoint: batch {batch_num} already extracted ({len(pages)} pages)", Colors.BLUE)
+        return pages
+
+    result = await scheduler.run("tavily",
+                                 lambda: extract_batch(urls, batch_num),
+                                 batch_id=f"extract-{batch_num}",
+                                 payload=urls)
+    if result is None:
+        return None
+    pages = [Document(page_content=extracted_page["raw_content"],
+                      metadata={"source": canonical_url(extracted_page["url"])})
+             for extracted_page in result["results"]]
+    checkpoint.save_extract(batch_num, pages)
+    return pages
+
 
 # concurrently extract all the urls
 async def async_extract(url_batches: List[List[str]]):
@@ -110,31 +242,26 @@ async def async_extract(url_batches: List[List[str]]):
         Colors.DARKCYAN,
     )
 
-    # Process batches concurrently
-    tasks = [extract_batch(batch, i + 1) for i, batch in enumerate(url_batches)]
+    # Process batches concurrently, bounded and rate limited by the scheduler
+    tasks = [extract_pages(batch, i + 1) for i, batch in enumerate(url_batches)]
     batch_results = await asyncio.gather(*tasks, return_exceptions=True)
 
-    # filter out exceptions and flatten results
+    # filter out failures (already dead-lettered by the scheduler) and flatten results
     all_extracted = []
     failed_batches = 0
     for batch_result in batch_results:
-        if isinstance(batch_result, Exception):
-            log_error(f"❌ TavilyExtract: Batch {batch_result} failed with exception")
+        if batch_result is None or isinstance(batch_result, Exception):
             failed_batches += 1
         else:
-            for extracted_page in batch_result["results"]: # type: ignore
-                document = Document(
-                    page_content=extracted_page["raw_content"],
-                    metadata={"source": extracted_page["url"]},
-                )
-                all_extracted.append(document)
+            all_extracted.extend(batch_result)
 
     log_success(
         f"✅ TavilyExtract: Extraction complete: Total pages extracted: {len(all_extracted)}"
     )
 
     if failed_batches > 0:
-        log_warning(f"⚠️ TavilyExtract: {failed_batches} batches failed during extraction")
+        log_warning(f"⚠️ TavilyExtract: {failed_batches} batches failed during extraction, "
+                    f"saved to {DEAD_LETTER_PATH} for the next run")
 
     return all_extracted
 
@@ -170,9 +297,39 @@ async def async_extract(url_batches: List[List[str]]):
 #         f"TavilyCrawl: Successfully crawled {len(all_docs)} URLs from https://python.langchain.com/",
 #     )
 
+async def index_batch(batch: List[Document],
+                      batch_num: int,
+                      stats: Optional[PipelineStats] = None) -> bool:
+    """Add a batch of chunks under the scheduler's OpenAI limits
+    (embedding is the bottleneck, not the upsert).
+
+    Returns whether the batch made it into the vectorstore (failed batches are dead-lettered)."""
+    async def add_batch():
+        with span("index", batch=batch_num, chunks=len(batch)):
+            # documents carry stable ids (doc.id), so re-adding a chunk overwrites its old vector
+            await vectorstore.aadd_documents(batch)
+            await asyncio.to_thread(keyword_index.add_documents, batch)
+        checkpoint.record_indexed(batch_num, {doc.id: content_hash(doc.page_content) for doc in batch})
+        log_success(
+            f"VectorStore Indexing: Successfully added batch {batch_num} ({len(batch)} documents)"
+        )
+        if stats is not None:
+            stats.mark_upsert(len(batch))
+        return True
+
+    result = await scheduler.run("openai",
+                                 add_batch,
+                                 batch_id=f"index-{batch_num}",
+                                 payload=[document_to_record(doc) for doc in batch])
+    return result is True
+
+
 async def index_documents_async(documents: List[Document],
-                               batch_size: int = 50):
-    """Process documents in batches asynchronously."""
+                               batch_size: int = 50,
+                               stats: Optional[PipelineStats] = None) -> List[Document]:
+    """Process documents in batches asynchronously.
+
+    Returns the documents that were successfully added."""
     log_header("⚙️ VECTOR STORAGE PHASE ⚙️")
     log_info(
         f"📦 VectorStore Indexing: Preparing to add {len(documents)} documents to vector store",
@@ -188,21 +345,8 @@ async def index_documents_async(documents: List[Document],
         f"📦 VectorStore Indexing: Split into {len(batches)} batches of {batch_size} documents each"
     )
 
-    # Process all batches concurrently
-    async def add_batch(batch: List[Document],
-                        batch_num: int):
-        try:
-            await vectorstore.aadd_documents(batch)
-            log_success(
-                f"VectorStore Indexing: Successfully added batch {batch_num}/{len(batches)} ({len(batch)} documents)"
-            )
-        except Exception as e:
-            log_error(f"VectorStore Indexing: Failed to add batch {batch_num} - {e}")
-            return False
-        return True
-
-    # Process batches concurrently
-    tasks = [add_batch(batch, i + 1) for i, batch in enumerate(batches)]
+    # Process batches concurrently, bounded and rate limited by the scheduler
+    tasks = [index_batch(batch, i + 1, stats) for i, batch in enumerate(batches)]
     results = await asyncio.gather(*tasks, return_exceptions=True)
 
     # Count successful batches
@@ -217,85 +361,360 @@ async def index_documents_async(documents: List[Document],
             f"VectorStore Indexing: Processed {successful}/{len(batches)} batches successfully"
         )
 
+    return [doc
+            for batch, result in zip(batches, results) if result is True
+            for doc in batch]
+
+
+@dataclass
+class SyncPlan:
+    """What the manifest diff decided so far, besides the chunks to upsert.
+
+    A pending record (page hash, {chunk id: chunk hash}) is written to the
+    manifest once all of that page's new chunks have been indexed."""
+    stale_ids: List[str] = field(default_factory=list)
+    pending_pages: Dict[str, Tuple[str, Dict[str, str]]] = field(default_factory=dict)
+    deduped_urls: Set[str] = field(default_factory=set)  # pending pages with content left out as duplicates
+    deleted_urls: List[str] = field(default_factory=list)
+    unchanged_pages: int = 0
+    unchanged_chunks: int = 0
+    checkpointed_chunks: int = 0  # indexed by the run being resumed
+    duplicate_pages: int = 0  # near-duplicates of an earlier page: recorded without chunks
+    duplicate_page_chunks: int = 0  # the chunks those pages would have had
+    duplicate_chunks: int = 0  # near-duplicates of an earlier chunk: not indexed
+    dedup: Deduplicator = field(default_factory=Deduplicator)
+
+    @property
+    def embeddings_saved(self) -> int:
+        return self.duplicate_page_chunks + self.duplicate_chunks
+
+
+def plan_pages(pages: List[Document],
+               text_splitter: TextSplitter,
+               manifest: IngestionManifest,
+               plan: SyncPlan) -> List[Document]:
+    """Diff freshly extracted pages against the manifest.
+
+    Returns the chunks to upsert; stale chunk ids and pending page records are added to `plan`."""
+    with span("chunk", pages=len(pages)) as fields:
+        to_upsert = []
+        page_hashes = [content_hash(page.page_content) for page in pages]
+        unchanged = [manifest.up_to_date(page.metadata["source"], page_hash)
+                     for page, page_hash in zip(pages, page_hashes)]
+        # unchanged pages aren't chunked again, but later pages may still duplicate them: they are
+        # indexed in full, so the only content deduplicated against is this run's and what is indexed
+        duplicate_pages = plan.dedup.duplicates("pages", [page.page_content for page in pages], keep=unchanged)
+        for page, page_hash, is_unchanged, is_duplicate in zip(pages, page_hashes, unchanged, duplicate_pages):
+            url = page.metadata["source"]
+            if is_unchanged:
+                plan.unchanged_pages += 1
+                continue
+
+            old_chunks = manifest.chunk_hashes(url)
+            chunks = text_splitter.split_documents([page])
+            if is_duplicate:
+                # recorded without chunks, and planned again next run (the page it duplicates may change)
+                plan.duplicate_pages += 1
+                plan.duplicate_page_chunks += len(chunks)
+                chunks = []
+            new_hashes = [content_hash(chunk.page_content) for chunk in chunks]
+            ids = [chunk_id(url, i) for i in range(len(chunks))]
+            already_indexed = [old_chunks.get(id_) == hash_ or checkpoint.committed.get(id_) == hash_
+                               for id_, hash_ in zip(ids, new_hashes)]
+            duplicate_chunks = plan.dedup.duplicates("chunks", [chunk.page_content for chunk in chunks],
+                                                     keep=already_indexed)
+            new_chunks = {}
+            for chunk, id_, hash_, is_duplicate_chunk in zip(chunks, ids, new_hashes, duplicate_chunks):
+                if is_duplicate_chunk:
+                    # not part of the page's record: if an older version was indexed, it goes stale
+                    plan.duplicate_chunks += 1
+                    continue
+                chunk.id = id_
+                new_chunks[id_] = hash_
+                if old_chunks.get(id_) == hash_:
+                    plan.unchanged_chunks += 1
+                elif checkpoint.committed.get(id_) == hash_:
+                    plan.checkpointed_chunks += 1
+                else:
+                    to_upsert.append(chunk)
+
+            # the page got shorter: drop the chunks past its new end
+            plan.stale_ids.extend(id_ for id_ in old_chunks if id_ not in new_chunks)
+            plan.pending_pages[url] = (page_hash, new_chunks)
+            if is_duplicate or any(duplicate_chunks):
+                plan.deduped_urls.add(url)
+        fields["chunks"] = len(to_upsert)
+    return to_upsert
+
+
+def plan_deleted_pages(mapped_urls: Optional[List[str]],
+                       manifest: IngestionManifest,
+                       plan: SyncPlan) -> None:
+    """Schedule the chunks of pages that are no longer part of the site for deletion.
+
+    mapped_urls is None if discovery didn't see the whole site: nothing is deleted then."""
+    if mapped_urls is None:
+        return
+    for url in manifest.known_urls() - set(mapped_urls):
+        plan.stale_ids.extend(manifest.chunk_hashes(url))
+        plan.deleted_urls.append(url)
+
+
+def log_sync_plan(plan: SyncPlan, n_upserted: int) -> None:
+    log_info(
+        f"🧮 Manifest: {plan.unchanged_pages} unchanged pages skipped, {plan.unchanged_chunks} unchanged chunks skipped, "
+        f"{n_upserted} chunks to upsert, {len(plan.stale_ids)} stale chunks to delete",
+        Colors.BLUE,
+    )
+    if plan.checkpointed_chunks:
+        log_info(f"♻️ Checkpoint: {plan.checkpointed_chunks} chunks already indexed before the crash", Colors.BLUE)
+    if DEDUP_STAGES:
+        count("dedup_pages_total", plan.duplicate_pages)
+        count("dedup_chunks_total", plan.duplicate_chunks)
+        count("embeddings_saved_total", plan.embeddings_saved)
+        log_info(
+            f"👯 Dedup: {plan.duplicate_pages} near-duplicate pages ({plan.duplicate_page_chunks} chunks) and "
+            f"{plan.duplicate_chunks} near-duplicate chunks dropped, {plan.embeddings_saved} embeddings saved",
+            Colors.BLUE,
+        )
 
 
+def plan_incremental_sync(all_docs: List[Document],
+                          mapped_urls: Optional[List[str]],
+                          text_splitter: TextSplitter,
+                          manifest: IngestionManifest):
+    """Diff all extracted pages against the manifest at once.
 
+    Returns (chunks to upsert, sync plan)."""
+    plan = SyncPlan()
+    to_upsert = plan_pages(all_docs, text_splitter, manifest, plan)
+    plan_deleted_pages(mapped_urls, manifest, plan)
+    log_sync_plan(plan, len(to_upsert))
+    return to_upsert, plan
 
 
+async def ingest_phased(url_batches: AsyncIterable[Tuple[int, List[str]]],
+                        site_urls: Callable[[], Awaitable[Optional[List[str]]]],
+                        replay_chunks: List[Document],
+                        text_splitter: TextSplitter,
+                        manifest: IngestionManifest,
+                        stats: PipelineStats):
+    """Extract everything, then chunk everything, then index everything.
 
+    site_urls() returns the mapped URLs once discovery is over (None if incomplete).
+    Returns (sync plan, ids of chunks that failed to index)."""
+    ##### 3. Content Extraction with TavilyExtract
+    #####    Input: list of batches of urls
+    #####    Process: concurrent extraction from web pages
+    #####    Output: clean, parsed content
+    # the frontier numbers its batches 1, 2, ... in the order they are handed out
+    all_docs = await async_extract([urls async for _, urls in url_batches])
+    stats.pages = len(all_docs)
 
+    ##### 4. Chunking the Langchain documentation (only pages that changed since the last run)
+    log_header("⚙️ DOCUMENTATION CHUNKING PHASE ⚙️")
+    log_info(
+        f"✂️ Text Splitter: Processing {len(all_docs)} documents into {describe(text_splitter)}",
+        Colors.YELLOW,
+    )
+    splitted_docs, plan = plan_incremental_sync(
+        all_docs,
+        await site_urls(),
+        text_splitter,
+        manifest,
+    )
+    log_success(
+        f"✂️ Text Splitter: Created {len(splitted_docs)} new or changed chunks from {len(all_docs)} documents",
+    )
 
-# using TavilyMap & TavilyExtract to get more control of scraping
-async def main():
-    """Main async function to orchestrate the entire process."""
-
-    ##### 1. Website discovery with TavilyMap
-    #####    Input: url site
-    #####    Output: list of documentation urls
-    log_header("⚙️ DOCUMENTATION INGESTION PIPELINE ⚙️")
+    # chunks dead-lettered last time, unless this run produced a fresher version of them
+    fresh_ids = {doc.id for doc in splitted_docs}
+    splitted_docs += [doc for doc in replay_chunks if doc.id not in fresh_ids]
+    stats.chunks = len(splitted_docs)
 
+    # 5. Process documents asynchronously
+    indexed_docs = await index_documents_async(splitted_docs,
+                                               batch_size=INDEX_BATCH_SIZE,
+                                               stats=stats)
+    failed_ids = {doc.id for doc in splitted_docs} - {doc.id for doc in indexed_docs}
+    return plan, failed_ids
+
+
+async def ingest_streaming(url_batches: AsyncIterable[Tuple[int, List[str]]],
+                           site_urls: Callable[[], Awaitable[Optional[List[str]]]],
+                           replay_chunks: List[Document],
+                           text_splitter: TextSplitter,
+                           manifest: IngestionManifest,
+                           stats: PipelineStats):
+    """Extract, chunk and index at the same time, connected by bounded queues,
+    so the first vectors are upserted while later pages are still being extracted
+    (and the first pages are extracted while the site is still being mapped).
+
+    site_urls() returns the mapped URLs once discovery is over (None if incomplete).
+    Returns (sync plan, ids of chunks that failed to index)."""
+    log_header("⚙️ STREAMING EXTRACTION / CHUNKING / INDEXING ⚙️")
     log_info(
-        "🗺️ TavilyMap: Starting to map documentation structure from https://python.langchain.com/",
-        Colors.PURPLE,
+        f"🔧 Pipeline: Streaming batches of {URL_BATCH_SIZE} URLs from the frontier through extract -> chunk -> index",
+        Colors.DARKCYAN,
     )
-
-    # invoke the langchain tool tavily_map
-    site_map = tavily_map.invoke("https://python.langchain.com/")
-    #site_map = tavily_map.invoke("https://python.langchain.com/docs/")
-    #site_map = tavily_map.invoke("https://python.langchain.com/docs/concepts/")
+    plan = SyncPlan()
+    failed_ids = set()
+
+    async def index(batch: List[Document], batch_num: int) -> bool:
+        indexed = await index_batch(batch, batch_num)
+        if not indexed:
+            failed_ids.update(doc.id for doc in batch)
+        return indexed
+
+    await run_streaming(url_batches,
+                        extract=extract_pages,
+                        split=lambda pages: plan_pages(pages, text_splitter, manifest, plan),
+                        index=index,
+                        batch_size=INDEX_BATCH_SIZE,
+                        stats=stats)
+
+    plan_deleted_pages(await site_urls(), manifest, plan)
+    log_sync_plan(plan, stats.chunks)
+
+    # chunks dead-lettered last time, unless this run produced a fresher version of them
+    fresh_ids = {id_ for _, chunk_hashes in plan.pending_pages.values() for id_ in chunk_hashes}
+    leftovers = [doc for doc in replay_chunks if doc.id not in fresh_ids]
+    if leftovers:
+        indexed_docs = await index_documents_async(leftovers, batch_size=INDEX_BATCH_SIZE, stats=stats)
+        stats.chunks += len(leftovers)
+        failed_ids |= {doc.id for doc in leftovers} - {doc.id for doc in indexed_docs}
 
     log_success(
-        f"✅ TavilyMap: Successfully mapped {len(site_map['results'])} URLs from https://python.langchain.com/",
+        f"✅ Pipeline: Extracted {stats.pages} pages, indexed {stats.indexed_chunks}/{stats.chunks} chunks",
     )
+    return plan, failed_ids
 
-    ##### 2. URL batching
-    #####    Input: list of urls
-    #####    Output: list of batches of urls
-    url_batches = chunk_urls(site_map['results'],
-                             chunk_size=20 # batches of 20
-                             )
-
-    log_info(f"📦 URLs Processing: Split {len(site_map['results'])} URLs into {len(url_batches)} batches",
-             Colors.BLUE,
-             )
 
+@asynccontextmanager
+async def vectorstore_session():
+    """Keep the vectorstore's async client open for the whole run.
 
+    PineconeVectorStore otherwise opens and closes its async index around every
+    aadd_documents call, and the first batch to finish closes the session the
+    concurrent batches are still using ("Session is closed")."""
+    if hasattr(vectorstore, "__aenter__"):
+        async with vectorstore:
+            yield
+    else:
+        yield
 
-    ##### 3. Content Extraction with TavilyExtract
-    #####    Input: list of batches of urls
-    #####    Process: concurrent extraction from web pages
-    #####    Output: clean, parsed content
-    all_docs = await async_extract(url_batches)
 
+# using TavilyMap & TavilyExtract to get more control of scraping
+async def main(resume: bool = False):
+    """Main async function to orchestrate the entire process.
 
+    With `resume`, continue the last run if it didn't finish (see checkpoint.py)."""
 
+    ##### 1. Website discovery with TavilyMap
+    #####    Input: url site
+    #####    Output: list of documentation urls
+    log_header("⚙️ DOCUMENTATION INGESTION PIPELINE ⚙️")
+    stats = PipelineStats()
+
+    # live metrics of a long crawl (only when METRICS_PORT is set)
+    serve_prometheus()
+
+    # batch numbers depend on the url batch size: a resumed run must use the same one
+    resumed = checkpoint.start({"site": SITE_URL, "url_batch_size": URL_BATCH_SIZE}, resume)
+    frontier = URLFrontier(checkpoint.path / "frontier.sqlite", SITE_URL)
+    if resumed:
+        log_info(
+            f"♻️ Checkpoint: resuming the last run with the {len(frontier)} URLs of its frontier",
+            Colors.PURPLE,
+        )
+        replay_chunks = checkpoint.load_replay_chunks()
+        replayed = checkpoint.load_replayed_dead_letters()
+    else:
+        # batches that failed on previous runs are retried along with this run's urls
+        replay_urls, replay_chunks, replayed = replay_dead_letters()
+        frontier.add(replay_urls, mapped=False)
+        # a resumed run replays the same ones (its frontier has the urls)
+        checkpoint.save_replay_chunks(replay_chunks, replayed)
 
-    ##### 4. Chunking the Langchain documentation
-    log_header("⚙️ DOCUMENTATION CHUNKING PHASE ⚙️")
+    ##### 2. URL batching
+    #####    Input: the url frontier, filled by concurrent map calls
+    #####    Output: batches of URL_BATCH_SIZE urls, handed out while the site is still being mapped
     log_info(
-        f"✂️ Text Splitter: Processing {len(all_docs)} documents with 4000 chunk size and 200 overlap",
-        Colors.YELLOW,
-    )
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=4000,
-                                                   chunk_overlap=200)
-    splitted_docs = text_splitter.split_documents(all_docs)
-    log_success(
-        f"✂️ Text Splitter: Created {len(splitted_docs)} chunks from {len(all_docs)} documents",
+        f"🗺️ TavilyMap: Starting to map documentation structure from {SITE_URL} "
+        f"(shards of up to {MAP_LIMIT} URLs)",
+        Colors.PURPLE,
     )
-
-    # 5. Process documents asynchronously
-    await index_documents_async(splitted_docs,
-                                batch_size=500)
+    discovery = asyncio.create_task(discover(SITE_URL, map_shard, frontier, MAP_LIMIT))
+
+    async def site_urls() -> Optional[List[str]]:
+        if not await discovery:
+            log_warning("⚠️ TavilyMap: discovery was incomplete (failed or truncated shards), "
+                        "stale pages are not deleted this run")
+            return None
+        log_success(f"✅ TavilyMap: Successfully mapped {len(frontier.mapped_urls())} URLs from {SITE_URL}")
+        return frontier.mapped_urls()
+
+    ##### 3.-5. Extraction, chunking (only pages that changed since the last run) and indexing
+    text_splitter = make_text_splitter(CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNK_SIZE, CHUNK_OVERLAP)
+    manifest = IngestionManifest(MANIFEST_PATH)
+    ingest = ingest_streaming if INGESTION_MODE == "streaming" else ingest_phased
+    async with vectorstore_session():
+        plan, failed_ids = await ingest(frontier.batches(URL_BATCH_SIZE),
+                                        site_urls,
+                                        replay_chunks,
+                                        text_splitter,
+                                        manifest,
+                                        stats)
+
+        # 6. Remove vectors of deleted pages / truncated pages
+        if plan.stale_ids:
+            with span("delete", chunks=len(plan.stale_ids)):
+                await vectorstore.adelete(ids=plan.stale_ids)
+                keyword_index.delete(plan.stale_ids)
+            log_success(f"🧹 VectorStore: Deleted {len(plan.stale_ids)} stale chunks")
+    for url in plan.deleted_urls:
+        manifest.remove_page(url)
+
+    # 7. Record pages whose new chunks all made it into the vectorstore,
+    #    failed pages stay dirty and are retried on the next run
+    for url, (page_hash, chunk_hashes) in plan.pending_pages.items():
+        if failed_ids.isdisjoint(chunk_hashes):
+            manifest.record_page(url, page_hash, chunk_hashes, deduped=url in plan.deduped_urls)
+    manifest.close()
+    mapped, shards = len(frontier.mapped_urls()), frontier.shard_count()
+    frontier.close()
+    # the replayed batches went through the scheduler again (failing ones were dead-lettered anew)
+    dead_letters.ack(replayed)
+    checkpoint.finish()
+    # cached answers of the chat app may be stale now
+    if stats.indexed_chunks or plan.stale_ids:
+        mark_index_updated()
 
     log_header("🥳🥳🥳 PIPELINE COMPLETE 🥳🥳🥳")
     log_success("🎉 Documentation ingestion pipeline finished successfully!")
     log_info("📊 Summary:", Colors.BOLD)
-    log_info(f"   • URLs mapped: {len(site_map['results'])}")
-    log_info(f"   • Documents extracted: {len(all_docs)}")
-    log_info(f"   • Chunks created: {len(splitted_docs)}")
-
+    log_info(f"   • Mode: {INGESTION_MODE}")
+    log_info(f"   • URLs mapped: {mapped} in {shards} shards ({frontier.duplicates} duplicates, {frontier.rejected} off-site or excluded)")
+    log_info(f"   • Documents extracted: {stats.pages}")
+    log_info(f"   • Chunks upserted: {stats.indexed_chunks}/{stats.chunks}")
+    log_info(f"   • Stale chunks deleted: {len(plan.stale_ids)}")
+    if stats.time_to_first_upsert is not None:
+        log_info(f"   • Time to first upserted vector: {stats.time_to_first_upsert:.1f}s")
+    cache_stats = embeddings.stats()
+    log_info(f"   • Embedding cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses")
+    log_info(f"   • Total time: {time.perf_counter() - stats.started:.1f}s")
+    rss = peak_rss_mb()
+    if rss is not None:
+        log_info(f"   • Peak RSS: {rss:.0f} MB")
+    http_clients.log_pool_stats()
+    log_metrics_summary()
+    write_prometheus()
+    return stats
 
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Ingest the LangChain documentation into the vectorstore")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the last run from its checkpoints if it didn't finish")
+    asyncio.run(main(resume=parser.parse_args().resume))
\ No newline at end of file
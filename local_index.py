@@ -0,0 +1,553 @@
+"""Local, memory-mapped IVF vector index for offline / air-gapped deployments.
+
+IVFIndex keeps unit-normalized float32 vectors in a memory-mapped matrix and
+partitions them into inverted lists around k-means centroids; a query only
+scores the vectors of the `nprobe` lists whose centroids are closest to it.
+Until enough vectors exist to train centroids, search is exact.
+
+LocalVectorStore wraps it as a LangChain VectorStore: ids, texts and metadata
+live in an SQLite table next to the index, adds are upserts by id, deletes
+tombstone rows (compacted once most rows are dead) and metadata filters are
+evaluated in SQLite and searched exactly. It retrains the centroids in a
+background thread, so the ingest batch that crosses the next size does not
+wait for k-means. Compaction and retraining rewrite rows in place, so other
+processes (the app) reopen the index once ingestion bumps the index version
+(backend.answer_cache.mark_index_updated).
+
+With LOCAL_INDEX_QUANTIZATION set, candidates are scored on compressed codes
+instead, and only the best LOCAL_INDEX_RESCORE * k of them are rescored on
+the float32 vectors, which stay on disk (memory-mapped, a few rows read per
+query) instead of in RAM:
+
+    int8    per vector: dim int8 codes + a float32 scale (4x smaller)
+    binary  per vector: dim sign bits + a float32 scale (32x smaller),
+            scored against the float query with a table of its partial
+            sums per byte of bits
+
+Layout of an index directory:
+    vectors.f32      (capacity, dim) float32 matrix
+    assignments.i32  inverted list of every row (-1 = not assigned yet)
+    alive.u8         1 for live rows, 0 for deleted ones
+    codes.i8 / .b1   (capacity, dim) int8 or (capacity, dim / 8) packed sign bits (quantized only)
+    scales.f32       per-row scale of the codes (quantized only)
+    centroids.npy    (nlist, dim) float32
+    index.json       dim, number of rows, size the centroids were trained on, quantization
+    docs.sqlite      id -> row, text, metadata (LocalVectorStore only)
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from backend.answer_cache import IndexVersionWatch
+
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", str(Path(__file__).resolve().parent / ".cache" / "local_index"))
+LOCAL_INDEX_NPROBE = int(os.getenv("LOCAL_INDEX_NPROBE", "8"))
+LOCAL_INDEX_QUANTIZATION = os.getenv("LOCAL_INDEX_QUANTIZATION", "none")  # none, int8 or binary
+LOCAL_INDEX_RESCORE = int(os.getenv("LOCAL_INDEX_RESCORE", "4"))  # candidates rescored exactly, per result
+
+MIN_GROWTH = 1024  # rows added to the memory-mapped files at a time (at least)
+TRAIN_MIN_VECTORS = 1024  # below this many vectors search is exact
+RETRAIN_GROWTH = 4  # retrain once the index is this many times larger than at the last training
+KMEANS_SAMPLE = 20000
+KMEANS_ITERATIONS = 10
+SCORE_BLOCK = 4096  # candidates scored on their codes at a time (bounds the float32 temporaries)
+QUANTIZATIONS = ("none", "int8", "binary")
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def spherical_kmeans(vectors: np.ndarray, n_clusters: int, seed: int = 0) -> np.ndarray:
+    """Unit-norm centroids of `vectors` (cosine k-means)."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        empty = ~sums.any(axis=1)
+        # re-seed empty clusters with random vectors
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+def quantize(vectors: np.ndarray, quantization: str) -> Tuple[np.ndarray, np.ndarray]:
+    """(codes, scales) of unit vectors: x ~ scale * code (int8), or x ~ scale * sign (binary)."""
+    if quantization == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    return np.packbits(vectors > 0, axis=1), np.abs(vectors).mean(axis=1).astype(np.float32)
+
+
+class IVFIndex:
+    def __init__(self,
+                 path: str | Path,
+                 nprobe: int = LOCAL_INDEX_NPROBE,
+                 quantization: str = LOCAL_INDEX_QUANTIZATION,
+                 rescore: int = LOCAL_INDEX_RESCORE):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {quantization!r}, expected none, int8 or binary")
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.nprobe = nprobe
+        self.quantization = quantization
+        self.rescore = rescore
+
+        info_path = self.path / "index.json"
+        info = json.loads(info_path.read_text()) if info_path.exists() else {}
+        self.dim: Optional[int] = info.get("dim")
+        self.n_rows: int = info.get("n_rows", 0)
+        self.trained_on: int = info.get("trained_on", 0)
+
+        centroids_path = self.path / "centroids.npy"
+        self.centroids: Optional[np.ndarray] = np.load(centroids_path) if centroids_path.exists() else None
+
+        self.vectors = self.assignments = self.alive = self.codes = self.scales = None
+        if self.dim is not None and self._capacity():
+            self._map(self._capacity())
+            if info.get("quantization", "none") != quantization and quantization != "none":
+                self._encode(np.arange(self.n_rows))  # opened with another quantization: encode again
+                self.flush()
+        self._rebuild_lists()
+
+    # --- memory-mapped files ----------------------------------------------------
+
+    def _capacity(self) -> int:
+        path = self.path / "alive.u8"
+        return path.stat().st_size if path.exists() else 0
+
+    def _files(self, capacity: int) -> List[Tuple[str, type, Tuple[int, ...]]]:
+        files = [("vectors.f32", np.float32, (capacity, self.dim)),
+                 ("assignments.i32", np.int32, (capacity,)),
+                 ("alive.u8", np.uint8, (capacity,))]
+        if self.quantization == "int8":
+            files += [("codes.i8", np.int8, (capacity, self.dim)), ("scales.f32", np.float32, (capacity,))]
+        elif self.quantization == "binary":
+            files += [("codes.b1", np.uint8, (capacity, (self.dim + 7) // 8)), ("scales.f32", np.float32, (capacity,))]
+        return files
+
+    def _map(self, capacity: int) -> None:
+        """(Re)open the memory maps with room for `capacity` rows."""
+        for name, dtype, shape in self._files(capacity):
+            path = self.path / name
+            if not path.exists():
+                path.touch()
+            size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            if path.stat().st_size < size:
+                with path.open("r+b") as f:
+                    f.truncate(size)
+            setattr(self, name.split(".")[0], np.memmap(path, dtype=dtype, mode="r+", shape=shape))
+
+    def _ensure_capacity(self, n_rows: int) -> None:
+        capacity = len(self.alive) if self.alive is not None else 0
+        if n_rows > capacity:
+            self.flush()
+            self._map(max(n_rows, 2 * capacity, MIN_GROWTH))
+
+    def _save_info(self) -> None:
+        (self.path / "index.json").write_text(json.dumps(
+            {"dim": self.dim, "n_rows": self.n_rows, "trained_on": self.trained_on,
+             "quantization": self.quantization}))
+
+    def flush(self) -> None:
+        for array in (self.vectors, self.assignments, self.alive, self.codes, self.scales):
+            if array is not None:
+                array.flush()
+        self._save_info()
+
+    # --- inverted lists ---------------------------------------------------------
+
+    def _rebuild_lists(self) -> None:
+        """Group row numbers by inverted list (from the persisted assignments)."""
+        if self.centroids is None or not self.n_rows:
+            self.lists = []
+            return
+        assignments = np.asarray(self.assignments[:self.n_rows])
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(len(self.centroids) + 1))
+        self.lists = [order[bounds[i]: bounds[i + 1]] for i in range(len(self.centroids))]
+
+    def _encode(self, rows: np.ndarray) -> None:
+        for start in range(0, len(rows), 10000):
+            batch = rows[start: start + 10000]
+            self.codes[batch], self.scales[batch] = quantize(np.asarray(self.vectors[batch]), self.quantization)
+
+    def _assign(self, rows: np.ndarray) -> None:
+        for start in range(0, len(rows), 10000):
+            batch = rows[start: start + 10000]
+            self.assignments[batch] = np.argmax(self.vectors[batch] @ self.centroids.T, axis=1)
+
+    def training_sample(self) -> Tuple[np.ndarray, int]:
+        """Copy of the live vectors k-means is fitted on, and the number of lists to fit."""
+        live = np.flatnonzero(self.alive[:self.n_rows])
+        rng = np.random.default_rng(0)
+        sample = live if len(live) <= KMEANS_SAMPLE else rng.choice(live, KMEANS_SAMPLE, replace=False)
+        return np.asarray(self.vectors[np.sort(sample)]), max(1, int(np.sqrt(len(live))))
+
+    def use_centroids(self, centroids: np.ndarray) -> None:
+        """Switch to new centroids and reassign every row."""
+        self.centroids = centroids
+        np.save(self.path / "centroids.npy", self.centroids)
+
+        self._assign(np.arange(self.n_rows))
+        self.trained_on = self.n_live
+        self._rebuild_lists()
+        self.flush()
+
+    def train(self) -> None:
+        """Fit centroids on the live vectors and reassign every row."""
+        if not self.n_live:
+            return
+        sample, n_lists = self.training_sample()
+        self.use_centroids(spherical_kmeans(sample, n_lists))
+
+    @property
+    def needs_training(self) -> bool:
+        """Big enough for (new) centroids: TRAIN_MIN_VECTORS, then RETRAIN_GROWTH times the last training."""
+        n_live = self.n_live
+        return n_live >= TRAIN_MIN_VECTORS and n_live >= RETRAIN_GROWTH * self.trained_on
+
+    # --- add / delete / search ------------------------------------------------
+
+    @property
+    def n_live(self) -> int:
+        return int(np.count_nonzero(self.alive[:self.n_rows])) if self.n_rows else 0
+
+    def add(self, vectors: Sequence[Sequence[float]], train: bool = True) -> np.ndarray:
+        """Append vectors, returns their row numbers.
+
+        With `train`, the add that makes the index big enough (see needs_training)
+        runs k-means and reassigns every row before it returns, which takes
+        seconds on a large index. LocalVectorStore passes train=False and
+        trains in the background instead."""
+        vectors = normalize(vectors)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        rows = np.arange(self.n_rows, self.n_rows + len(vectors))
+        self._ensure_capacity(self.n_rows + len(vectors))
+        self.vectors[rows] = vectors
+        if self.quantization != "none":
+            self.codes[rows], self.scales[rows] = quantize(vectors, self.quantization)
+        self.alive[rows] = 1
+        self.assignments[rows] = -1
+        self.n_rows += len(vectors)
+
+        if train and self.needs_training:
+            self.train()
+        elif self.centroids is not None:
+            self._assign(rows)
+            for list_no in np.unique(self.assignments[rows]):
+                new_rows = rows[np.asarray(self.assignments[rows]) == list_no]
+                self.lists[list_no] = np.concatenate([self.lists[list_no], new_rows])
+        self.flush()
+        return rows
+
+    def delete(self, rows: Iterable[int]) -> None:
+        rows = np.fromiter(rows, dtype=np.int64)
+        if len(rows):
+            self.alive[rows] = 0
+            self.alive.flush()
+
+    def compact(self) -> np.ndarray:
+        """Drop deleted rows. Returns old row -> new row (-1 for deleted rows)."""
+        live = np.flatnonzero(self.alive[:self.n_rows])
+        mapping = np.full(self.n_rows, -1, dtype=np.int64)
+        mapping[live] = np.arange(len(live))
+        # live rows only move towards the front, so copying in order is safe
+        for start in range(0, len(live), 10000):
+            batch = live[start: start + 10000]
+            new_rows = mapping[batch]
+            self.vectors[new_rows] = self.vectors[batch]
+            self.assignments[new_rows] = self.assignments[batch]
+            if self.quantization != "none":
+                self.codes[new_rows] = self.codes[batch]
+                self.scales[new_rows] = self.scales[batch]
+        self.alive[:len(live)] = 1
+        self.alive[len(live):self.n_rows] = 0
+        self.n_rows = len(live)
+        # the next retrain is RETRAIN_GROWTH times what is left, not what the index had before the deletes
+        self.trained_on = min(self.trained_on, len(live))
+        self._rebuild_lists()
+        self.flush()
+        return mapping
+
+    def search(self,
+               query: Sequence[float],
+               k: int = 4,
+               nprobe: Optional[int] = None,
+               rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (rows, cosine similarities) for a query vector.
+
+        If `rows` is given (e.g. the rows matching a metadata filter) only those
+        rows are searched, exactly."""
+        if not self.n_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = normalize(query)
+        nprobe = nprobe or self.nprobe
+
+        if rows is not None:
+            candidates = np.asarray(rows, dtype=np.int64)
+        elif self.centroids is None or nprobe >= len(self.centroids):
+            candidates = np.arange(self.n_rows)
+        else:
+            probes = np.argpartition(-(self.centroids @ query), nprobe)[:nprobe]
+            candidates = np.concatenate([self.lists[p] for p in probes])
+        # sorted rows read the memory map sequentially
+        candidates = np.sort(candidates)
+        candidates = candidates[np.asarray(self.alive[candidates], dtype=bool)]
+        if not len(candidates):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        if self.quantization != "none" and len(candidates) > k * self.rescore:
+            # shortlist on the codes, rescore the shortlist on the float32 vectors
+            approximate = self._approximate_scores(candidates, query)
+            shortlist = np.argpartition(-approximate, k * self.rescore - 1)[:k * self.rescore]
+            candidates = np.sort(candidates[shortlist])
+        scores = self.vectors[candidates] @ query
+        top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return candidates[top], scores[top]
+
+
+    def _approximate_scores(self, candidates: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Cosine similarities of `candidates` (sorted rows) estimated from their codes."""
+        scores = np.empty(len(candidates), dtype=np.float32)
+        if self.quantization == "binary":
+            # table[byte position, byte] = sum of the query's components whose bit is set in byte,
+            # so sum(query * sign) = 2 * sum over positions of table[position, code] - sum(query)
+            padded = np.zeros(self.codes.shape[1] * 8, dtype=np.float32)
+            padded[: self.dim] = query
+            byte_bits = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).astype(np.float32)
+            table = padded.reshape(-1, 8) @ byte_bits.T
+            positions = np.arange(self.codes.shape[1])
+        for start in range(0, len(candidates), SCORE_BLOCK):
+            block = candidates[start: start + SCORE_BLOCK]
+            # a run of consecutive rows (full scans) is read as a slice, not gathered
+            rows = slice(block[0], block[-1] + 1) if block[-1] - block[0] + 1 == len(block) else block
+            if self.quantization == "int8":
+                dots = self.codes[rows].astype(np.float32) @ query
+            else:
+                dots = 2 * table[positions, self.codes[rows]].sum(axis=1) - query.sum()
+            scores[start: start + len(block)] = self.scales[rows] * dots
+        return scores
+
+    def nbytes(self) -> Dict[str, int]:
+        """Bytes searches scan (codes and scales, or the vectors) and bytes of the float32 vectors."""
+        n, dim = self.n_rows, self.dim or 0
+        code_bytes = {"none": 4 * dim, "int8": dim + 4, "binary": (dim + 7) // 8 + 4}[self.quantization]
+        return {"searched": n * code_bytes, "float32": n * dim * 4}
+
+
+def _filter_sql(filter: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """WHERE clause for a Pinecone-style metadata filter: {key: value},
+    {key: {"$eq"|"$ne"|"$in"|"$nin": ...}}, combined with AND."""
+    clauses = []
+    params: List[Any] = []
+    for key, condition in filter.items():
+        if not re.fullmatch(r"\w+", key):
+            raise ValueError(f"Unsupported metadata key: {key!r}")
+        field = f"json_extract(metadata, '$.{key}')"
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, value in condition.items():
+            if op in ("$eq", "$ne"):
+                clauses.append(f"{field} {'=' if op == '$eq' else '!='} ?")
+                params.append(value)
+            elif op in ("$in", "$nin"):
+                placeholders = ",".join("?" * len(value))
+                clauses.append(f"{field} {'IN' if op == '$in' else 'NOT IN'} ({placeholders})")
+                params.extend(value)
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+    return " AND ".join(clauses) or "1", params
+
+
+class LocalVectorStore(VectorStore):
+    def __init__(self,
+                 embedding: Embeddings,
+                 index_name: str = "default",
+                 path: str | Path = LOCAL_INDEX_DIR,
+                 nprobe: int = LOCAL_INDEX_NPROBE,
+                 quantization: str = LOCAL_INDEX_QUANTIZATION):
+        self.embedding = embedding
+        self.path = Path(path) / index_name
+        self.index = IVFIndex(self.path, nprobe=nprobe, quantization=quantization)
+        self.index_version = IndexVersionWatch()
+        self.lock = threading.RLock()
+        self._training: Optional[threading.Thread] = None
+        self.conn = sqlite3.connect(self.path / "docs.sqlite", check_same_thread=False)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                id TEXT PRIMARY KEY,
+                row INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS docs_row ON docs (row);
+            """
+        )
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def add_texts(self,
+                  texts: Iterable[str],
+                  metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None,
+                  **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        return self.add_embeddings(texts, self.embedding.embed_documents(texts), metadatas, ids)
+
+    def add_embeddings(self,
+                       texts: List[str],
+                       vectors: List[List[float]],
+                       metadatas: Optional[List[dict]] = None,
+                       ids: Optional[List[str]] = None) -> List[str]:
+        """add_texts with the vectors already computed (see chunk_store.py)."""
+        metadatas = metadatas or [{} for _ in texts]
+        ids = [id_ or str(uuid.uuid4()) for id_ in ids] if ids else [str(uuid.uuid4()) for _ in texts]
+
+        with self.lock, self.conn:
+            # adding an existing id replaces it (upsert)
+            self._delete_rows(ids)
+            rows = self.index.add(vectors, train=False)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO docs (id, row, text, metadata) VALUES (?, ?, ?, ?)",
+                [(id_, int(row), text, json.dumps(metadata))
+                 for id_, row, text, metadata in zip(ids, rows, texts, metadatas)],
+            )
+            if self.index.needs_training and not (self._training and self._training.is_alive()):
+                self._training = threading.Thread(target=self._train, name="local-index-training")
+                self._training.start()
+        return ids
+
+    def _train(self) -> None:
+        """Retrain the index without holding the lock during k-means.
+
+        Adds and searches go on meanwhile (new rows join the old lists or, before
+        the first training, are searched exactly); only the final reassignment
+        of every row holds the lock."""
+        with self.lock:
+            sample, n_lists = self.index.training_sample()
+        centroids = spherical_kmeans(sample, n_lists)
+        with self.lock:
+            self.index.use_centroids(centroids)
+
+    def wait_for_training(self) -> None:
+        """Block until a background retrain (if any) is done."""
+        training = self._training
+        if training is not None:
+            training.join()
+
+    def _delete_rows(self, ids: Sequence[str]) -> int:
+        rows = []
+        for i in range(0, len(ids), 500):
+            batch = list(ids[i: i + 500])
+            rows += [row for (row,) in self.conn.execute(
+                f"SELECT row FROM docs WHERE id IN ({','.join('?' * len(batch))})", batch)]
+            self.conn.execute(f"DELETE FROM docs WHERE id IN ({','.join('?' * len(batch))})", batch)
+        self.index.delete(rows)
+        return len(rows)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if ids is None:
+            return False
+        with self.lock, self.conn:
+            self._delete_rows(ids)
+            # most rows are tombstones: rewrite the index without them
+            if self.index.n_rows > 2 * max(self.index.n_live, MIN_GROWTH):
+                mapping = self.index.compact()
+                self.conn.executemany("UPDATE docs SET row = ? WHERE row = ?",
+                                      [(int(new), int(old)) for old, new in enumerate(mapping) if new >= 0])
+        return True
+
+    def _documents(self, rows: Sequence[int]) -> Dict[int, Document]:
+        if not len(rows):
+            return {}
+        records = self.conn.execute(
+            f"SELECT row, id, text, metadata FROM docs WHERE row IN ({','.join('?' * len(rows))})",
+            [int(row) for row in rows],
+        )
+        return {row: Document(id=id_, page_content=text, metadata=json.loads(metadata))
+                for row, id_, text, metadata in records}
+
+    def reload_if_updated(self) -> None:
+        """Reopen the index if it was re-ingested (by another process)."""
+        with self.lock:
+            if self.index_version.changed():
+                self.index = IVFIndex(self.path, nprobe=self.index.nprobe,
+                                      quantization=self.index.quantization, rescore=self.index.rescore)
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        with self.lock:
+            records = self.conn.execute(
+                f"SELECT id, text, metadata FROM docs WHERE id IN ({','.join('?' * len(ids))})", list(ids))
+            return [Document(id=id_, page_content=text, metadata=json.loads(metadata))
+                    for id_, text, metadata in records]
+
+    def similarity_search_with_score_by_vector(self,
+                                               embedding: List[float],
+                                               k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        with self.lock:
+            self.reload_if_updated()
+            allowed = None
+            if filter:
+                where, params = _filter_sql(filter)
+                allowed = np.fromiter((row for (row,) in self.conn.execute(
+                    f"SELECT row FROM docs WHERE {where}", params)), dtype=np.int64)
+            rows, scores = self.index.search(embedding, k=k, rows=allowed,
+                                             nprobe=kwargs.get("nprobe"))
+            documents = self._documents(rows)
+        return [(documents[int(row)], float(score)) for row, score in zip(rows, scores)
+                if int(row) in documents]
+
+    def similarity_search_with_score(self,
+                                     query: str,
+                                     k: int = 4,
+                                     filter: Optional[Dict[str, Any]] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(
+            self.embedding.embed_query(query), k=k, filter=filter, **kwargs)
+
+    def similarity_search_by_vector(self,
+                                    embedding: List[float],
+                                    k: int = 4,
+                                    **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        # scores are cosine similarities in [-1, 1]
+        return lambda score: (score + 1) / 2
+
+    @classmethod
+    def from_texts(cls,
+                   texts: List[str],
+                   embedding: Embeddings,
+                   metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None,
+                   **kwargs: Any) -> "LocalVectorStore":
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
@@ -1,3 +1,41 @@
+"""Colored console logging, plus structured events and metrics.
+
+When LOG_JSONL_PATH is set (e.g. LOG_JSONL_PATH=.cache/logs/events.jsonl for an
+ingestion run), every log_* call is also appended to it as a JSON line, along
+with the events of the metrics below, so a long run can be analysed afterwards
+without re-running it (the file is not rotated: leave it unset for the app and
+the API):
+
+    with span("extract", batch=3):      # timed phase -> phase_seconds{phase="extract"}
+        ...
+    count("retries_total", provider="openai")
+    observe("batch_seconds", 1.7, provider="openai")
+
+metrics.prometheus_text() renders every counter / histogram in the Prometheus
+text format; it is written to METRICS_PROM_PATH (if set) by write_prometheus(),
+e.g. for node_exporter's textfile collector, and served on METRICS_HOST:METRICS_PORT
+(if the port is set; localhost only by default) by serve_prometheus().
+"""
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+LOG_JSONL_PATH = os.getenv("LOG_JSONL_PATH", "")
+METRICS_PROM_PATH = os.getenv("METRICS_PROM_PATH", "")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # 0.0.0.0 to let a remote Prometheus scrape
+
+# histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, math.inf)
+
+
 # color codes for better logging
 class Colors:
     PURPLE = '\033[95m'
@@ -15,25 +53,225 @@ class Colors:
 def log_info(message: str, color: str = Colors.CYAN):
     """Log info message with color"""
     print(f"{color}📝  {message}{Colors.END}")
+    write_event("log", level="info", message=message)
 
 
 def log_success(message: str):
     """Log success message is green"""
     print(f"{Colors.GREEN}✅  {message}{Colors.END}")
+    write_event("log", level="success", message=message)
 
 
 def log_error(message: str):
     """Log error message is red"""
     print(f"{Colors.RED}❌  {message}{Colors.END}")
+    write_event("log", level="error", message=message)
 
 
 def log_warning(message: str):
     """Log warning message is yellow"""
     print(f"{Colors.YELLOW}⚠️  {message}{Colors.END}")
+    write_event("log", level="warning", message=message)
 
 
 def log_header(message: str):
     """Log warning message with emphasis"""
     print(f"\n{Colors.BOLD}{Colors.PURPLE}{'='*60}{Colors.END}")
     print(f"{Colors.BOLD}{Colors.PURPLE}🚀  {message}{Colors.END}")
-    print(f"{Colors.BOLD}{Colors.PURPLE}{'='*60}{Colors.END}")
\ No newline at end of file
+    print(f"{Colors.BOLD}{Colors.PURPLE}{'='*60}{Colors.END}")
+    write_event("log", level="header", message=message)
+
+
+# --- structured events ----------------------------------------------------------
+
+_events_lock = threading.Lock()
+_events_file = None
+
+
+def write_event(event: str, **fields: Any) -> None:
+    """Append one JSON line {"ts", "event", ...fields} to LOG_JSONL_PATH (if set)."""
+    global _events_file
+    if not LOG_JSONL_PATH:
+        return
+    line = json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, default=str)
+    with _events_lock:
+        if _events_file is None:
+            Path(LOG_JSONL_PATH).parent.mkdir(parents=True, exist_ok=True)
+            _events_file = open(LOG_JSONL_PATH, "a", encoding="utf-8", buffering=1)  # line buffered
+        _events_file.write(line + "\n")
+
+
+# --- metrics --------------------------------------------------------------------
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (capped at the max seen)."""
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics:
+    """Process-wide counters and histograms, keyed by name and labels."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+
+    def count(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self.lock:
+            self.histograms.setdefault(name, {}).setdefault(key, Histogram()).observe(value)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """One row per histogram series: count, total, p50, p95, max."""
+        with self.lock:
+            return [{"name": name, **dict(key), "count": h.count, "total": h.sum,
+                     "p50": h.quantile(0.5), "p95": h.quantile(0.95), "max": h.max}
+                    for name, series in sorted(self.histograms.items())
+                    for key, h in sorted(series.items())]
+
+    def prometheus_text(self) -> str:
+        def fmt(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = key + extra
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                lines += [f"{name}{fmt(key)} {value:g}" for key, value in sorted(series.items())]
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in sorted(series.items()):
+                    cumulative = 0
+                    for bound, n in zip(h.buckets, h.counts):
+                        cumulative += n
+                        le = "+Inf" if bound == math.inf else f"{bound:g}"
+                        lines.append(f"{name}_bucket{fmt(key, (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{fmt(key)} {h.sum:g}")
+                    lines.append(f"{name}_count{fmt(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def count(name: str, value: float = 1, **labels: Any) -> None:
+    """Increment a counter (and record it as an event)."""
+    metrics.count(name, value, **labels)
+    write_event("count", name=name, value=value, **labels)
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    """Record a value (usually seconds) in a histogram."""
+    metrics.observe(name, value, **labels)
+    write_event("observe", name=name, value=round(value, 6), **labels)
+
+
+@contextmanager
+def span(phase: str, **fields: Any) -> Iterator[Dict[str, Any]]:
+    """Time a phase (works around awaits too).
+
+    The duration goes to the phase_seconds{phase=...} histogram, failures to
+    phase_errors_total; `fields` (batch numbers, sizes, ...) only go to the
+    JSON event, so they don't multiply the metric series. Fields added to the
+    yielded dict inside the block are recorded too."""
+    extra: Dict[str, Any] = {}
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield extra
+    except BaseException as e:
+        status = "error"
+        extra["error"] = f"{type(e).__name__}: {e}"[:500]
+        metrics.count("phase_errors_total", phase=phase)
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        metrics.observe("phase_seconds", seconds, phase=phase)
+        write_event("span", phase=phase, seconds=round(seconds, 6), status=status, **fields, **extra)
+
+
+def log_metrics_summary() -> None:
+    """Print the per-phase / per-provider timings collected so far."""
+    rows = metrics.summary()
+    if not rows:
+        return
+    log_info("⏱️ Timings:", Colors.BOLD)
+    for row in rows:
+        labels = ", ".join(f"{k}={v}" for k, v in row.items()
+                           if k not in ("name", "count", "total", "p50", "p95", "max"))
+        log_info(f"   • {row['name']}{{{labels}}}: {row['count']} x, total {row['total']:.1f}s, "
+                 f"p50 ≤{row['p50']:.2f}s, p95 ≤{row['p95']:.2f}s, max {row['max']:.2f}s")
+    write_event("summary", rows=rows)
+
+
+def write_prometheus(path: str = METRICS_PROM_PATH) -> None:
+    """Write the metrics in the Prometheus text format (atomically, for textfile collectors)."""
+    if not path:
+        return
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(path + ".tmp")
+    tmp.write_text(metrics.prometheus_text(), encoding="utf-8")
+    tmp.replace(path)
+
+
+def serve_prometheus(port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    """Serve GET /metrics on a background thread (no-op when port is 0)."""
+    if not port:
+        return None
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -1,16 +1,22 @@
-from backend.core import run_llm
+import io
+
+# cheap to import: LangChain, OpenAI and Pinecone are loaded when the chain is built (warm_up)
+from backend.core import source_urls, stream_llm, warm_up
 import streamlit as st
 from typing import Set
-from PIL import Image, ImageDraw, ImageFont
 
 
+# Streamlit reruns this script on every interaction: draw the picture once per name
+@st.cache_data
 def create_profile_image(
     name: str,
     size: tuple = (200, 200),
     bg_color: str = "#EE4C2C",
     text_color: str = "white",
-):
-    """Create a profile image with initials."""
+) -> bytes:
+    """Create a profile image with initials (PNG bytes)."""
+    from PIL import Image, ImageDraw, ImageFont
+
     # Create a new image with a background color
     img = Image.new("RGB", size, bg_color)
     draw = ImageDraw.Draw(img)
@@ -40,7 +46,9 @@ def create_profile_image(
     # Draw the text
     draw.text((x, y), initials, fill=text_color, font=font)
 
-    return img
+    png = io.BytesIO()
+    img.save(png, format="PNG")
+    return png.getvalue()
 
 
 # Add sidebar with user information
@@ -104,25 +112,30 @@ def create_sources_string(source_urls: Set[str]) -> str:
 
 
 if submit_button and prompt:
-    with st.spinner("Generating response..."):
-        generated_response = run_llm(
-            query=prompt,
-            chat_history=st.session_state["chat_history"],
-        )
-
-        # extract URLs
-        sources = set(
-            [doc.metadata["source"] for doc in generated_response["source_documents"]]
-        )
-
-        formatted_response = (
-            f"{generated_response['result']} \n\n {create_sources_string(sources)}"
-        )
-
-        st.session_state["user_prompt_history"].append(prompt)
-        st.session_state["chat_answer_history"].append(formatted_response)
-        st.session_state["chat_history"].append(("human", prompt))
-        st.session_state["chat_history"].append(("ai", generated_response["result"]))
+    # show the answer token by token while it is being generated
+    placeholder = st.empty()
+    placeholder.markdown("_Retrieving documents..._")
+    sources = set()
+    answer = ""
+    for chunk in stream_llm(
+        query=prompt,
+        chat_history=st.session_state["chat_history"],
+    ):
+        if "source_documents" in chunk:
+            # extract URLs (from the local chunk store's index)
+            sources = source_urls(chunk["source_documents"])
+        if "answer" in chunk:
+            answer += chunk["answer"]
+            placeholder.markdown(answer + "▌")
+    # the finished answer is rendered with the rest of the history below
+    placeholder.empty()
+
+    formatted_response = f"{answer} \n\n {create_sources_string(sources)}"
+
+    st.session_state["user_prompt_history"].append(prompt)
+    st.session_state["chat_answer_history"].append(formatted_response)
+    st.session_state["chat_history"].append(("human", prompt))
+    st.session_state["chat_history"].append(("ai", answer))
 
 if st.session_state["chat_answer_history"]:
     for generated_response, user_query in zip(
@@ -130,3 +143,7 @@ if st.session_state["chat_answer_history"]:
     ):
         st.chat_message("user").write(user_query)
         st.chat_message("assistant").write(generated_response)
+
+# build the retrieval chain once per process, after the page is drawn (a first
+# submit builds it anyway); later reruns reuse it
+warm_up()
@@ -0,0 +1,100 @@
+"""Local SQLite manifest of what has already been ingested into the vector store.
+
+It stores a content hash per page URL and per chunk, so a re-sync only has to
+embed chunks that actually changed and can delete chunks of pages that are gone.
+A page recorded as `deduped` had content left out as a near-duplicate of
+another page's: that decision only holds while the other page is indexed as
+it was, so such a page is never up to date and is planned again every run.
+"""
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+
+def content_hash(text: str) -> str:
+    """sha256 of a text, hex encoded."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(url: str, index: int) -> str:
+    """Stable vector id for the `index`-th chunk of a page.
+
+    The id only depends on the page URL and the chunk position, so a chunk whose
+    text changed is upserted over its old vector instead of creating a duplicate.
+    """
+    return f"{content_hash(url)[:32]}-{index}"
+
+
+class IngestionManifest:
+    def __init__(self, path: str | Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                content_hash TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_url ON chunks (url);
+            """
+        )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(pages)")}
+        if "deduped" not in columns:  # manifests written before near-duplicate elimination
+            with self.conn:
+                self.conn.execute("ALTER TABLE pages ADD COLUMN deduped INTEGER NOT NULL DEFAULT 0")
+
+    def page_hash(self, url: str) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT content_hash FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def up_to_date(self, url: str, page_hash: str) -> bool:
+        """Whether the page was indexed in full with this content (see `deduped`)."""
+        row = self.conn.execute(
+            "SELECT content_hash, deduped FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        return row is not None and row[0] == page_hash and not row[1]
+
+    def chunk_hashes(self, url: str) -> Dict[str, str]:
+        """Map chunk id -> content hash for every chunk recorded for a page."""
+        rows = self.conn.execute(
+            "SELECT id, content_hash FROM chunks WHERE url = ?", (url,)
+        )
+        return dict(rows.fetchall())
+
+    def known_urls(self) -> Set[str]:
+        return {row[0] for row in self.conn.execute("SELECT url FROM pages")}
+
+    def record_page(self, url: str, page_hash: str, chunks: Dict[str, str], deduped: bool = False) -> None:
+        """Replace everything known about a page once its chunks are indexed.
+
+        `deduped`: some of its content was left out as a near-duplicate."""
+        with self.conn:
+            self.conn.execute("DELETE FROM chunks WHERE url = ?", (url,))
+            self.conn.executemany(
+                "INSERT INTO chunks (id, url, content_hash) VALUES (?, ?, ?)",
+                [(id_, url, hash_) for id_, hash_ in chunks.items()],
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (url, content_hash, deduped) VALUES (?, ?, ?)",
+                (url, page_hash, int(deduped)),
+            )
+
+    def remove_page(self, url: str) -> List[str]:
+        """Forget a page and return the chunk ids that belonged to it."""
+        ids = list(self.chunk_hashes(url))
+        with self.conn:
+            self.conn.execute("DELETE FROM chunks WHERE url = ?", (url,))
+            self.conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+        return ids
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,149 @@
+"""Streaming extract -> chunk -> embed/upsert pipeline connected by bounded queues.
+
+Instead of running phase by phase (all pages, then all chunks, then indexing),
+every extracted batch is chunked as soon as it lands and chunks are indexed as
+soon as a full batch of them is ready. The queues are bounded, so a slow stage
+applies backpressure to the stages before it and peak memory stays flat
+instead of growing with the size of the site.
+
+The stages are plain callables, so the same pipeline runs against the real
+Tavily / OpenAI / Pinecone clients (ingestion2.py) or the fake server
+(benchmarks/bench_streaming.py).
+"""
+import asyncio
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterable, Awaitable, Callable, List, Optional, Sequence, Tuple, Union
+
+# sentinel telling the next stage that no more items will come
+DONE = object()
+
+
+@dataclass
+class PipelineStats:
+    started: float = field(default_factory=time.perf_counter)
+    first_upsert: Optional[float] = None
+    pages: int = 0
+    chunks: int = 0
+    indexed_chunks: int = 0
+    failed_batches: int = 0
+
+    def mark_upsert(self, n_chunks: int) -> None:
+        if self.first_upsert is None:
+            self.first_upsert = time.perf_counter()
+        self.indexed_chunks += n_chunks
+
+    @property
+    def time_to_first_upsert(self) -> Optional[float]:
+        """Seconds from the start of the run to the first upserted vector."""
+        return None if self.first_upsert is None else self.first_upsert - self.started
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB (None if it can't be read)."""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD),
+                        ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t),
+                        ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t),
+                        ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize / 1024 / 1024
+
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+async def run_streaming(url_batches: Union[Sequence[List[str]], AsyncIterable[Tuple[int, List[str]]]],
+                        extract: Callable[[List[str], int], Awaitable[Optional[List[Any]]]],
+                        split: Callable[[List[Any]], List[Any]],
+                        index: Callable[[List[Any], int], Awaitable[bool]],
+                        batch_size: int = 500,
+                        queue_size: int = 4,
+                        extract_workers: int = 8,
+                        index_workers: int = 4,
+                        stats: Optional[PipelineStats] = None) -> PipelineStats:
+    """Run extract -> split -> index concurrently, connected by bounded queues.
+
+    url_batches is a list of URL batches, or an async iterable of (batch number,
+    URLs) that is still being filled (the URL frontier during discovery).
+    extract(urls, batch_num) returns the pages of a URL batch (None if it failed),
+    split(pages) returns the chunks to index for those pages, and
+    index(chunks, batch_num) returns whether the chunk batch was upserted.
+    At most `queue_size` page batches and `queue_size` chunk batches are buffered."""
+    stats = stats or PipelineStats()
+    batches_queue: asyncio.Queue = asyncio.Queue(maxsize=extract_workers)
+    pages_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    chunks_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    async def feed_stage():
+        if hasattr(url_batches, "__aiter__"):
+            async for batch in url_batches:
+                await batches_queue.put(batch)
+        else:
+            for batch in enumerate(url_batches, start=1):
+                await batches_queue.put(batch)
+        for _ in range(extract_workers):
+            await batches_queue.put(DONE)
+
+    async def extract_worker():
+        while (batch := await batches_queue.get()) is not DONE:
+            batch_num, urls = batch
+            pages = await extract(urls, batch_num)
+            if pages is None:
+                stats.failed_batches += 1
+                continue
+            stats.pages += len(pages)
+            # blocks while the splitter is behind (backpressure)
+            await pages_queue.put(pages)
+
+    async def extract_stage():
+        await asyncio.gather(*(extract_worker() for _ in range(extract_workers)))
+        await pages_queue.put(DONE)
+
+    async def split_stage():
+        buffer: List[Any] = []
+        while (pages := await pages_queue.get()) is not DONE:
+            buffer.extend(split(pages))
+            while len(buffer) >= batch_size:
+                await chunks_queue.put(buffer[:batch_size])
+                del buffer[:batch_size]
+        if buffer:
+            await chunks_queue.put(buffer)
+        for _ in range(index_workers):
+            await chunks_queue.put(DONE)
+
+    batch_counter = 0
+
+    async def index_worker():
+        nonlocal batch_counter
+        while (chunks := await chunks_queue.get()) is not DONE:
+            batch_counter += 1
+            stats.chunks += len(chunks)
+            if await index(chunks, batch_counter):
+                stats.mark_upsert(len(chunks))
+            else:
+                stats.failed_batches += 1
+
+    await asyncio.gather(feed_stage(),
+                         extract_stage(),
+                         split_stage(),
+                         *(index_worker() for _ in range(index_workers)))
+    return stats
@@ -0,0 +1,226 @@
+"""Shared scheduler for the Tavily / OpenAI / Pinecone calls made during ingestion.
+
+Each provider gets
+  - a concurrency cap that adapts with AIMD (additive increase on success,
+    multiplicative decrease whenever the provider answers 429),
+  - a token bucket limiting how many requests per second are started,
+  - retries with exponential back-off and full jitter.
+
+Batches that still fail after all retries are appended to a dead-letter JSONL
+file, so a later run can replay them instead of silently dropping them.
+"""
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from logger import count, log_error, log_warning, observe
+
+
+@dataclass
+class ProviderLimits:
+    max_concurrency: int = 8  # hard cap on in-flight requests
+    min_concurrency: int = 1
+    requests_per_second: float = 5.0  # token bucket refill rate
+    burst: int = 10  # token bucket capacity
+    max_retries: int = 5
+    base_delay: float = 1.0  # first back-off, doubled on every retry
+    max_delay: float = 60.0
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Best-effort detection of an HTTP 429 across the different client libraries."""
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    response = getattr(error, "response", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None) or getattr(response, "status", None)
+    if status == 429:
+        return True
+    message = str(error).lower()
+    return "429" in message or "rate limit" in message or "too many requests" in message
+
+
+class _LoopBound:
+    """An asyncio primitive created inside the running loop, on first use.
+
+    The scheduler can then be built at import time (ingestion2.py does) and
+    used from any later asyncio.run()."""
+
+    def __init__(self, factory: Callable[[], Any]):
+        self.factory = factory
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.value: Any = None
+
+    def get(self) -> Any:
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop, self.value = loop, self.factory()
+        return self.value
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = _LoopBound(asyncio.Lock)
+
+    async def acquire(self) -> None:
+        async with self._lock.get():
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AdaptiveLimiter:
+    """Concurrency limit driven by AIMD: +1 per success, halved on every 429."""
+
+    def __init__(self, limits: ProviderLimits):
+        self.limits = limits
+        self.limit = float(limits.max_concurrency)
+        self.in_flight = 0
+        self._condition = _LoopBound(asyncio.Condition)
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        return self._condition.get()
+
+    async def __aenter__(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    async def on_success(self) -> None:
+        async with self.condition:
+            # additive increase, spread over a window of `limit` successes
+            self.limit = min(self.limits.max_concurrency, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+    async def on_rate_limited(self) -> None:
+        async with self.condition:
+            self.limit = max(self.limits.min_concurrency, self.limit / 2)
+
+
+def dead_letter_key(record: Dict[str, Any]) -> str:
+    return f"{record['provider']}:{record['batch_id']}:{record['failed_at']!r}"
+
+
+class DeadLetterQueue:
+    """JSONL file of batches that failed for good.
+
+    Records are appended on failure and removed only once a replay of them
+    succeeded (ack), so a run that crashes while replaying loses none."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+
+    def append(self, provider: str, batch_id: str, payload: Any, error: BaseException) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        record = {
+            "provider": provider,
+            "batch_id": batch_id,
+            "payload": payload,
+            "error": repr(error),
+            "failed_at": time.time(),
+        }
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def pending(self, provider: Optional[str] = None) -> List[Dict[str, Any]]:
+        """The dead letters (of one provider, or all of them), left in the file."""
+        if not self.path.exists():
+            return []
+        records = [json.loads(line)
+                   for line in self.path.read_text(encoding="utf-8").splitlines() if line]
+        return [r for r in records if provider is None or r["provider"] == provider]
+
+    def ack(self, keys: Iterable[str]) -> int:
+        """Remove the dead letters with these keys (see dead_letter_key) once they were replayed.
+
+        Returns how many were removed."""
+        keys = set(keys)
+        if not keys or not self.path.exists():
+            return 0
+        records = self.pending()
+        kept = [r for r in records if dead_letter_key(r) not in keys]
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text("".join(json.dumps(r) + "\n" for r in kept), encoding="utf-8")
+        tmp.replace(self.path)
+        return len(records) - len(kept)
+
+
+class Scheduler:
+    def __init__(self,
+                 limits: Dict[str, ProviderLimits],
+                 dead_letters: Optional[DeadLetterQueue] = None):
+        self.limits = limits
+        self.limiters = {name: AdaptiveLimiter(l) for name, l in limits.items()}
+        self.buckets = {name: TokenBucket(l.requests_per_second, l.burst)
+                        for name, l in limits.items()}
+        self.dead_letters = dead_letters
+        self.stats = {name: {"calls": 0, "retries": 0, "rate_limited": 0, "dead_lettered": 0}
+                      for name in limits}
+
+    async def run(self,
+                  provider: str,
+                  fn: Callable[[], Awaitable[Any]],
+                  batch_id: str = "",
+                  payload: Any = None) -> Any:
+        """Run `fn` under the provider's limits, retrying with jitter.
+
+        Returns the result, or None once the batch has been dead-lettered."""
+        limits = self.limits[provider]
+        limiter = self.limiters[provider]
+        stats = self.stats[provider]
+
+        for attempt in range(limits.max_retries + 1):
+            await self.buckets[provider].acquire()
+            async with limiter:
+                stats["calls"] += 1
+                started = time.perf_counter()
+                try:
+                    result = await fn()
+                except Exception as e:
+                    error = e
+                else:
+                    await limiter.on_success()
+                    observe("batch_seconds", time.perf_counter() - started, provider=provider)
+                    return result
+
+            count("batch_errors_total", provider=provider)
+            if is_rate_limit_error(error):
+                stats["rate_limited"] += 1
+                count("rate_limited_total", provider=provider)
+                await limiter.on_rate_limited()
+            if attempt == limits.max_retries:
+                break
+
+            stats["retries"] += 1
+            count("retries_total", provider=provider)
+            # exponential back-off with full jitter
+            delay = random.uniform(0, min(limits.max_delay, limits.base_delay * 2 ** attempt))
+            log_warning(f"{provider}: batch {batch_id} failed ({error}), "
+                        f"retry {attempt + 1}/{limits.max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+        log_error(f"{provider}: batch {batch_id} failed after {limits.max_retries} retries - {error}")
+        stats["dead_lettered"] += 1
+        count("dead_letters_total", provider=provider)
+        if self.dead_letters is not None:
+            self.dead_letters.append(provider, batch_id, payload, error)
+        return None
@@ -0,0 +1,13 @@
+import pytest
+import tiktoken
+
+
+@pytest.fixture(scope="session")
+def byte_encoding() -> tiktoken.Encoding:
+    """A tiktoken encoding with one token per byte and an <|endoftext|> special token.
+
+    Built in memory: the real vocabularies are downloaded on first use."""
+    return tiktoken.Encoding(name="test-bytes",
+                             pat_str=r"\S+|\s+",
+                             mergeable_ranks={bytes([i]): i for i in range(256)},
+                             special_tokens={"<|endoftext|>": 256})
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from backend import answer_cache
+from backend.answer_cache import AnswerCache
+
+HISTORY = [("human", "What is LCEL?"), ("ai", "A way to compose chains.")]
+
+
+@pytest.fixture(autouse=True)
+def index_version_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(answer_cache, "INDEX_VERSION_PATH", tmp_path / "index_version")
+
+
+def answer(text: str) -> dict:
+    return {"query": "q", "result": text, "source_documents": []}
+
+
+def test_hit_on_a_similar_question_with_the_same_history():
+    cache = AnswerCache(threshold=0.95)
+    cache.store([1.0, 0.0, 0.0], HISTORY, answer("A"))
+
+    assert cache.lookup([0.99, 0.05, 0.0], HISTORY)["result"] == "A"
+    # case and whitespace don't make a different history
+    assert cache.lookup([1.0, 0.0, 0.0], [("human", "what is  LCEL?"), ("ai", "a way to compose chains.")])
+    assert cache.lookup([0.0, 1.0, 0.0], HISTORY) is None
+    assert cache.lookup([1.0, 0.0, 0.0], []) is None
+    assert cache.stats()["hits"] == 2
+
+
+def test_answers_are_copied_in_and_out():
+    cache = AnswerCache()
+    stored = answer("A")
+    cache.store([1.0, 0.0], [], stored)
+    stored["result"] = "changed by the caller"
+    cache.lookup([1.0, 0.0], [])["result"] = "changed again"
+
+    assert cache.lookup([1.0, 0.0], [])["result"] == "A"
+
+
+def test_entries_expire():
+    cache = AnswerCache(ttl=0.01)
+    cache.store([1.0, 0.0], [], answer("A"))
+    time.sleep(0.02)
+
+    assert cache.lookup([1.0, 0.0], []) is None
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = AnswerCache(max_entries=2)
+    cache.store([1.0, 0.0, 0.0], [], answer("A"))
+    cache.store([0.0, 1.0, 0.0], [], answer("B"))
+    cache.lookup([1.0, 0.0, 0.0], [])  # A is now more recent than B
+    cache.store([0.0, 0.0, 1.0], [], answer("C"))
+
+    assert cache.lookup([1.0, 0.0, 0.0], [])["result"] == "A"
+    assert cache.lookup([0.0, 1.0, 0.0], []) is None
+    assert cache.stats()["entries"] == 2
+
+
+def test_cleared_once_the_index_is_updated():
+    cache = AnswerCache(version_check_seconds=0)
+    cache.store([1.0, 0.0], [], answer("A"))
+    answer_cache.mark_index_updated()
+
+    assert cache.lookup([1.0, 0.0], []) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_index_version_is_checked_at_most_every_few_seconds():
+    cache = AnswerCache(version_check_seconds=60)
+    cache.store([1.0, 0.0], [], answer("A"))
+    answer_cache.mark_index_updated()
+
+    assert cache.lookup([1.0, 0.0], [])["result"] == "A"
@@ -0,0 +1,125 @@
+import pytest
+from langchain_core.documents import Document
+
+import bm25_index
+from bm25_index import BM25Index, tokenize
+
+
+def docs(*texts: str, start: int = 0):
+    return [Document(id=str(start + i), page_content=text) for i, text in enumerate(texts)]
+
+
+def test_tokenize_splits_identifiers():
+    tokens = tokenize("Use the RecursiveCharacterTextSplitter, or split_text()")
+    assert "recursivecharactertextsplitter" in tokens
+    assert {"recursive", "character", "text", "splitter", "split_text", "split"} <= set(tokens)
+    assert "the" not in tokens
+
+
+def test_finds_an_identifier(tmp_path):
+    index = BM25Index(path=tmp_path)
+    index.add_documents(docs("Chains are built with LCEL.",
+                             "RecursiveCharacterTextSplitter splits text by characters.",
+                             "Retrievers return documents."))
+
+    assert index.similarity_search("text splitter", k=1)[0].id == "1"
+    assert index.similarity_search("nothing matches this", k=1) == []
+
+
+def test_adding_an_id_again_replaces_it(tmp_path):
+    index = BM25Index(path=tmp_path)
+    index.add_documents(docs("old text about retrievers"))
+    index.add_documents(docs("new text about chains"))
+
+    assert len(index) == 1
+    assert index.similarity_search("retrievers") == []
+    assert index.similarity_search("chains")[0].page_content == "new text about chains"
+
+
+def test_deleted_documents_stop_counting_before_a_merge(tmp_path):
+    index = BM25Index(path=tmp_path)
+    index.add_documents(docs("pinecone index", "pinecone upsert", "chroma collection"))
+    index.delete(["0", "1"])
+
+    assert index.n_docs == 1
+    assert index.df["pinecone"] == 0
+    assert index._total_length == len(tokenize("chroma collection"))
+    assert index.search("pinecone") == []
+
+
+def test_statistics_match_a_reopened_index(tmp_path):
+    index = BM25Index(path=tmp_path)
+    for batch in range(3):
+        index.add_documents(docs(*(f"batch {batch} chunk {i} about RunnableLambda" for i in range(5)),
+                                 start=batch * 3))
+    index.delete(["4", "5"])
+
+    reopened = BM25Index(path=tmp_path)
+    assert reopened.n_docs == index.n_docs
+    assert reopened._total_length == pytest.approx(index._total_length)
+    assert +reopened.df == +index.df
+    assert reopened.search("runnable lambda chunk 2", k=5) == index.search("runnable lambda chunk 2", k=5)
+
+
+def test_merges_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(bm25_index, "MAX_SEGMENTS", 2)
+    index = BM25Index(path=tmp_path)
+    for i in range(4):
+        index.add_documents(docs(f"document number {i} about embeddings", start=i))
+    index.delete(["0"])
+    scores = index.search("embeddings", k=4)
+    index.merge()
+
+    assert len(index.segments) == 1
+    assert index.search("embeddings", k=4) == scores
+    assert {doc.id for doc in index.similarity_search("embeddings", k=4)} == {"1", "2", "3"}
+
+
+def test_an_interrupted_merge_keeps_the_old_segments(tmp_path, monkeypatch):
+    index = BM25Index(path=tmp_path)
+    for i in range(3):
+        index.add_documents(docs(f"document number {i} about embeddings", start=i))
+
+    def crash(self):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(bm25_index.BM25Index, "_save_segment_names", crash)
+    with pytest.raises(KeyboardInterrupt):
+        index.merge()
+    monkeypatch.undo()
+
+    reopened = BM25Index(path=tmp_path)
+    assert len(reopened.segments) == 3
+    assert {doc.id for doc in reopened.similarity_search("embeddings", k=5)} == {"0", "1", "2"}
+    reopened.add_documents(docs("one more about embeddings", start=3))
+    assert sorted(p.name for p in (tmp_path / "default").glob("seg-*")) == \
+        sorted(segment.path.name for segment in reopened.segments)
+
+
+def test_recovers_a_merge_left_behind_by_older_versions(tmp_path):
+    index = BM25Index(path=tmp_path)
+    index.add_documents(docs("chroma collection", "pinecone index"))
+    index.close()
+    directory = tmp_path / "default"
+    (directory / "segments.json").unlink()
+    [segment] = directory.glob("seg-*")
+    segment.rename(segment.with_name(segment.name + ".merged"))  # crashed after removing the old segments
+
+    assert {doc.id for doc in BM25Index(path=tmp_path).similarity_search("pinecone chroma", k=5)} == {"0", "1"}
+
+
+def test_reloads_once_the_index_is_updated(tmp_path, monkeypatch):
+    from backend import answer_cache
+
+    monkeypatch.setattr(answer_cache, "INDEX_VERSION_PATH", tmp_path / "index_version")
+    reader = BM25Index(path=tmp_path)
+    reader.index_version.check_seconds = 0
+    writer = BM25Index(path=tmp_path)
+    for i in range(4):
+        writer.add_documents(docs(f"document number {i} about embeddings", start=i))
+    writer.delete(["0"])
+    writer.merge()
+    assert reader.search("embeddings") == []
+
+    answer_cache.mark_index_updated()
+    assert {doc.id for doc in reader.similarity_search("embeddings", k=5)} == {"1", "2", "3"}
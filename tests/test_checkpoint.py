@@ -0,0 +1,53 @@
+from langchain_core.documents import Document
+
+from checkpoint import RunCheckpoint
+
+PARAMS = {"site": "https://docs.example.com", "url_batch_size": 20}
+
+
+def pages(*urls: str):
+    return [Document(page_content=f"content of {url}", metadata={"source": url}) for url in urls]
+
+
+def interrupted_run(path):
+    """A run that extracted two batches and committed one index batch before it crashed."""
+    checkpoint = RunCheckpoint(path)
+    assert not checkpoint.start(PARAMS, resume=True)
+    checkpoint.save_extract(0, pages("https://docs.example.com/a"))
+    checkpoint.save_extract(1, pages("https://docs.example.com/b"))
+    checkpoint.record_indexed(0, {"a#0": "hash-a0", "a#1": "hash-a1"})
+    with open(path / "indexed.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"batch": 1, "chunks": {"b#0": "ha')  # cut short by the crash
+
+
+def test_resume_picks_up_completed_work(tmp_path):
+    interrupted_run(tmp_path)
+
+    checkpoint = RunCheckpoint(tmp_path)
+    assert checkpoint.start(PARAMS, resume=True)
+    assert checkpoint.committed == {"a#0": "hash-a0", "a#1": "hash-a1"}
+    assert [page.metadata["source"] for page in checkpoint.load_extract(1)] == ["https://docs.example.com/b"]
+    assert checkpoint.load_extract(2) is None
+
+
+def test_without_resume_or_with_other_parameters_the_run_starts_over(tmp_path):
+    interrupted_run(tmp_path)
+    assert not RunCheckpoint(tmp_path).start({**PARAMS, "url_batch_size": 50}, resume=True)
+
+    interrupted_run(tmp_path)
+    checkpoint = RunCheckpoint(tmp_path)
+    assert not checkpoint.start(PARAMS, resume=False)
+    assert checkpoint.committed == {} and checkpoint.load_extract(0) is None
+
+
+def test_a_finished_run_is_not_resumed(tmp_path):
+    interrupted_run(tmp_path)
+    checkpoint = RunCheckpoint(tmp_path)
+    checkpoint.start(PARAMS, resume=True)
+    checkpoint.finish()
+    assert not (tmp_path / "extract").exists()
+
+    checkpoint = RunCheckpoint(tmp_path)
+    assert not checkpoint.start(PARAMS, resume=True)
+    assert checkpoint.committed == {}
+    assert not (tmp_path / "indexed.jsonl").exists()
@@ -0,0 +1,127 @@
+import importlib
+import json
+import sys
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import chunk_store
+from chunk_store import ChunkStore, ChunkStoreVectorStore
+from local_index import LocalVectorStore
+
+
+@pytest.fixture
+def fresh_vectorstores():
+    """Import vectorstores again (its configuration is read at import) and put the old module back afterwards."""
+    saved = sys.modules.pop("vectorstores", None)
+    yield lambda: importlib.import_module("vectorstores")
+    sys.modules.pop("vectorstores", None)
+    if saved is not None:
+        sys.modules["vectorstores"] = saved
+
+
+def chunk(i: int) -> str:
+    return f"Chunk {i}: a LangChain retriever returns the documents most relevant to a query. " * 3
+
+
+def test_round_trip(tmp_path):
+    store = ChunkStore(path=tmp_path, dict_samples=0)
+    store.put(["a", "b"], [chunk(1), "multi\nline\ntext"], [{"source": "https://a.dev/1"}, {"n": 2}])
+
+    docs = store.get_by_ids(["b", "missing", "a"])
+    assert [doc.id for doc in docs] == ["b", "a"]
+    assert docs[0].page_content == "multi\nline\ntext" and docs[0].metadata == {"n": 2}
+    assert docs[1].page_content == chunk(1)
+    assert store.sources(["a", "b"]) == {"a": "https://a.dev/1"}
+
+
+def test_identical_chunks_are_stored_once(tmp_path):
+    store = ChunkStore(path=tmp_path, dict_samples=0)
+    store.put(["a", "b"], [chunk(1), chunk(1)], [{}, {}])
+
+    assert store.stats()["chunks"] == 2
+    assert store.stats()["records"] == 1
+
+
+def test_replacing_and_deleting_drop_unreferenced_records(tmp_path):
+    store = ChunkStore(path=tmp_path, dict_samples=0)
+    store.put(["a", "b"], [chunk(1), chunk(2)], [{}, {}])
+    store.put(["a"], [chunk(3)], [{}])
+    store.delete(["b"])
+
+    assert store.get_by_ids(["a"])[0].page_content == chunk(3)
+    assert store.get_by_ids(["b"]) == []
+    assert store.stats()["records"] == 1
+    assert store.stats()["dead_bytes"] > 0
+
+
+def test_compaction_reclaims_dead_bytes(tmp_path, monkeypatch):
+    monkeypatch.setattr(chunk_store, "COMPACT_MIN_DEAD_BYTES", 0)
+    store = ChunkStore(path=tmp_path, dict_samples=0)
+    store.put([str(i) for i in range(10)], [chunk(i) for i in range(10)], [{}] * 10)
+    store.delete([str(i) for i in range(8)])
+
+    assert store.stats()["dead_bytes"] == 0
+    assert not (tmp_path / "default" / "chunks-0.zst").exists()
+    assert [doc.page_content for doc in store.get_by_ids(["8", "9"])] == [chunk(8), chunk(9)]
+
+
+def test_records_written_before_the_dictionary_are_recompressed(tmp_path):
+    store = ChunkStore(path=tmp_path, dict_samples=200)
+    store.put([f"a{i}" for i in range(50)], [chunk(i) for i in range(50)], [{}] * 50)
+    store.put([f"b{i}" for i in range(200)], [chunk(i) + f" ({i})" for i in range(200)], [{}] * 200)
+
+    assert store._meta("dict") == 1
+    assert store._count_blobs(dict_id=0) == 0
+    assert store.get_by_ids(["a7"])[0].page_content == chunk(7)
+
+
+def test_reopens_from_disk(tmp_path):
+    store = ChunkStore(path=tmp_path, dict_samples=0)
+    store.put(["a"], [chunk(1)], [{"source": "s"}])
+    store.close()
+
+    reopened = ChunkStore(path=tmp_path, dict_samples=0)
+    assert reopened.get_by_ids(["a"])[0].metadata == {"source": "s"}
+
+
+def test_vector_index_carries_ids_only(tmp_path):
+    index = LocalVectorStore(DeterministicFakeEmbedding(size=16), path=tmp_path / "index")
+    vectorstore = ChunkStoreVectorStore(index, ChunkStore(path=tmp_path / "chunks", dict_samples=0))
+    texts = [chunk(i) for i in range(5)]
+    vectorstore.add_texts(texts, metadatas=[{"source": f"https://a.dev/{i}", "title": f"T{i}"} for i in range(5)],
+                          ids=[str(i) for i in range(5)])
+
+    [(row_text, row_metadata)] = index.conn.execute("SELECT text, metadata FROM docs WHERE id = '3'")
+    assert row_text == "" and json.loads(row_metadata) == {"source": "https://a.dev/3"}
+
+    [doc] = vectorstore.similarity_search(texts[3], k=1)
+    assert doc.id == "3" and doc.page_content == texts[3]
+    assert doc.metadata == {"source": "https://a.dev/3", "title": "T3"}
+
+    vectorstore.delete(["3"])
+    assert all(doc.id != "3" for doc in vectorstore.similarity_search(texts[3], k=5))
+
+
+def test_from_texts_wraps_the_configured_backend(tmp_path, monkeypatch, fresh_vectorstores):
+    import functools
+
+    vectorstores = fresh_vectorstores()
+    monkeypatch.setattr(chunk_store, "ChunkStore", functools.partial(ChunkStore, path=tmp_path / "chunks"))
+    monkeypatch.setattr(vectorstores, "_backend", lambda index_name, embedding, backend: LocalVectorStore(
+        embedding, index_name=index_name, path=tmp_path / "index"))
+    texts = [chunk(i) for i in range(3)]
+    vectorstore = ChunkStoreVectorStore.from_texts(texts, DeterministicFakeEmbedding(size=16),
+                                                   metadatas=[{"source": f"https://a.dev/{i}"} for i in range(3)],
+                                                   ids=["a", "b", "c"], backend="local")
+
+    assert isinstance(vectorstore.vectorstore, LocalVectorStore)
+    assert vectorstore.similarity_search(texts[1], k=1)[0].page_content == texts[1]
+    assert (tmp_path / "chunks" / "default" / "index.sqlite").exists()
+
+
+@pytest.mark.parametrize("backend, default", [("pinecone", False), ("local", True), ("chroma", True)])
+def test_chunk_store_is_only_on_by_default_for_local_backends(monkeypatch, fresh_vectorstores, backend, default):
+    monkeypatch.setenv("VECTORSTORE_BACKEND", backend)
+    monkeypatch.delenv("CHUNK_STORE", raising=False)
+    assert fresh_vectorstores().CHUNK_STORE is default
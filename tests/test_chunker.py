@@ -0,0 +1,83 @@
+import pytest
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+import chunker
+from chunker import TokenChunker, text_splitter
+
+SECTION = "Some prose about chains that goes on for a while.\n" * 3
+
+
+def test_chunks_fit_the_token_budget(byte_encoding):
+    text = ("word " * 40 + "\n") * 20
+    chunks = TokenChunker(chunk_size=100, chunk_overlap=0, encoding=byte_encoding).split_text(text)
+
+    assert len(chunks) > 1
+    assert all(len(byte_encoding.encode_ordinary(chunk)) <= 100 for chunk in chunks)
+    assert "".join(chunks).replace("\n", "").replace(" ", "") == text.replace("\n", "").replace(" ", "")
+
+
+def test_cuts_before_headings(byte_encoding):
+    text = "# First\n" + SECTION + "# Second\n" + SECTION
+    chunks = TokenChunker(chunk_size=200, chunk_overlap=0, encoding=byte_encoding).split_text(text)
+
+    assert chunks[0].startswith("# First")
+    assert chunks[1].startswith("# Second")
+
+
+def test_doesnt_cut_at_headings_inside_code_fences(byte_encoding):
+    code = "```\n# a comment, not a heading\nx = 1\n```\n"
+    text = "# Title\n" + SECTION + code + SECTION
+    chunks = TokenChunker(chunk_size=220, chunk_overlap=0, encoding=byte_encoding).split_text(text)
+
+    assert not any(chunk.startswith("# a comment") for chunk in chunks)
+
+
+def test_overlap_repeats_whole_lines(byte_encoding):
+    text = "".join(f"line {i:02d} of the page\n" for i in range(30))
+    chunks = TokenChunker(chunk_size=100, chunk_overlap=40, encoding=byte_encoding).split_text(text)
+
+    for previous, chunk in zip(chunks, chunks[1:]):
+        first_line = chunk.splitlines()[0]
+        assert first_line in previous.splitlines()
+
+
+def test_special_token_text_is_plain_text(byte_encoding):
+    chunks = TokenChunker(chunk_size=100, chunk_overlap=0, encoding=byte_encoding).split_text(
+        "tiktoken ends documents with <|endoftext|>")
+
+    assert chunks == ["tiktoken ends documents with <|endoftext|>"]
+
+
+def test_split_documents_keeps_metadata(byte_encoding):
+    splitter = TokenChunker(chunk_size=100, chunk_overlap=0, encoding=byte_encoding)
+    documents = splitter.create_documents(["# A\n" + SECTION * 2, "short"], [{"source": "a"}, {"source": "b"}])
+
+    assert {doc.metadata["source"] for doc in documents} == {"a", "b"}
+    assert documents[-1].page_content == "short"
+
+
+@pytest.fixture
+def reset_encoding_error(monkeypatch):
+    monkeypatch.setattr(chunker, "_encoding_error", None)
+
+
+def test_text_splitter_follows_chunker(monkeypatch, reset_encoding_error, byte_encoding):
+    monkeypatch.setattr(chunker, "encoding", lambda: byte_encoding)
+    monkeypatch.setattr(chunker, "CHUNKER", "tokens")
+    assert isinstance(text_splitter(150, 15, 600, 50), TokenChunker)
+
+    monkeypatch.setattr(chunker, "CHUNKER", "recursive")
+    assert isinstance(text_splitter(150, 15, 600, 50), RecursiveCharacterTextSplitter)
+
+
+def test_text_splitter_falls_back_without_the_encoding(monkeypatch, reset_encoding_error):
+    def offline():
+        raise ConnectionError("can't download the vocabulary")
+
+    monkeypatch.setattr(chunker, "encoding", offline)
+    monkeypatch.setattr(chunker, "CHUNKER", "tokens")
+    splitter = text_splitter(150, 15, 600, 50)
+
+    assert isinstance(splitter, RecursiveCharacterTextSplitter)
+    assert splitter._chunk_size == 600
+    assert isinstance(chunker._encoding_error, ConnectionError)
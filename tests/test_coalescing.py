@@ -0,0 +1,108 @@
+import asyncio
+
+from backend.coalescing import Coalescer, request_key
+
+
+def test_request_key_ignores_whitespace_and_case_of_the_history():
+    assert request_key(" what is  LCEL ", [("Hi", "Hello")]) == request_key("what is LCEL", [("hi", " hello")])
+    assert request_key("what is LCEL", []) != request_key("what is lcel", [])
+
+
+def test_identical_calls_in_flight_share_one_upstream_call():
+    coalescer = Coalescer()
+    calls = []
+
+    async def answer():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "LCEL is the LangChain Expression Language"
+
+    async def main():
+        results = await asyncio.gather(*(coalescer.run("key", answer) for _ in range(3)))
+        later = await coalescer.run("key", answer)  # done by now: runs again
+        return results, later
+
+    results, later = asyncio.run(main())
+    assert results == ["LCEL is the LangChain Expression Language"] * 3
+    assert later == results[0]
+    assert len(calls) == 2
+    assert coalescer.stats() == {"upstream_calls": 2, "coalesced": 2, "in_flight": 0}
+
+
+def test_an_error_reaches_every_caller():
+    coalescer = Coalescer()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def main():
+        return await asyncio.gather(*(coalescer.run("key", fail) for _ in range(3)), return_exceptions=True)
+
+    assert [str(error) for error in asyncio.run(main())] == ["upstream down"] * 3
+
+
+def test_a_late_subscriber_gets_the_whole_stream():
+    coalescer = Coalescer()
+
+    async def main():
+        first_chunk = asyncio.Event()
+        release = asyncio.Event()
+
+        async def tokens():
+            yield "Hello"
+            first_chunk.set()
+            await release.wait()
+            yield ", world"
+
+        async def collect():
+            return [chunk async for chunk in coalescer.stream("key", tokens)]
+
+        first = asyncio.create_task(collect())
+        await first_chunk.wait()
+        late = asyncio.create_task(collect())
+        await asyncio.sleep(0)
+        release.set()
+        return await first, await late
+
+    assert asyncio.run(main()) == (["Hello", ", world"], ["Hello", ", world"])
+
+
+def test_a_stream_error_reaches_every_subscriber():
+    coalescer = Coalescer()
+
+    async def main():
+        async def tokens():
+            yield "Hello"
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        async def collect():
+            return [chunk async for chunk in coalescer.stream("key", tokens)]
+
+        return await asyncio.gather(collect(), collect(), return_exceptions=True)
+
+    assert [str(error) for error in asyncio.run(main())] == ["upstream down"] * 2
+
+
+def test_a_cancelled_stream_is_not_reported_as_complete():
+    coalescer = Coalescer()
+
+    async def main():
+        async def tokens():
+            yield "Hello"
+            await asyncio.sleep(10)
+            yield ", world"
+
+        async def collect():
+            return [chunk async for chunk in coalescer.stream("key", tokens)]
+
+        subscribers = [asyncio.create_task(collect()) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        [pump] = coalescer._pumps
+        pump.cancel()
+        return await asyncio.gather(*subscribers, return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+    assert coalescer.stats()["in_flight"] == 0
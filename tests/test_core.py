@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.runnables import RunnableLambda
+
+from backend import core
+from backend.answer_cache import AnswerCache
+
+
+@pytest.fixture
+def chain(monkeypatch, byte_encoding):
+    """A stub chain that counts its calls, behind the real run_llm / stream_llm plumbing."""
+    calls = []
+
+    def answer(inputs):
+        calls.append(inputs)
+        return {"input": inputs["input"], "answer": "An answer.",
+                "context": [Document(page_content="page", metadata={"source": "https://a.dev/x"})]}
+
+    monkeypatch.setattr(core, "_qa_chain", RunnableLambda(answer))
+    monkeypatch.setattr(core, "_embeddings", DeterministicFakeEmbedding(size=16))
+    monkeypatch.setattr(core, "answer_cache", AnswerCache())
+    monkeypatch.setattr(core, "_encoding", lambda: byte_encoding)
+    return calls
+
+
+def test_run_llm_answers_a_repeated_question_from_the_cache(chain):
+    first = core.run_llm("What is LCEL?")
+    second = core.run_llm("What is LCEL?")
+
+    assert first == second
+    assert first["result"] == "An answer."
+    assert len(chain) == 1
+
+
+def test_streams_replay_a_cached_answer(chain):
+    core.run_llm("What is LCEL?")
+
+    chunks = list(core.stream_llm("What is LCEL?"))
+    assert chunks == [{"source_documents": chunks[0]["source_documents"]}, {"answer": "An answer."}]
+    assert len(chain) == 1
+
+
+def test_async_variants_share_the_cache(chain):
+    async def main():
+        result = await core.arun_llm("What is LCEL?")
+        chunks = [chunk async for chunk in core.astream_llm("What is LCEL?")]
+        return result, chunks
+
+    result, chunks = asyncio.run(main())
+    assert result["result"] == "An answer."
+    assert chunks[-1] == {"answer": "An answer."}
+    assert len(chain) == 1
+
+
+def test_a_streamed_answer_is_cached_too(chain):
+    chunks = list(core.stream_llm("What is LCEL?"))
+
+    assert chunks[-1] == {"answer": "An answer."}
+    assert core.run_llm("What is LCEL?")["result"] == "An answer."
+    assert len(chain) == 1
+
+
+@pytest.fixture
+def encoding(monkeypatch, byte_encoding):
+    monkeypatch.setattr(core, "_encoding", lambda: byte_encoding)
+    return byte_encoding
+
+
+def test_trim_keeps_the_recent_turns_that_fit(encoding):
+    history = [("human", "a" * 40), ("ai", "b" * 40), ("human", "c" * 10), ("ai", "d" * 10)]
+
+    assert core.trim_chat_history(history, max_tokens=30) == history[2:]
+    assert core.trim_chat_history(history, max_tokens=100) == history
+    assert core.trim_chat_history([], max_tokens=30) == []
+
+
+def test_trim_drops_whole_turns(encoding):
+    # the last answer alone fits, but not with its question: the turn goes as a whole
+    history = [("human", "q" * 10), ("ai", "a" * 10), ("human", "q" * 30), ("ai", "a" * 5)]
+
+    assert core.trim_chat_history(history, max_tokens=30) == history[2:]  # at least the last turn
+    assert core.trim_chat_history(history, max_tokens=50) == history[2:]
+    assert core.trim_chat_history(history, max_tokens=60) == history
+
+
+def test_trim_accepts_special_token_text(encoding):
+    # user input quoting a special token must be counted, not rejected
+    history = [("human", "what does <|endoftext|> mean?"), ("ai", "It ends a document.")]
+
+    assert core.trim_chat_history(history, max_tokens=1000) == history
+
+
+def test_trim_reads_every_message_format(encoding):
+    history = [{"role": "user", "content": "x" * 20}, {"role": "assistant", "content": "y" * 20},
+               {"role": "user", "content": "z"}]
+
+    assert core.trim_chat_history(history, max_tokens=10) == history[2:]
@@ -0,0 +1,55 @@
+import numpy as np
+
+from dedup import Deduplicator, NearDuplicateIndex, lsh_params
+
+PAGE = " ".join(f"word{i}" for i in range(400))
+
+
+def test_lsh_params_find_pairs_at_the_threshold():
+    bands, rows = lsh_params(0.9)
+    assert bands * rows <= 128
+    assert 1 - (1 - 0.9 ** rows) ** bands >= 0.95
+
+
+def test_near_duplicates_across_batches():
+    index = NearDuplicateIndex(threshold=0.9)
+    assert index.add([PAGE]) == [False]
+
+    edited = PAGE.replace("word200", "changed")
+    assert index.add([edited, PAGE, "a different page entirely, about retrievers"]) == [True, True, False]
+    assert len(index) == 2
+
+
+def test_near_duplicates_within_a_batch():
+    index = NearDuplicateIndex(threshold=0.9)
+    assert index.add([PAGE, "another page about chains", PAGE]) == [False, False, True]
+
+
+def test_kept_texts_are_indexed_anyway():
+    index = NearDuplicateIndex(threshold=0.9)
+    index.add([PAGE])
+
+    assert index.add([PAGE], keep=[True]) == [False]
+    assert len(index) == 2
+
+
+def test_dissimilar_texts_are_kept():
+    index = NearDuplicateIndex(threshold=0.9)
+    rng = np.random.default_rng(0)
+    texts = [" ".join(f"w{n}" for n in rng.integers(0, 10_000, 200)) for _ in range(50)]
+
+    assert not any(index.add(texts))
+
+
+def test_many_batches_merge_the_band_keys():
+    index = NearDuplicateIndex(threshold=0.9)
+    for batch in range(20):
+        index.add([f"page {batch} {i} " + PAGE[:50] + f" tail {batch * 100 + i}" * 20 for i in range(100)])
+
+    assert index.add(["page 3 7 " + PAGE[:50] + " tail 307" * 20]) == [True]
+
+
+def test_deduplicator_skips_stages_that_are_off():
+    dedup = Deduplicator(stages=["pages"])
+    assert dedup.duplicates("pages", [PAGE, PAGE]) == [False, True]
+    assert dedup.duplicates("chunks", [PAGE, PAGE]) == [False, False]
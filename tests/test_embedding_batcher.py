@@ -0,0 +1,102 @@
+import asyncio
+import threading
+from typing import List
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from backend.embedding_batcher import BatchingEmbeddings
+
+
+class RecordingEmbeddings(Embeddings):
+    def __init__(self, fail: bool = False):
+        self.calls: List[List[str]] = []
+        self.fail = fail
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls.append(list(texts))
+        if self.fail:
+            raise RuntimeError("rate limited")
+        return [[float(len(text)), float(sum(map(ord, text)))] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(0.01)
+        return self.embed_documents(texts)
+
+
+def test_concurrent_async_queries_share_one_request():
+    upstream = RecordingEmbeddings()
+    batcher = BatchingEmbeddings(upstream, max_batch=64, max_wait_ms=20)
+    texts = ["what is lcel", "how do retrievers work", "what is lcel"]
+
+    async def main():
+        return await asyncio.gather(*(batcher.aembed_query(text) for text in texts))
+
+    vectors = asyncio.run(main())
+    assert vectors == [upstream.embed_query(text) for text in texts]
+    assert upstream.calls[0] == ["what is lcel", "how do retrievers work"]  # duplicates sent once
+    assert batcher.stats() == {"queries": 3, "requests": 1, "mean_batch_size": 3.0}
+    assert not batcher._sends
+
+
+def test_a_full_batch_is_sent_without_waiting():
+    upstream = RecordingEmbeddings()
+    batcher = BatchingEmbeddings(upstream, max_batch=2, max_wait_ms=10_000)
+
+    async def main():
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.aembed_query(f"query {i}") for i in range(4))), timeout=1)
+
+    asyncio.run(main())
+    assert [len(call) for call in upstream.calls] == [2, 2]
+
+
+def test_async_error_reaches_every_caller():
+    batcher = BatchingEmbeddings(RecordingEmbeddings(fail=True), max_batch=64, max_wait_ms=5)
+
+    async def main():
+        return await asyncio.gather(*(batcher.aembed_query(f"query {i}") for i in range(3)),
+                                    return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert [str(error) for error in errors] == ["rate limited"] * 3
+
+
+def test_sync_callers_are_batched_across_threads():
+    upstream = RecordingEmbeddings()
+    batcher = BatchingEmbeddings(upstream, max_batch=4, max_wait_ms=1000)
+    results = {}
+
+    def ask(i: int):
+        results[i] = batcher.embed_query(f"query {i}")
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert results == {i: upstream.embed_query(f"query {i}") for i in range(4)}
+    assert sorted(upstream.calls[0]) == [f"query {i}" for i in range(4)]
+    assert batcher.stats()["requests"] == 1
+
+
+def test_sync_error_reaches_every_caller():
+    batcher = BatchingEmbeddings(RecordingEmbeddings(fail=True), max_batch=3, max_wait_ms=1000)
+    errors = []
+
+    def ask(i: int):
+        with pytest.raises(RuntimeError) as e:
+            batcher.embed_query(f"query {i}")
+        errors.append(str(e.value))
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert errors == ["rate limited"] * 3
@@ -0,0 +1,89 @@
+import itertools
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+import embedding_cache
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    """Every call is one second later, so last-use order never ties."""
+    ticks = itertools.count()
+    monkeypatch.setattr(embedding_cache, "time", SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+def vector(i: int) -> List[float]:
+    return [float(i), float(i) + 0.5, -float(i)]
+
+
+def slots(cache: EmbeddingCache):
+    return dict(cache.conn.execute("SELECT key, slot FROM entries"))
+
+
+def test_round_trip_and_stats(tmp_path):
+    cache = EmbeddingCache(tmp_path, "text-embedding-3-small")
+    assert cache.get_many(["a", "b"]) == [None, None]
+    cache.put_many(["a", "b"], [vector(1), vector(2)])
+
+    assert cache.get_many(["b", "a", "c"]) == [vector(2), vector(1), None]
+    assert cache.stats() == {"hits": 2, "misses": 3, "hit_rate": 0.4, "entries": 2}
+
+
+def test_evicts_the_least_recently_used_and_reuses_its_slot(tmp_path):
+    cache = EmbeddingCache(tmp_path, "model", max_entries=3)
+    cache.put_many(["a", "b", "c"], [vector(1), vector(2), vector(3)])
+    cache.get_many(["a"])  # b is now the least recently used
+    slot_of_b = slots(cache)[embedding_cache.text_hash("b")]
+
+    cache.put_many(["d"], [vector(4)])
+
+    assert cache.get_many(["a", "b", "c", "d"]) == [vector(1), None, vector(3), vector(4)]
+    assert slots(cache)[embedding_cache.text_hash("d")] == slot_of_b
+    assert sorted(slots(cache).values()) == [0, 1, 2]
+    assert cache.vectors_path.stat().st_size == 3 * 3 * embedding_cache.FLOAT32_BYTES
+
+
+def test_a_cached_text_keeps_its_slot(tmp_path):
+    cache = EmbeddingCache(tmp_path, "model", max_entries=2)
+    cache.put_many(["a", "b"], [vector(1), vector(2)])
+    before = slots(cache)
+
+    cache.put_many(["a"], [vector(1)])
+
+    assert slots(cache) == before
+    assert cache.get_many(["a", "b"]) == [vector(1), vector(2)]
+
+
+def test_reopens_from_disk(tmp_path):
+    cache = EmbeddingCache(tmp_path, "org/model:v1")
+    cache.put_many([f"text {i}" for i in range(10)], [vector(i) for i in range(10)])
+    cache.close()
+
+    reopened = EmbeddingCache(tmp_path, "org/model:v1")
+    assert reopened.dim == 3
+    assert reopened.get_many(["text 7", "text 3"]) == [vector(7), vector(3)]
+    assert EmbeddingCache(tmp_path, "another-model").get_many(["text 7"]) == [None]
+
+
+def test_cached_embeddings_only_embed_misses(tmp_path):
+    class Counting(Embeddings):
+        def __init__(self):
+            self.embedded: List[str] = []
+
+        def embed_documents(self, texts):
+            self.embedded += texts
+            return [vector(len(text)) for text in texts]
+
+        def embed_query(self, text):
+            return self.embed_documents([text])[0]
+
+    upstream = Counting()
+    embeddings = CachedEmbeddings(upstream, EmbeddingCache(tmp_path, "model"))
+    assert embeddings.embed_documents(["ab", "abc", "ab"]) == [vector(2), vector(3), vector(2)]
+    assert embeddings.embed_query("abc") == vector(3)
+    assert embeddings.embed_documents(["abcd", "ab"]) == [vector(4), vector(2)]
+    assert upstream.embedded == ["ab", "abc", "abcd"]
@@ -0,0 +1,150 @@
+import asyncio
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+import pytest
+
+from frontier import URLFrontier, canonical_url, discover, sub_prefixes
+
+SITE = "https://docs.example.com/"
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://Docs.Example.com:443/docs/x/", "https://docs.example.com/docs/x"),
+    ("http://docs.example.com/docs//x/index.html#intro", "https://docs.example.com/docs/x"),
+    ("https://docs.example.com/x?utm_source=a&b=2&a=1&gclid=z", "https://docs.example.com/x?a=1&b=2"),
+    ("https://docs.example.com/x?ref=v2", "https://docs.example.com/x?ref=v2"),
+    ("langchain-docs/docs.example.com/x.html", "https://docs.example.com/x.html"),
+])
+def test_canonical_url(url, expected):
+    assert canonical_url(url) == expected
+
+
+def test_add_filters_and_deduplicates(tmp_path):
+    frontier = URLFrontier(tmp_path / "frontier.sqlite", SITE, exclude_paths=[r"^/api/"])
+    new = frontier.add(["https://docs.example.com/a", "https://docs.example.com/a/", "https://other.com/a",
+                        "https://docs.example.com/api/x", "https://docs.example.com/b"])
+
+    assert new == 2
+    assert frontier.mapped_urls() == ["https://docs.example.com/a", "https://docs.example.com/b"]
+    assert (frontier.rejected, frontier.duplicates) == (2, 1)
+
+
+def test_include_paths(tmp_path):
+    frontier = URLFrontier(tmp_path / "frontier.sqlite", SITE, include_paths=[r"^/docs/"])
+    frontier.add(["https://docs.example.com/docs/a", "https://docs.example.com/blog/b"])
+
+    assert frontier.mapped_urls() == ["https://docs.example.com/docs/a"]
+
+
+def test_batches_are_handed_out_while_discovering_and_again_on_resume(tmp_path):
+    path = tmp_path / "frontier.sqlite"
+    urls = [f"https://docs.example.com/p{i}" for i in range(5)]
+
+    async def run(frontier: URLFrontier, feed: bool):
+        async def producer():
+            for url in urls:
+                frontier.add([url])
+                await asyncio.sleep(0)
+            frontier.finish_discovery()
+
+        task = asyncio.create_task(producer()) if feed else None
+        if not feed:
+            frontier.finish_discovery()
+        batches = [batch async for batch in frontier.batches(2)]
+        if task:
+            await task
+        return batches
+
+    first = asyncio.run(run(URLFrontier(path, SITE), feed=True))
+    assert first == [(1, urls[:2]), (2, urls[2:4]), (3, urls[4:])]
+    assert asyncio.run(run(URLFrontier(path, SITE), feed=False)) == first
+
+
+def test_sub_prefixes():
+    urls = ["https://d.com/docs/a/x", "https://d.com/docs/a/y", "https://d.com/docs/b/z/w",
+            "https://d.com/docs/page", "https://d.com/blog/c/x"]
+    assert sub_prefixes(urls, "/docs/") == ["/docs/a/", "/docs/b/"]
+
+
+def fake_site(pages: List[str], limit: int, fail: Optional[str] = None):
+    """A mapper over `pages` returning at most `limit` URLs per call."""
+    calls = []
+
+    async def map_shard(url: str, prefix: str, exclude: List[str]) -> Optional[List[str]]:
+        calls.append((prefix, tuple(exclude)))
+        if prefix == fail:
+            return None
+        found = [page for page in pages
+                 if urlsplit(page).path.startswith(prefix)
+                 and not any(urlsplit(page).path.startswith(e) for e in exclude)]
+        return found[:limit]
+
+    return map_shard, calls
+
+
+PAGES = ([f"https://docs.example.com/docs/how_to/{i}" for i in range(8)]
+         + [f"https://docs.example.com/docs/integrations/{i}" for i in range(8)]
+         + [f"https://docs.example.com/{i}" for i in range(3)])
+
+
+def test_discover_shards_a_site_larger_than_the_limit(tmp_path):
+    frontier = URLFrontier(tmp_path / "frontier.sqlite", SITE)
+    map_shard, calls = fake_site(PAGES, limit=10)
+
+    assert asyncio.run(discover(SITE, map_shard, frontier, limit=10)) is True
+    assert set(frontier.mapped_urls()) == set(PAGES)
+
+
+def test_discover_skips_mapped_shards_on_resume(tmp_path):
+    path = tmp_path / "frontier.sqlite"
+    map_shard, calls = fake_site(PAGES, limit=10)
+    asyncio.run(discover(SITE, map_shard, URLFrontier(path, SITE), limit=10))
+    n_calls = len(calls)
+
+    assert asyncio.run(discover(SITE, map_shard, URLFrontier(path, SITE), limit=10)) is True
+    assert len(calls) == n_calls
+
+
+def test_discover_is_incomplete_when_a_shard_fails(tmp_path):
+    frontier = URLFrontier(tmp_path / "frontier.sqlite", SITE)
+    map_shard, _ = fake_site(PAGES, limit=10, fail="/docs/integrations/")
+
+    assert asyncio.run(discover(SITE, map_shard, frontier, limit=10)) is False
+
+
+def test_discover_is_incomplete_when_a_flat_shard_is_full(tmp_path):
+    frontier = URLFrontier(tmp_path / "frontier.sqlite", SITE)
+    pages = [f"https://docs.example.com/{i}" for i in range(20)]
+    map_shard, _ = fake_site(pages, limit=10)
+
+    assert asyncio.run(discover(SITE, map_shard, frontier, limit=10)) is False
+    assert len(frontier) == 10
+
+
+def test_is_empty_map():
+    from langchain_core.tools import ToolException
+
+    from http_clients import is_empty_map
+
+    assert is_empty_map(ToolException("No crawl results found for 'https://docs.example.com/x'"))
+    assert not is_empty_map(ToolException("Error: 500"))
+    assert not is_empty_map(RuntimeError("No crawl results found"))
+
+
+def test_a_replayed_url_found_by_the_map_counts_as_mapped(tmp_path):
+    frontier = URLFrontier(tmp_path / "frontier.sqlite", SITE)
+    frontier.add(["https://docs.example.com/docs/a"], mapped=False)  # dead letter of an earlier run
+    map_shard, _ = fake_site(["https://docs.example.com/docs/a", "https://docs.example.com/docs/b"], limit=10)
+
+    assert asyncio.run(discover(SITE, map_shard, frontier, limit=10)) is True
+    assert frontier.mapped_urls() == ["https://docs.example.com/docs/a", "https://docs.example.com/docs/b"]
+    assert len(frontier) == 2
+
+
+def test_a_replayed_url_alone_is_not_mapped(tmp_path):
+    frontier = URLFrontier(tmp_path / "frontier.sqlite", SITE)
+    frontier.add(["https://docs.example.com/docs/gone"], mapped=False)
+    frontier.add(["https://docs.example.com/docs/gone"], mapped=False)
+
+    assert frontier.mapped_urls() == []
@@ -0,0 +1,16 @@
+from pathlib import Path
+
+from benchmarks.bench_import_time import IMPORT_BUDGET_MS, import_times, loaded_heavy_modules
+
+MODULE = "backend.core"
+
+
+def test_backend_core_imports_within_budget(monkeypatch):
+    monkeypatch.chdir(Path(__file__).resolve().parent.parent)  # the subprocesses import from the project root
+    best_ms = min(next(t for t, _, name in import_times(MODULE) if name == MODULE) / 1000 for _ in range(3))
+    assert best_ms <= IMPORT_BUDGET_MS
+
+
+def test_backend_core_does_not_load_heavy_modules(monkeypatch):
+    monkeypatch.chdir(Path(__file__).resolve().parent.parent)
+    assert loaded_heavy_modules(MODULE) == []
@@ -0,0 +1,102 @@
+import importlib
+import sys
+
+import pytest
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+
+from manifest import IngestionManifest
+
+PAGE = " ".join(f"word{i}" for i in range(300))
+
+
+@pytest.fixture(scope="module")
+def ingestion2(tmp_path_factory):
+    """ingestion2 imported with stub keys and every store in a temp dir (its clients are never called)."""
+    tmp = tmp_path_factory.mktemp("ingestion2")
+    env = {"OPENAI_API_KEY": "sk-test", "TAVILY_API_KEY": "tvly-test", "VECTORSTORE_BACKEND": "local",
+           "LOCAL_INDEX_DIR": tmp / "local_index", "BM25_INDEX_DIR": tmp / "bm25",
+           "CHUNK_STORE_DIR": tmp / "chunk_store", "EMBEDDING_CACHE_DIR": tmp / "embeddings",
+           "INGESTION_CHECKPOINT_DIR": tmp / "checkpoint", "INGESTION_MANIFEST": tmp / "manifest.sqlite",
+           "INGESTION_DEAD_LETTERS": tmp / "dead_letters.jsonl"}
+    with pytest.MonkeyPatch.context() as mp:
+        for key, value in env.items():
+            mp.setenv(key, str(value))
+        sys.modules.pop("ingestion2", None)
+        module = importlib.import_module("ingestion2")
+    yield module
+    sys.modules.pop("ingestion2", None)
+
+
+def page(url: str, text: str) -> Document:
+    return Document(page_content=text, metadata={"source": url})
+
+
+def run(ingestion2, manifest: IngestionManifest, pages):
+    """Plan one run and record it as if every chunk had been indexed."""
+    plan = ingestion2.SyncPlan()
+    chunks = ingestion2.plan_pages(pages, RecursiveCharacterTextSplitter(chunk_size=400, chunk_overlap=0),
+                                   manifest, plan)
+    for url, (page_hash, chunk_hashes) in plan.pending_pages.items():
+        manifest.record_page(url, page_hash, chunk_hashes, deduped=url in plan.deduped_urls)
+    return plan, chunks
+
+
+def test_a_duplicate_page_is_indexed_once_its_original_changes(ingestion2, tmp_path):
+    manifest = IngestionManifest(tmp_path / "manifest.sqlite")
+    original, duplicate = "https://docs.example.com/v1/a", "https://docs.example.com/v2/a"
+
+    plan, chunks = run(ingestion2, manifest, [page(original, PAGE), page(duplicate, PAGE)])
+    assert plan.duplicate_pages == 1
+    assert {chunk.metadata["source"] for chunk in chunks} == {original}
+    assert not manifest.up_to_date(duplicate, ingestion2.content_hash(PAGE))
+
+    # next run: the duplicate is planned again; still a duplicate while the original is indexed as it was
+    plan, chunks = run(ingestion2, manifest, [page(original, PAGE), page(duplicate, PAGE)])
+    assert plan.duplicate_pages == 1 and chunks == []
+
+    # the original changed: the duplicate's content is indexed under its own url
+    plan, chunks = run(ingestion2, manifest, [page(original, "something else entirely"), page(duplicate, PAGE)])
+    assert plan.duplicate_pages == 0
+    assert duplicate in {chunk.metadata["source"] for chunk in chunks}
+    assert manifest.up_to_date(duplicate, ingestion2.content_hash(PAGE))
+
+
+def test_a_duplicate_page_is_indexed_once_its_original_is_gone(ingestion2, tmp_path):
+    manifest = IngestionManifest(tmp_path / "manifest.sqlite")
+    original, duplicate = "https://docs.example.com/v1/a", "https://docs.example.com/v2/a"
+    run(ingestion2, manifest, [page(original, PAGE), page(duplicate, PAGE)])
+
+    plan, chunks = run(ingestion2, manifest, [page(duplicate, PAGE)])
+    assert plan.duplicate_pages == 0
+    assert {chunk.metadata["source"] for chunk in chunks} == {duplicate}
+
+
+def test_unchanged_pages_are_skipped(ingestion2, tmp_path):
+    manifest = IngestionManifest(tmp_path / "manifest.sqlite")
+    run(ingestion2, manifest, [page("https://docs.example.com/a", PAGE)])
+
+    plan, chunks = run(ingestion2, manifest, [page("https://docs.example.com/a", PAGE)])
+    assert plan.unchanged_pages == 1 and chunks == []
+
+
+def test_a_resumed_run_skips_the_chunks_committed_before_the_crash(ingestion2, tmp_path, monkeypatch):
+    from checkpoint import RunCheckpoint
+
+    manifest = IngestionManifest(tmp_path / "manifest.sqlite")
+    pages = [page("https://docs.example.com/a", PAGE), page("https://docs.example.com/b", PAGE[::-1])]
+    params = {"site": "https://docs.example.com", "url_batch_size": 20}
+    monkeypatch.setattr(ingestion2, "checkpoint", RunCheckpoint(tmp_path / "checkpoint"))
+    ingestion2.checkpoint.start(params)
+    _, chunks = run(ingestion2, IngestionManifest(tmp_path / "crashed.sqlite"), pages)
+    committed = chunks[: len(chunks) // 2]
+    ingestion2.checkpoint.record_indexed(0, {chunk.id: ingestion2.content_hash(chunk.page_content)
+                                             for chunk in committed})
+
+    # crash before the manifest was written; resume
+    monkeypatch.setattr(ingestion2, "checkpoint", RunCheckpoint(tmp_path / "checkpoint"))
+    assert ingestion2.checkpoint.start(params, resume=True)
+    plan, resumed_chunks = run(ingestion2, manifest, pages)
+    assert plan.checkpointed_chunks == len(committed)
+    assert [chunk.id for chunk in resumed_chunks] == [chunk.id for chunk in chunks[len(committed):]]
+    assert manifest.chunk_hashes("https://docs.example.com/a").keys() >= {chunk.id for chunk in committed}
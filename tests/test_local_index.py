@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import local_index
+from local_index import IVFIndex, LocalVectorStore, normalize
+
+
+@pytest.fixture(autouse=True)
+def small_training(monkeypatch):
+    monkeypatch.setattr(local_index, "TRAIN_MIN_VECTORS", 64)
+
+
+def vectors(n: int, dim: int = 16, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def test_exact_search_before_training(tmp_path):
+    index = IVFIndex(tmp_path)
+    data = vectors(10)
+    index.add(data)
+
+    rows, scores = index.search(data[3], k=2)
+    assert index.centroids is None
+    assert rows[0] == 3
+    assert scores[0] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_trains_once_big_enough_and_finds_every_vector(tmp_path):
+    index = IVFIndex(tmp_path, nprobe=4)
+    data = vectors(200)
+    index.add(data[:50])
+    assert index.centroids is None
+    index.add(data[50:])
+
+    assert index.centroids is not None and index.trained_on == 200
+    found = [index.search(data[i], k=1)[0][0] for i in range(0, 200, 10)]
+    assert found == list(range(0, 200, 10))
+
+
+def test_add_can_leave_the_training_to_the_caller(tmp_path):
+    index = IVFIndex(tmp_path)
+    index.add(vectors(100), train=False)
+    assert index.centroids is None and index.needs_training
+
+    index.train()
+    assert index.centroids is not None and not index.needs_training
+
+
+def test_compact_maps_rows_and_lowers_the_retrain_point(tmp_path):
+    index = IVFIndex(tmp_path)
+    data = vectors(200)
+    index.add(data)
+    index.delete(range(150))
+    mapping = index.compact()
+
+    assert index.n_rows == 50
+    assert list(mapping[150:]) == list(range(50))
+    assert (mapping[:150] == -1).all()
+    assert index.trained_on == 50
+    assert index.search(data[170], k=1)[0][0] == 20
+
+
+def test_reopens_from_disk(tmp_path):
+    index = IVFIndex(tmp_path)
+    data = vectors(100)
+    index.add(data)
+    index.delete([5])
+
+    reopened = IVFIndex(tmp_path)
+    assert reopened.n_rows == 100 and reopened.n_live == 99
+    assert reopened.trained_on == index.trained_on
+    assert 5 not in reopened.search(data[5], k=3)[0]
+    np.testing.assert_allclose(reopened.centroids, index.centroids)
+
+
+@pytest.mark.parametrize("quantization", ["int8", "binary"])
+def test_quantized_search_rescores_exactly(tmp_path, quantization):
+    index = IVFIndex(tmp_path, quantization=quantization, rescore=4)
+    data = vectors(300, dim=64)
+    index.add(data)
+
+    rows, scores = index.search(data[42], k=3, nprobe=len(index.centroids))
+    assert rows[0] == 42
+    assert scores[0] == pytest.approx(1.0, abs=1e-5)
+    np.testing.assert_allclose(scores, normalize(data[rows]) @ normalize(data[42]), atol=1e-5)
+
+
+def test_vector_store_upserts_filters_and_trains_in_the_background(tmp_path):
+    store = LocalVectorStore(DeterministicFakeEmbedding(size=16), path=tmp_path)
+    texts = [f"chunk {i}" for i in range(100)]
+    ids = [str(i) for i in range(100)]
+    store.add_texts(texts, metadatas=[{"source": f"page-{i % 2}"} for i in range(100)], ids=ids)
+    store.wait_for_training()
+    assert store.index.centroids is not None
+
+    store.add_texts(["chunk 7, edited"], metadatas=[{"source": "page-1"}], ids=["7"])
+    assert store.get_by_ids(["7"])[0].page_content == "chunk 7, edited"
+    assert store.similarity_search("chunk 7, edited", k=1)[0].id == "7"
+
+    hits = store.similarity_search("chunk 8", k=5, filter={"source": "page-0"})
+    assert hits and all(doc.metadata["source"] == "page-0" for doc in hits)
+
+    store.delete(["8"])
+    assert store.get_by_ids(["8"]) == []
+    assert all(doc.id != "8" for doc in store.similarity_search("chunk 8", k=5))
+
+
+def test_app_store_reopens_the_index_once_it_is_updated(tmp_path, monkeypatch):
+    from backend import answer_cache
+
+    monkeypatch.setattr(answer_cache, "INDEX_VERSION_PATH", tmp_path / "index_version")
+    embedding = DeterministicFakeEmbedding(size=16)
+    writer = LocalVectorStore(embedding, path=tmp_path)
+    writer.add_texts([f"chunk {i}" for i in range(3000)], ids=[str(i) for i in range(3000)])
+    app = LocalVectorStore(embedding, path=tmp_path)
+    app.index_version.check_seconds = 0
+    assert app.similarity_search("chunk 2999", k=1)[0].id == "2999"
+
+    writer.delete([str(i) for i in range(2000)])  # compacts: rows are renumbered on disk
+    writer.add_texts(["chunk 3000"], ids=["3000"])
+    answer_cache.mark_index_updated()
+    assert app.similarity_search("chunk 2999", k=1)[0].id == "2999"
+    assert app.similarity_search("chunk 3000", k=1)[0].id == "3000"
+    assert app.index.n_rows == writer.index.n_rows
@@ -0,0 +1,61 @@
+import sqlite3
+
+from manifest import IngestionManifest, chunk_id, content_hash
+
+
+def test_chunk_id_depends_on_url_and_position_only():
+    assert chunk_id("https://a.dev/x", 0) == chunk_id("https://a.dev/x", 0)
+    assert chunk_id("https://a.dev/x", 0) != chunk_id("https://a.dev/x", 1)
+    assert chunk_id("https://a.dev/x", 0) != chunk_id("https://a.dev/y", 0)
+
+
+def test_record_page_replaces_the_chunks_of_the_page(tmp_path):
+    manifest = IngestionManifest(tmp_path / "manifest.sqlite")
+    url = "https://a.dev/x"
+    manifest.record_page(url, content_hash("v1"), {chunk_id(url, 0): "h0", chunk_id(url, 1): "h1"})
+    manifest.record_page(url, content_hash("v2"), {chunk_id(url, 0): "h0'"})
+
+    assert manifest.page_hash(url) == content_hash("v2")
+    assert manifest.chunk_hashes(url) == {chunk_id(url, 0): "h0'"}
+    assert manifest.known_urls() == {url}
+
+
+def test_remove_page_returns_its_chunk_ids(tmp_path):
+    manifest = IngestionManifest(tmp_path / "manifest.sqlite")
+    manifest.record_page("https://a.dev/x", "h", {"x-0": "a", "x-1": "b"})
+    manifest.record_page("https://a.dev/y", "h", {"y-0": "c"})
+
+    assert sorted(manifest.remove_page("https://a.dev/x")) == ["x-0", "x-1"]
+    assert manifest.page_hash("https://a.dev/x") is None
+    assert manifest.known_urls() == {"https://a.dev/y"}
+
+
+def test_survives_a_reopen(tmp_path):
+    manifest = IngestionManifest(tmp_path / "manifest.sqlite")
+    manifest.record_page("https://a.dev/x", "h", {"x-0": "a"})
+    manifest.close()
+
+    manifest = IngestionManifest(tmp_path / "manifest.sqlite")
+    assert manifest.page_hash("https://a.dev/x") == "h"
+    assert manifest.chunk_hashes("https://a.dev/x") == {"x-0": "a"}
+
+
+def test_deduped_pages_are_never_up_to_date(tmp_path):
+    manifest = IngestionManifest(tmp_path / "manifest.sqlite")
+    manifest.record_page("https://a.dev/x", "h", {"x-0": "a"})
+    manifest.record_page("https://a.dev/y", "h", {}, deduped=True)
+
+    assert manifest.up_to_date("https://a.dev/x", "h")
+    assert not manifest.up_to_date("https://a.dev/x", "other")
+    assert not manifest.up_to_date("https://a.dev/y", "h")
+    assert not manifest.up_to_date("https://a.dev/z", "h")
+
+
+def test_opens_a_manifest_without_the_deduped_column(tmp_path):
+    conn = sqlite3.connect(tmp_path / "manifest.sqlite")
+    conn.execute("CREATE TABLE pages (url TEXT PRIMARY KEY, content_hash TEXT NOT NULL)")
+    conn.execute("INSERT INTO pages VALUES ('https://a.dev/x', 'h')")
+    conn.commit()
+    conn.close()
+
+    assert IngestionManifest(tmp_path / "manifest.sqlite").up_to_date("https://a.dev/x", "h")
@@ -0,0 +1,39 @@
+from langchain_core.documents import Document
+
+from backend.reranker import drop_near_duplicates, lexical_scores, pack
+
+
+def test_pack_keeps_the_best_documents_that_fit(byte_encoding):
+    documents = [Document(page_content="a" * 60), Document(page_content="b" * 60), Document(page_content="c" * 30)]
+
+    assert [doc.page_content[0] for doc in pack(documents, byte_encoding, max_tokens=100)] == ["a", "c"]
+
+
+def test_pack_truncates_a_first_document_that_doesnt_fit(byte_encoding):
+    [doc] = pack([Document(id="1", page_content="x" * 500)], byte_encoding, max_tokens=100)
+
+    assert doc.id == "1"
+    assert doc.page_content == "x" * 100
+
+
+def test_pack_counts_special_token_text(byte_encoding):
+    # documentation pages quote special tokens; they are counted as text, not rejected
+    documents = [Document(page_content="tiktoken ends documents with <|endoftext|>")]
+
+    assert pack(documents, byte_encoding, max_tokens=1000) == documents
+
+
+def test_lexical_scores_favour_the_matching_document():
+    documents = [Document(page_content="Vector stores hold embeddings."),
+                 Document(page_content="Use RecursiveCharacterTextSplitter to split text.")]
+
+    low, high = lexical_scores("text splitter", documents)
+    assert low == 0 and high > 0
+
+
+def test_drop_near_duplicates():
+    text = "the same paragraph of documentation about retrievers and chains " * 3
+    documents = [Document(page_content=text), Document(page_content=text + "!"),
+                 Document(page_content="something else entirely")]
+
+    assert drop_near_duplicates(documents) == [documents[0], documents[2]]
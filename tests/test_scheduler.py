@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from scheduler import (AdaptiveLimiter, DeadLetterQueue, ProviderLimits, Scheduler, dead_letter_key,
+                       is_rate_limit_error)
+
+FAST = ProviderLimits(max_concurrency=4, requests_per_second=1000, burst=100, max_retries=2,
+                      base_delay=0, max_delay=0)
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+def flaky(failures: int, error: Exception):
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error
+        return len(calls)
+
+    return fn, calls
+
+
+def test_retries_until_success():
+    scheduler = Scheduler({"tavily": FAST})
+    fn, calls = flaky(2, RuntimeError("boom"))
+
+    assert asyncio.run(scheduler.run("tavily", fn, batch_id="b1")) == 3
+    assert scheduler.stats["tavily"]["retries"] == 2
+    assert scheduler.stats["tavily"]["dead_lettered"] == 0
+
+
+def test_dead_letters_after_the_last_retry(tmp_path):
+    dead_letters = DeadLetterQueue(tmp_path / "dead_letters.jsonl")
+    scheduler = Scheduler({"tavily": FAST}, dead_letters)
+    fn, calls = flaky(10, RuntimeError("boom"))
+
+    assert asyncio.run(scheduler.run("tavily", fn, batch_id="b1", payload=["https://a.dev/x"])) is None
+    assert len(calls) == FAST.max_retries + 1
+    [record] = dead_letters.pending("tavily")
+    assert record["batch_id"] == "b1"
+    assert record["payload"] == ["https://a.dev/x"]
+
+
+def test_rate_limits_halve_the_concurrency():
+    scheduler = Scheduler({"openai": FAST})
+    fn, _ = flaky(1, RateLimited("slow down"))
+
+    asyncio.run(scheduler.run("openai", fn))
+    assert scheduler.stats["openai"]["rate_limited"] == 1
+    assert scheduler.limiters["openai"].limit < FAST.max_concurrency
+
+
+@pytest.mark.parametrize("error, expected", [
+    (RateLimited(), True),
+    (RuntimeError("Error code: 429 - Too Many Requests"), True),
+    (RuntimeError("connection reset"), False),
+])
+def test_is_rate_limit_error(error, expected):
+    assert is_rate_limit_error(error) is expected
+
+
+def test_usable_from_several_event_loops():
+    # built outside any loop (ingestion2.py builds it at import time), then used by two asyncio.run()
+    scheduler = Scheduler({"tavily": FAST})
+
+    async def ok():
+        return "ok"
+
+    for _ in range(2):
+        assert asyncio.run(scheduler.run("tavily", ok)) == "ok"
+
+
+def test_concurrency_cap():
+    limiter = AdaptiveLimiter(ProviderLimits(max_concurrency=2))
+    peak = 0
+
+    async def task():
+        nonlocal peak
+        async with limiter:
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(task() for _ in range(6)))
+
+    asyncio.run(main())
+    assert peak == 2
+
+
+def test_ack_removes_only_the_replayed_dead_letters(tmp_path):
+    dead_letters = DeadLetterQueue(tmp_path / "dead_letters.jsonl")
+    dead_letters.append("tavily", "b1", ["u1"], RuntimeError("x"))
+    dead_letters.append("tavily", "b2", ["u2"], RuntimeError("x"))
+    dead_letters.append("openai", "b3", ["c3"], RuntimeError("x"))
+    first = dead_letters.pending("tavily")[0]
+
+    assert dead_letters.ack([dead_letter_key(first)]) == 1
+    assert [r["batch_id"] for r in dead_letters.pending()] == ["b2", "b3"]
+    assert dead_letters.ack([]) == 0
@@ -0,0 +1,88 @@
+import asyncio
+from typing import Any, List
+
+import pytest
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.retrievers import BaseRetriever
+
+from backend.speculative_retriever import SpeculativeRetriever, parse_queries, same_question
+
+PROMPT = ChatPromptTemplate.from_messages([MessagesPlaceholder("chat_history"), ("human", "{input}")])
+HISTORY = [("human", "What is LCEL?"), ("ai", "A way to compose chains.")]
+
+
+class RecordingRetriever(BaseRetriever):
+    """Returns one document named after the query; fails the first `failures` searches."""
+
+    queries: List[str] = []
+    failures: int = 0
+
+    def _search(self, query: str) -> List[Document]:
+        self.queries.append(query)
+        if len(self.queries) <= self.failures:
+            raise RuntimeError("search failed")
+        return [Document(id=query, page_content=query)]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                **kwargs: Any) -> List[Document]:
+        return self._search(query)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun,
+                                       **kwargs: Any) -> List[Document]:
+        return self._search(query)
+
+
+def retrieve(retriever: SpeculativeRetriever, inputs: dict, path: str) -> List[Document]:
+    runnable = retriever.as_runnable()
+    return runnable.invoke(inputs) if path == "sync" else asyncio.run(runnable.ainvoke(inputs))
+
+
+def test_same_question_and_parse_queries():
+    assert same_question("How do I stream it?", "how do i stream it")
+    assert not same_question("How do I stream it?", "How do I stream an LCEL chain?")
+    assert parse_queries("1. first\n- second\nhow do I stream it\n\n3) third", 2, "How do I stream it?") \
+        == ["first", "second"]
+
+
+@pytest.mark.parametrize("path", ["sync", "async"])
+def test_unchanged_question_uses_the_speculative_search(path):
+    search = RecordingRetriever()
+    retriever = SpeculativeRetriever(FakeListChatModel(responses=["how do I stream it"]), search, PROMPT)
+
+    docs = retrieve(retriever, {"input": "How do I stream it?", "chat_history": HISTORY}, path)
+    assert [doc.id for doc in docs] == ["How do I stream it?"]
+    assert search.queries == ["How do I stream it?"]
+    assert retriever.stats()["unchanged"] == 1
+
+
+@pytest.mark.parametrize("path", ["sync", "async"])
+def test_unchanged_question_searches_again_if_the_speculative_search_failed(path):
+    search = RecordingRetriever(failures=1)
+    retriever = SpeculativeRetriever(FakeListChatModel(responses=["how do I stream it"]), search, PROMPT)
+
+    docs = retrieve(retriever, {"input": "How do I stream it?", "chat_history": HISTORY}, path)
+    assert [doc.id for doc in docs] == ["how do I stream it"]
+    assert len(search.queries) == 2
+
+
+@pytest.mark.parametrize("path", ["sync", "async"])
+def test_rephrased_question_is_retrieved(path):
+    search = RecordingRetriever()
+    retriever = SpeculativeRetriever(FakeListChatModel(responses=["How do I stream an LCEL chain?"]), search, PROMPT)
+
+    docs = retrieve(retriever, {"input": "How do I stream it?", "chat_history": HISTORY}, path)
+    assert "How do I stream an LCEL chain?" in [doc.id for doc in docs]
+    # the speculative search is merged in if it finished in time, cancelled otherwise
+    assert retriever.stats()["merged"] + retriever.stats()["cancelled"] == 1
+
+
+def test_first_turn_is_retrieved_directly():
+    search = RecordingRetriever()
+    retriever = SpeculativeRetriever(FakeListChatModel(responses=["unused"]), search, PROMPT)
+
+    assert [doc.id for doc in retrieve(retriever, {"input": "What is LCEL?", "chat_history": []}, "sync")] \
+        == ["What is LCEL?"]
+    assert retriever.stats()["follow_ups"] == 0
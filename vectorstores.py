@@ -0,0 +1,58 @@
+"""Pick the vector store backend by configuration.
+
+VECTORSTORE_BACKEND=pinecone  Pinecone index (cloud, default)
+VECTORSTORE_BACKEND=chroma    Chroma collection persisted under CHROMA_DIR
+VECTORSTORE_BACKEND=local     local memory-mapped IVF index under LOCAL_INDEX_DIR
+                              (no network, see local_index.py)
+
+Backends are imported lazily, so an offline deployment doesn't need the
+Pinecone client to be reachable (or installed).
+
+With CHUNK_STORE, the backend is wrapped so that chunk texts are kept in a
+compressed local store and the index only holds ids (chunk_store.py). It is
+on by default for the local backends only: Pinecone is shared by processes
+on other machines, which would find vectors without texts, so enable it
+there only if every app process reads the same CHUNK_STORE_DIR.
+"""
+import os
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+VECTORSTORE_BACKEND = os.getenv("VECTORSTORE_BACKEND", "pinecone")
+CHROMA_DIR = os.getenv("CHROMA_DIR", "chroma_db")
+CHUNK_STORE = os.getenv("CHUNK_STORE", str(VECTORSTORE_BACKEND != "pinecone")).lower() == "true"
+
+
+def get_vectorstore(index_name: str,
+                    embedding: Embeddings,
+                    backend: str = VECTORSTORE_BACKEND,
+                    chunk_store: bool = CHUNK_STORE) -> VectorStore:
+    vectorstore = _backend(index_name, embedding, backend)
+    if not chunk_store:
+        return vectorstore
+    from chunk_store import ChunkStore, ChunkStoreVectorStore
+
+    return ChunkStoreVectorStore(vectorstore, ChunkStore(index_name))
+
+
+def _backend(index_name: str, embedding: Embeddings, backend: str) -> VectorStore:
+    if backend == "pinecone":
+        from langchain_pinecone import PineconeVectorStore
+
+        from http_clients import pinecone_index
+
+        # cloud based vectorstore, one index client (and connection pool) per process
+        return PineconeVectorStore(index=pinecone_index(index_name), embedding=embedding)
+    if backend == "chroma":
+        from langchain_chroma import Chroma
+
+        # local vectorstore
+        return Chroma(collection_name=index_name,
+                      persist_directory=CHROMA_DIR,  # store DB under project's cwd
+                      embedding_function=embedding)
+    if backend == "local":
+        from local_index import LocalVectorStore
+
+        return LocalVectorStore(embedding, index_name=index_name)
+    raise ValueError(f"Unknown VECTORSTORE_BACKEND {backend!r}, expected pinecone, chroma or local")